@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+账号头像文件审计脚本
+按头像目录分组，每个目录只执行一次 os.scandir（线程池并行），缓存 stat 结果，
+并对头像文件计算内容哈希，找出多个账号下保存的相同头像
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 导入配置
+from config import Config, BASE_DIR, DB_PATH, get_platform_name
+from db_connection import get_readonly_connection
+
+# 🔥 默认参数
+DEFAULT_WORKERS = 16
+HASH_CACHE_FILE = "avatar_hash_cache.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+STANDARD_PREFIX = 'assets/avatar/'
+
+
+def _scan_directory(directory):
+    """扫描单个目录，返回 {文件名: (大小, 修改时间)}；目录不存在返回 None"""
+    try:
+        with os.scandir(directory) as entries:
+            listing = {}
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        listing[entry.name] = (stat.st_size, stat.st_mtime)
+                except OSError:
+                    continue
+            return listing
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        print(f"   ⚠️  无法读取目录 {directory}: {e}")
+        return None
+
+
+def _hash_file(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash_cache_path():
+    return os.path.join(Config.get_script_state_dir(), HASH_CACHE_FILE)
+
+
+def _load_hash_cache():
+    try:
+        with open(_hash_cache_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_hash_cache(cache):
+    path = _hash_cache_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_accounts(db_path=None):
+    conn = get_readonly_connection(db_path)
+    return conn.execute("""
+        SELECT id, userName, type, status, local_avatar, avatar_url
+        FROM user_info
+        ORDER BY id
+    """).fetchall()
+
+
+def audit_avatars(accounts, workers=DEFAULT_WORKERS, compute_hashes=True):
+    """审计账号头像文件
+
+    返回 {
+        'files': {账号id: {'path', 'exists', 'size', 'dir_exists', 'dir_files', 'standard', 'hash'}},
+        'duplicates': [[账号id, ...], ...]  # 内容相同的头像（至少两个账号）
+    }
+    """
+    local_avatars = {acc['id']: acc['local_avatar'] for acc in accounts if acc['local_avatar']}
+    avatar_paths = {
+        account_id: os.path.join(BASE_DIR, local_avatar) for account_id, local_avatar in local_avatars.items()
+    }
+
+    # 🔥 每个目录只扫描一次
+    directories = sorted({os.path.dirname(path) for path in avatar_paths.values()})
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        listings = dict(zip(directories, executor.map(_scan_directory, directories)))
+
+    files = {}
+    for account_id, full_path in avatar_paths.items():
+        listing = listings[os.path.dirname(full_path)]
+        stat = listing.get(os.path.basename(full_path)) if listing is not None else None
+        files[account_id] = {
+            'path': full_path,
+            'exists': stat is not None,
+            'size': stat[0] if stat else None,
+            'mtime': stat[1] if stat else None,
+            'dir_exists': listing is not None,
+            'dir_files': sorted(listing) if listing is not None else [],
+            'standard': local_avatars[account_id].startswith(STANDARD_PREFIX),
+            'hash': None,
+        }
+
+    duplicates = []
+    if compute_hashes:
+        duplicates = _find_duplicates(files, workers)
+    return {'files': files, 'duplicates': duplicates}
+
+
+def _find_duplicates(files, workers):
+    """对存在的头像计算内容哈希（按 路径+大小+修改时间 缓存），返回内容相同的账号分组"""
+    cache = _load_hash_cache()
+    keys = {
+        account_id: f"{info['path']}|{info['size']}|{info['mtime']}"
+        for account_id, info in files.items() if info['exists']
+    }
+    to_hash = {files[account_id]['path']: key for account_id, key in keys.items() if key not in cache}
+
+    if to_hash:
+        paths = list(to_hash)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path, digest in zip(paths, executor.map(_safe_hash, paths)):
+                if digest:
+                    cache[to_hash[path]] = digest
+
+    for account_id, key in keys.items():
+        files[account_id]['hash'] = cache.get(key)
+
+    # 只保留仍在使用的条目，文件被替换后旧的缓存自动失效
+    current = {key: cache[key] for key in keys.values() if key in cache}
+    if to_hash or len(current) != len(cache):
+        _save_hash_cache(current)
+
+    by_hash = {}
+    for account_id, info in files.items():
+        if info['hash']:
+            by_hash.setdefault(info['hash'], []).append(account_id)
+    return [ids for ids in by_hash.values() if len(ids) > 1]
+
+
+def _safe_hash(path):
+    try:
+        return _hash_file(path)
+    except OSError:
+        return None
+
+
+def print_audit(accounts, audit):
+    """打印审计结果"""
+    names = {acc['id']: acc for acc in accounts}
+    files = audit['files']
+
+    missing = [account_id for account_id, info in files.items() if not info['exists']]
+    non_standard = [account_id for account_id, info in files.items() if not info['standard']]
+
+    print("📊 头像文件审计:")
+    print(f"   账号总数: {len(accounts)}")
+    print(f"   配置了本地头像: {len(files)} 个")
+    print(f"   文件存在: {len(files) - len(missing)} 个")
+    print(f"   文件缺失: {len(missing)} 个")
+    print(f"   非标准路径: {len(non_standard)} 个")
+
+    for account_id in missing:
+        info = files[account_id]
+        account = names[account_id]
+        print(f"   ❌ {account['userName']} ({get_platform_name(account['type'])}): {info['path']}")
+        print(f"      目录存在: {'✅' if info['dir_exists'] else '❌'}")
+        if info['dir_exists']:
+            print(f"      目录文件: {info['dir_files']}")
+
+    if audit['duplicates']:
+        print(f"\n   🔁 相同内容的头像 ({len(audit['duplicates'])} 组):")
+        for group in audit['duplicates']:
+            members = ", ".join(f"{names[account_id]['userName']}(ID:{account_id})" for account_id in group)
+            print(f"     • {files[group[0]]['size']} bytes: {members}")
+    else:
+        print("   ✅ 没有发现重复的头像文件")
+    print("-" * 60)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="账号头像文件审计")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"扫描/哈希线程数 (默认 {DEFAULT_WORKERS})")
+    parser.add_argument("--no-hash", action="store_true", help="不计算内容哈希（不检测重复头像）")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return
+
+    started_at = time.time()
+    accounts = load_accounts()
+    audit = audit_avatars(accounts, workers=args.workers, compute_hashes=not args.no_hash)
+    print_audit(accounts, audit)
+    print(f"⏱️  耗时 {time.time() - started_at:.2f} 秒")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断")
+        sys.exit(1)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+content_hash 回填脚本
+按 MessageStorage.generateStableHistoryFingerprint 相同的规则计算 MD5 指纹，
+在多个工作进程中按线程并行计算，主进程用 executemany 分批写回（短事务），
+并提供抽样校验：与应用写入的指纹比对一致率
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# 导入配置
+from config import DB_PATH
+from db_connection import get_readonly_connection, get_write_connection
+
+# 🔥 默认参数
+DEFAULT_WORKERS = os.cpu_count() or 4
+THREADS_PER_TASK = 50           # 每个进程任务处理的线程数
+DEFAULT_WRITE_BATCH = 2000      # 每个写事务更新的行数
+DEFAULT_PAUSE = 0.02
+LOOK_BACK_COUNT = 5             # 与 TS 一致：向前最多取 5 条作为上下文
+HISTORY_TEXT_LENGTH = 50        # 与 TS 一致：上下文文本截取 50 个 UTF-16 码元
+
+# JavaScript 的 \s 与 String.prototype.trim 使用的空白字符集合（与 Python 的 \s 略有不同）
+_JS_WHITESPACE = "\t\n\v\f\r \u00a0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000\ufeff"
+_JS_WHITESPACE_RUN = re.compile(f"[{_JS_WHITESPACE}]+")
+_JS_TRIM = re.compile(f"^[{_JS_WHITESPACE}]+|[{_JS_WHITESPACE}]+$")
+_LONE_SURROGATE = re.compile("[\ud800-\udfff]")
+
+
+def _js_normalize(text):
+    """等价于 (text || '').trim().replace(/\\s+/g, ' ')"""
+    return _JS_WHITESPACE_RUN.sub(' ', _JS_TRIM.sub('', text or ''))
+
+
+def _js_substring(text, length):
+    """等价于 JS 的 text.substring(0, length)（按 UTF-16 码元截取）"""
+    encoded = text.encode('utf-16-le', 'surrogatepass')
+    if len(encoded) <= length * 2:
+        return text
+    return encoded[:length * 2].decode('utf-16-le', 'surrogatepass')
+
+
+def _utf8(content):
+    """Node 的 update(content, 'utf8') 会把孤立代理项编码为 U+FFFD"""
+    return _LONE_SURROGATE.sub('\ufffd', content).encode('utf-8')
+
+
+def _parse_images(image_paths):
+    if not image_paths:
+        return []
+    try:
+        images = json.loads(image_paths)
+    except ValueError:
+        return []
+    return images if isinstance(images, list) else []
+
+
+def stable_history_fingerprint(messages, current_index, thread_id):
+    """对应 MessageStorage.generateStableHistoryFingerprint
+
+    messages 为按 id 排序的 [(sender, text, images)]，位置 pos 取消息在线程中的下标。
+    """
+    sender, text, images = messages[current_index]
+    parts = [f"thread:{thread_id}", f"current:{sender}:{_js_normalize(text)}"]
+
+    for i in range(min(LOOK_BACK_COUNT, current_index)):
+        history_sender, history_text, _ = messages[current_index - 1 - i]
+        history_text = _js_substring(_js_normalize(history_text), HISTORY_TEXT_LENGTH)
+        parts.append(f"h{i}:{history_sender}:{history_text}")
+
+    if images:
+        parts.append(f"img:{'|'.join(str(image) for image in images)}")
+
+    parts.append(f"pos:{current_index}")
+    return hashlib.md5(_utf8('::'.join(parts))).hexdigest()
+
+
+def _load_thread(conn, thread_id):
+    return conn.execute("""
+        SELECT id, sender, text_content, image_paths, content_hash
+        FROM messages WHERE thread_id = ? ORDER BY id
+    """, (thread_id,)).fetchall()
+
+
+def _compute_thread_hashes(rows, thread_id, only_missing=True):
+    """返回 [(计算出的指纹, 消息id, 原指纹)]"""
+    messages = [(row['sender'], row['text_content'], _parse_images(row['image_paths'])) for row in rows]
+    results = []
+    for index, row in enumerate(rows):
+        if only_missing and row['content_hash'] is not None:
+            continue
+        results.append((stable_history_fingerprint(messages, index, thread_id), row['id'], row['content_hash']))
+    return results
+
+
+def _worker_compute(args):
+    """工作进程：读取若干线程的消息并计算缺失的指纹
+
+    工作进程以 spawn 方式启动，get_readonly_connection 在进程内打开自己的连接（不继承主进程的连接）
+    """
+    db_path, thread_ids = args
+    conn = get_readonly_connection(db_path)
+    updates = []
+    for thread_id in thread_ids:
+        for content_hash, message_id, _ in _compute_thread_hashes(_load_thread(conn, thread_id), thread_id):
+            updates.append((content_hash, message_id))
+    return updates
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _write_updates(conn, updates, write_batch, pause):
+    written = 0
+    for batch in _chunks(updates, write_batch):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            # 只更新仍为空的行，避免覆盖回填期间应用写入的指纹
+            conn.executemany(
+                "UPDATE messages SET content_hash = ? WHERE id = ? AND content_hash IS NULL", batch
+            )
+            written += conn.total_changes - before
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if pause > 0:
+            time.sleep(pause)
+    return written
+
+
+def backfill_content_hashes(workers=DEFAULT_WORKERS, write_batch=DEFAULT_WRITE_BATCH,
+                            pause=DEFAULT_PAUSE, db_path=None):
+    """回填所有 content_hash 为空的消息，返回更新的行数"""
+    db_path = db_path or DB_PATH
+    reader = get_readonly_connection(db_path)
+    writer = get_write_connection(db_path)
+
+    # 🔥 通过 idx_messages_content_hash 找出含空指纹的线程
+    thread_ids = [row[0] for row in reader.execute(
+        "SELECT DISTINCT thread_id FROM messages WHERE content_hash IS NULL"
+    )]
+    if not thread_ids:
+        print("✅ 没有需要回填的消息")
+        return 0
+
+    print(f"🔧 开始回填: {len(thread_ids)} 个线程, {workers} 个工作进程")
+    started_at = time.time()
+    computed = 0
+    written = 0
+    tasks = [(db_path, chunk) for chunk in _chunks(thread_ids, THREADS_PER_TASK)]
+
+    # 🔥 主进程已打开读写连接，SQLite 连接不能跨 fork 使用（锁不继承、页缓存和 WAL 索引状态被共享），
+    #    工作进程用 spawn 启动，不继承 db_connection 中已打开的连接
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for done, updates in enumerate(executor.map(_worker_compute, tasks), 1):
+            computed += len(updates)
+            written += _write_updates(writer, updates, write_batch, pause)
+            elapsed = max(time.time() - started_at, 1e-6)
+            sys.stdout.write(
+                f"\r   进度: {done}/{len(tasks)} 批线程, 已回填 {written} 条 - {written / elapsed:.0f} 条/秒"
+            )
+            sys.stdout.flush()
+
+    elapsed = time.time() - started_at
+    print(f"\n✅ 回填完成: 计算 {computed} 条, 写入 {written} 条, 耗时 {elapsed:.1f} 秒 "
+          f"({written / max(elapsed, 1e-6):.0f} 条/秒)")
+
+    # 指纹变化后，增量重复分析的状态需要重建
+    try:
+        from content_hash_analyzer import reset_state
+        reset_state()
+    except Exception as e:
+        print(f"⚠️  重置指纹分析状态失败，请手动使用 --rebuild: {e}")
+    return written
+
+
+def verify_fingerprints(sample_threads=50, db_path=None):
+    """抽样校验：对应用已写入指纹的消息重新计算，统计一致率"""
+    conn = get_readonly_connection(db_path)
+    thread_ids = [row[0] for row in conn.execute(
+        "SELECT id FROM message_threads ORDER BY random() LIMIT ?", (sample_threads,)
+    )]
+
+    checked = 0
+    matched = 0
+    with_images = 0
+    for thread_id in thread_ids:
+        rows = _load_thread(conn, thread_id)
+        for content_hash, _, original in _compute_thread_hashes(rows, thread_id, only_missing=False):
+            if original is None:
+                continue
+            checked += 1
+            if content_hash == original:
+                matched += 1
+        with_images += sum(
+            1 for row in rows if row['content_hash'] is not None and row['image_paths']
+        )
+
+    print(f"🔍 抽样校验: {len(thread_ids)} 个线程, 比对 {checked} 条应用写入的指纹")
+    if checked == 0:
+        print("   ⚠️  样本中没有应用写入的指纹")
+        return None
+
+    rate = matched / checked * 100
+    print(f"   一致: {matched} 条 ({rate:.2f}%)")
+    if matched < checked:
+        print("   ℹ️  不一致通常来自: 同步时抓取的消息列表不是从会话第一条开始（pos 偏移），")
+        print(f"      或消息包含图片（入库时不保存原始图片数据，样本中含图片的消息 {with_images} 条）")
+    return rate
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="回填 messages.content_hash（与 MessageStorage 指纹规则一致）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"计算指纹的工作进程数 (默认 {DEFAULT_WORKERS})")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_WRITE_BATCH,
+                        help=f"每个写事务更新的行数 (默认 {DEFAULT_WRITE_BATCH})")
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE,
+                        help=f"写事务之间暂停的秒数 (默认 {DEFAULT_PAUSE})")
+    parser.add_argument("--verify", action="store_true", help="只执行抽样校验，不回填")
+    parser.add_argument("--sample-threads", type=int, default=50, help="校验抽样的线程数 (默认 50)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return
+
+    verify_fingerprints(args.sample_threads)
+    if args.verify:
+        return
+
+    backfill_content_hashes(args.workers, args.batch_size, args.pause)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断，已提交的批次不会丢失，重新运行即可继续")
+        sys.exit(1)
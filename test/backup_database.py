@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+数据库在线备份脚本
+基于 SQLite 在线备份 API，按页分步复制并限速，包含 WAL 中已提交的数据，
+可选 gzip 压缩，备份完成后执行完整性校验
+"""
+
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+# 导入配置
+from config import Config, DB_PATH
+from db_connection import get_db_uri, get_readonly_connection
+
+# 🔥 默认参数
+DEFAULT_PAGES_PER_STEP = 1024   # 每步复制的页数（默认页大小 4KB 时约 4MB）
+DEFAULT_STEP_SLEEP = 0.02       # 每步之间暂停的秒数，避免占满磁盘 I/O
+COMPRESS_CHUNK_SIZE = 1024 * 1024
+
+
+def default_backup_path(compress=False):
+    """生成默认备份路径: BASE_DIR/backups/database_backup_YYYYmmdd_HHMMSS.db[.gz]"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"database_backup_{timestamp}.db"
+    if compress:
+        filename += ".gz"
+    return os.path.join(Config.get_backup_dir(), filename)
+
+
+def _print_progress(status, remaining, total, started_at):
+    copied = total - remaining
+    percent = (copied / total * 100) if total else 100.0
+    elapsed = max(time.time() - started_at, 1e-6)
+    sys.stdout.write(
+        f"\r   复制进度: {copied}/{total} 页 ({percent:.1f}%) - {copied / elapsed:.0f} 页/秒"
+    )
+    sys.stdout.flush()
+
+
+def verify_backup(backup_path, quick=False):
+    """对备份文件执行 PRAGMA integrity_check（或 quick_check）"""
+    check = "quick_check" if quick else "integrity_check"
+    conn = sqlite3.connect(get_db_uri(backup_path), uri=True)
+    try:
+        results = [row[0] for row in conn.execute(f"PRAGMA {check}")]
+    finally:
+        conn.close()
+    return results == ["ok"], results
+
+
+def compress_file(src_path, dest_path):
+    """gzip 压缩备份文件"""
+    with open(src_path, 'rb') as src, gzip.open(dest_path, 'wb', compresslevel=6) as dest:
+        shutil.copyfileobj(src, dest, COMPRESS_CHUNK_SIZE)
+
+
+def online_backup(dest_path=None, pages_per_step=DEFAULT_PAGES_PER_STEP,
+                  step_sleep=DEFAULT_STEP_SLEEP, compress=False, verify=True,
+                  quick_verify=False, db_path=None):
+    """在线备份数据库，返回备份文件路径，失败返回 None
+
+    源连接在备份期间持有一个只读事务，固定读取快照：
+    WAL 模式下不会阻塞应用写入，备份内容也不会因并发写入而重新开始或出现撕裂。
+    """
+    dest_path = dest_path or default_backup_path(compress)
+    os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+
+    # 压缩时先备份到临时 .db 文件，校验通过后再压缩
+    raw_path = dest_path[:-3] if compress and dest_path.endswith(".gz") else dest_path
+    if compress and raw_path == dest_path:
+        raw_path = dest_path + ".tmp"
+
+    print(f"🔄 正在创建数据库备份...")
+    print(f"   原文件: {db_path or DB_PATH}")
+    print(f"   备份至: {dest_path}")
+
+    source = get_readonly_connection(db_path)
+    target = sqlite3.connect(raw_path)
+    started_at = time.time()
+
+    def progress(status, remaining, total):
+        _print_progress(status, remaining, total, started_at)
+        # 🔥 每步之后暂停，限制备份对磁盘 I/O 的占用
+        if step_sleep > 0 and remaining > 0:
+            time.sleep(step_sleep)
+
+    error = None
+    try:
+        # 🔥 固定快照：整个备份过程读取同一时刻的数据
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        try:
+            source.backup(target, pages=pages_per_step, progress=progress)
+        finally:
+            source.execute("COMMIT")
+        # 备份会带上源库的 WAL 标记，改回 DELETE 模式，备份文件单独存放时不产生 -wal/-shm
+        target.execute("PRAGMA journal_mode=DELETE")
+        print()
+    except sqlite3.Error as e:
+        error = e
+    finally:
+        target.close()
+
+    if error:
+        print(f"\n❌ 在线备份失败: {error}")
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+        return None
+
+    elapsed = time.time() - started_at
+    size_mb = os.path.getsize(raw_path) / 1024 / 1024
+    print(f"   备份大小: {size_mb:.2f} MB, 耗时 {elapsed:.1f} 秒")
+
+    if verify:
+        print(f"🔍 正在校验备份完整性...")
+        ok, results = verify_backup(raw_path, quick=quick_verify)
+        if not ok:
+            print(f"❌ 备份完整性校验失败: {results[:10]}")
+            return None
+        print(f"   ✅ 完整性校验通过")
+
+    if compress:
+        print(f"🗜️  正在压缩备份...")
+        compress_file(raw_path, dest_path)
+        os.remove(raw_path)
+        compressed_mb = os.path.getsize(dest_path) / 1024 / 1024
+        print(f"   压缩后大小: {compressed_mb:.2f} MB")
+
+    print(f"✅ 备份创建成功!")
+    return dest_path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="SQLite 在线备份（分步限速，可压缩，自动校验）")
+    parser.add_argument("--output", help="备份文件路径（默认保存到 BASE_DIR/backups）")
+    parser.add_argument("--pages-per-step", type=int, default=DEFAULT_PAGES_PER_STEP,
+                        help=f"每步复制的页数 (默认 {DEFAULT_PAGES_PER_STEP})")
+    parser.add_argument("--sleep", type=float, default=DEFAULT_STEP_SLEEP,
+                        help=f"每步之间暂停的秒数 (默认 {DEFAULT_STEP_SLEEP})")
+    parser.add_argument("--compress", action="store_true", help="使用 gzip 压缩备份文件")
+    parser.add_argument("--quick-check", action="store_true",
+                        help="使用 PRAGMA quick_check 代替 integrity_check")
+    parser.add_argument("--no-verify", action="store_true", help="跳过完整性校验")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return 1
+
+    backup_path = online_backup(
+        dest_path=args.output,
+        pages_per_step=args.pages_per_step,
+        step_sleep=args.sleep,
+        compress=args.compress,
+        verify=not args.no_verify,
+        quick_verify=args.quick_check,
+    )
+    return 0 if backup_path else 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断")
+        sys.exit(1)
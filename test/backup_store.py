@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+增量去重备份脚本
+先用在线备份 API 取得一致的快照，再按页对齐切成固定大小的块，
+每个块按内容 SHA-256 只保存一份（zlib 压缩）；每次备份只是一个列出块哈希的清单文件，
+日常备份只需写入发生变化的块。支持列出、恢复、按保留策略清理和校验
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:     # Windows 没有 fcntl，改用 msvcrt 锁定锁文件的第一个字节
+    fcntl = None
+    import msvcrt
+
+# 导入配置
+from config import Config, DB_PATH
+from backup_database import online_backup, verify_backup
+
+STORE_DIR_NAME = "store"
+SNAPSHOT_FILE = "snapshot.tmp.db"
+LOCK_FILE = "store.lock"
+DEFAULT_CHUNK_PAGES = 16        # 每块的页数（默认页大小 4KB 时 64KB）
+DEFAULT_KEEP = 7                # 清理时至少保留的最新备份数
+COMPRESS_LEVEL = 6
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+def store_dir():
+    """备份仓库目录: BASE_DIR/backups/store"""
+    return os.path.join(Config.get_backup_dir(), STORE_DIR_NAME)
+
+
+def _chunks_dir():
+    return os.path.join(store_dir(), "chunks")
+
+
+def _manifests_dir():
+    return os.path.join(store_dir(), "manifests")
+
+
+def _chunk_path(digest):
+    # 按哈希前两位分子目录，避免单个目录下文件过多
+    return os.path.join(_chunks_dir(), digest[:2], digest)
+
+
+def _manifest_path(name):
+    return os.path.join(_manifests_dir(), f"{name}.json")
+
+
+def _lock_file(f, blocking):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            if not blocking:
+                raise
+            time.sleep(1)
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def store_lock():
+    """独占备份仓库：备份和清理不能同时进行
+
+    备份会复用已存在的块，同时进行的清理可能刚好删除这些块，新清单就会指向缺失的块；
+    两个备份同时进行也会共用同一个快照临时文件。另一个进程持有锁时等待其完成。
+    """
+    os.makedirs(store_dir(), exist_ok=True)
+    with open(os.path.join(store_dir(), LOCK_FILE), 'a+b') as f:
+        try:
+            _lock_file(f, blocking=False)
+        except OSError:
+            print("⏳ 另一个备份或清理正在进行，等待其完成...")
+            _lock_file(f, blocking=True)
+        try:
+            yield
+        finally:
+            _unlock_file(f)
+
+
+def _write_atomic(path, data):
+    """先写临时文件再替换，中断时不会留下半个块或半个清单"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _page_size(path):
+    """从数据库文件头读取页大小（偏移 16，大端 2 字节，1 表示 65536）"""
+    with open(path, 'rb') as f:
+        header = f.read(100)
+    if not header.startswith(SQLITE_HEADER):
+        raise ValueError(f"不是 SQLite 数据库文件: {path}")
+    size = int.from_bytes(header[16:18], 'big')
+    return 65536 if size == 1 else size
+
+
+def store_chunk(data):
+    """保存一个块，已存在相同内容时跳过；返回 (哈希, 新写入的字节数)"""
+    digest = hashlib.sha256(data).hexdigest()
+    path = _chunk_path(digest)
+    if os.path.exists(path):
+        return digest, 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    compressed = zlib.compress(data, COMPRESS_LEVEL)
+    _write_atomic(path, compressed)
+    return digest, len(compressed)
+
+
+def read_chunk(digest):
+    """读取并解压一个块，校验内容哈希，不一致时抛出 ValueError"""
+    with open(_chunk_path(digest), 'rb') as f:
+        data = zlib.decompress(f.read())
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f"块内容与哈希不一致: {digest}")
+    return data
+
+
+def _new_backup_name():
+    name = datetime.now().strftime("backup_%Y%m%d_%H%M%S")
+    suffix = 1
+    candidate = name
+    while os.path.exists(_manifest_path(candidate)):
+        suffix += 1
+        candidate = f"{name}_{suffix}"
+    return candidate
+
+
+def incremental_backup(chunk_pages=DEFAULT_CHUNK_PAGES, verify=True, quick_verify=False, db_path=None):
+    """创建一次增量备份，返回清单名，失败返回 None（整个过程持有仓库锁）"""
+    with store_lock():
+        return _incremental_backup(chunk_pages, verify, quick_verify, db_path)
+
+
+def _incremental_backup(chunk_pages, verify, quick_verify, db_path):
+    os.makedirs(_chunks_dir(), exist_ok=True)
+    os.makedirs(_manifests_dir(), exist_ok=True)
+
+    # 🔥 先通过在线备份取得一致快照（包含 WAL 中已提交的数据，不阻塞应用写入）
+    snapshot_path = os.path.join(store_dir(), SNAPSHOT_FILE)
+    if os.path.exists(snapshot_path):
+        os.remove(snapshot_path)
+    if not online_backup(dest_path=snapshot_path, verify=verify, quick_verify=quick_verify, db_path=db_path):
+        return None
+
+    try:
+        print(f"📦 正在切块去重...")
+        started_at = time.time()
+        page_size = _page_size(snapshot_path)
+        chunk_size = page_size * chunk_pages
+        file_hash = hashlib.sha256()
+        chunks = []
+        new_chunks = 0
+        written = 0
+
+        with open(snapshot_path, 'rb') as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                file_hash.update(data)
+                digest, size = store_chunk(data)
+                chunks.append(digest)
+                if size:
+                    new_chunks += 1
+                    written += size
+
+        name = _new_backup_name()
+        manifest = {
+            'name': name,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'db_path': db_path or DB_PATH,
+            'page_size': page_size,
+            'chunk_size': chunk_size,
+            'size': os.path.getsize(snapshot_path),
+            'sha256': file_hash.hexdigest(),
+            'chunks': chunks,
+        }
+        # 块全部落盘后再写清单：清单存在即代表备份完整
+        _write_atomic(_manifest_path(name), json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+    except (OSError, ValueError) as e:
+        print(f"❌ 写入备份仓库失败: {e}")
+        return None
+    finally:
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+
+    print(f"   共 {len(chunks)} 块 (每块 {chunk_size // 1024} KB)，新增 {new_chunks} 块，"
+          f"写入 {written / 1024 / 1024:.2f} MB，耗时 {time.time() - started_at:.1f} 秒")
+    print(f"✅ 增量备份完成: {name}")
+    return name
+
+
+def load_manifests():
+    """读取全部清单，按创建时间从旧到新排序"""
+    manifests = []
+    if not os.path.isdir(_manifests_dir()):
+        return manifests
+    for filename in os.listdir(_manifests_dir()):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(_manifests_dir(), filename), 'r', encoding='utf-8') as f:
+            manifests.append(json.load(f))
+    manifests.sort(key=lambda m: (m['created_at'], m['name']))
+    return manifests
+
+
+def load_manifest(name):
+    with open(_manifest_path(name), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _stored_chunks():
+    """仓库中现有的块 {哈希: 压缩后大小}"""
+    stored = {}
+    if not os.path.isdir(_chunks_dir()):
+        return stored
+    for prefix in os.listdir(_chunks_dir()):
+        folder = os.path.join(_chunks_dir(), prefix)
+        if not os.path.isdir(folder):
+            continue
+        for filename in os.listdir(folder):
+            if filename.endswith(".tmp"):
+                continue
+            stored[filename] = os.path.getsize(os.path.join(folder, filename))
+    return stored
+
+
+def list_backups():
+    """列出备份：逻辑大小与仅被该备份引用的块大小（删除它能回收的空间）"""
+    manifests = load_manifests()
+    if not manifests:
+        print("❌ 备份仓库中没有备份")
+        return manifests
+
+    stored = _stored_chunks()
+    refcount = {}
+    for manifest in manifests:
+        for digest in set(manifest['chunks']):
+            refcount[digest] = refcount.get(digest, 0) + 1
+
+    print(f"📚 共 {len(manifests)} 个备份 ({store_dir()}):\n")
+    for manifest in manifests:
+        unique = set(manifest['chunks'])
+        exclusive = sum(stored.get(d, 0) for d in unique if refcount[d] == 1)
+        print(f"🗄️  {manifest['name']}  {manifest['created_at']}")
+        print(f"   数据库大小: {manifest['size'] / 1024 / 1024:.2f} MB, {len(manifest['chunks'])} 块, "
+              f"独占块: {exclusive / 1024 / 1024:.2f} MB")
+
+    total = sum(stored.values())
+    logical = sum(m['size'] for m in manifests)
+    print(f"\n💾 仓库实际占用: {total / 1024 / 1024:.2f} MB (逻辑总大小 {logical / 1024 / 1024:.2f} MB, "
+          f"{len(stored)} 个块)")
+    return manifests
+
+
+def restore_backup(name, output):
+    """按清单把块拼回数据库文件，校验整体哈希与完整性后返回输出路径，失败返回 None"""
+    try:
+        manifest = load_manifest(name)
+    except FileNotFoundError:
+        print(f"❌ 备份不存在: {name}")
+        return None
+    if os.path.exists(output):
+        print(f"❌ 目标文件已存在，拒绝覆盖: {output}")
+        return None
+
+    print(f"🔄 正在恢复备份 {name} -> {output}")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    tmp_path = output + ".tmp"
+    file_hash = hashlib.sha256()
+    try:
+        with open(tmp_path, 'wb') as f:
+            for digest in manifest['chunks']:
+                data = read_chunk(digest)
+                file_hash.update(data)
+                f.write(data)
+        if file_hash.hexdigest() != manifest['sha256']:
+            raise ValueError("恢复文件的整体哈希与清单不一致")
+        ok, results = verify_backup(tmp_path)
+        if not ok:
+            raise ValueError(f"完整性校验失败: {results[:10]}")
+        os.replace(tmp_path, output)
+    except (OSError, ValueError, zlib.error, sqlite3.Error) as e:
+        print(f"❌ 恢复失败: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    print(f"✅ 恢复完成: {manifest['size'] / 1024 / 1024:.2f} MB，完整性校验通过")
+    return output
+
+
+def prune_backups(keep=DEFAULT_KEEP, retention_days=None, dry_run=False):
+    """按保留策略删除旧清单，再删除不再被任何清单引用的块
+
+    始终保留最新的 keep 个备份；指定 retention_days 时，超过 keep 个的部分只删除早于保留天数的。
+    整个过程持有仓库锁，不会删除同时进行的备份正要复用的块。
+    """
+    with store_lock():
+        return _prune_backups(keep, retention_days, dry_run)
+
+
+def _prune_backups(keep, retention_days, dry_run):
+    manifests = load_manifests()
+    candidates = manifests[:-keep] if keep > 0 else manifests
+    if retention_days is not None:
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat(timespec='seconds')
+        candidates = [m for m in candidates if m['created_at'] < cutoff]
+
+    removed_names = {m['name'] for m in candidates}
+    referenced = set()
+    for manifest in manifests:
+        if manifest['name'] not in removed_names:
+            referenced.update(manifest['chunks'])
+    garbage = {d: size for d, size in _stored_chunks().items() if d not in referenced}
+    freed = sum(garbage.values())
+
+    action = "将删除" if dry_run else "删除"
+    print(f"🧹 {action} {len(removed_names)} 个备份, {len(garbage)} 个无引用块 ({freed / 1024 / 1024:.2f} MB)")
+    for manifest in candidates:
+        print(f"   - {manifest['name']}  {manifest['created_at']}")
+    if dry_run:
+        return len(removed_names), freed
+
+    # 先删清单再删块：中途中断只会留下无引用的块，下次清理时回收
+    for name in removed_names:
+        os.remove(_manifest_path(name))
+    for digest in garbage:
+        os.remove(_chunk_path(digest))
+    print(f"✅ 清理完成")
+    return len(removed_names), freed
+
+
+def verify_store(names=None):
+    """校验备份：每个被引用的块都存在且内容与哈希一致（共享块只校验一次），返回有问题的备份名列表"""
+    manifests = load_manifests()
+    if names:
+        manifests = [m for m in manifests if m['name'] in names]
+    if not manifests:
+        print("❌ 没有需要校验的备份")
+        return []
+
+    checked = {}
+    broken = []
+    total = len({d for m in manifests for d in m['chunks']})
+    print(f"🔍 正在校验 {len(manifests)} 个备份 ({total} 个不同的块)...")
+    for manifest in manifests:
+        bad = 0
+        for digest in manifest['chunks']:
+            if digest not in checked:
+                try:
+                    read_chunk(digest)
+                    checked[digest] = True
+                except (OSError, ValueError, zlib.error):
+                    checked[digest] = False
+                sys.stdout.write(f"\r   已校验 {len(checked)}/{total} 块")
+                sys.stdout.flush()
+            if not checked[digest]:
+                bad += 1
+        if bad:
+            broken.append(manifest['name'])
+            print(f"\n❌ {manifest['name']}: {bad} 个块缺失或损坏")
+
+    print()
+    if broken:
+        print(f"❌ {len(broken)} 个备份无法完整恢复")
+    else:
+        print(f"✅ 全部备份校验通过")
+    return broken
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="增量去重备份（按页对齐切块，按内容哈希存储）")
+    parser.add_argument("--list", action="store_true", help="列出备份")
+    parser.add_argument("--restore", metavar="NAME", help="恢复指定备份")
+    parser.add_argument("--output", help="恢复到的文件路径（默认 BASE_DIR/backups/<NAME>.db，不会覆盖已有文件）")
+    parser.add_argument("--prune", action="store_true", help="按保留策略清理旧备份和无引用块")
+    parser.add_argument("--keep", type=int, default=DEFAULT_KEEP, help=f"清理时至少保留的最新备份数 (默认 {DEFAULT_KEEP})")
+    parser.add_argument("--retention-days", type=int, help="清理时只删除早于该天数的备份")
+    parser.add_argument("--dry-run", action="store_true", help="清理时只显示将删除的内容")
+    parser.add_argument("--verify", nargs="*", metavar="NAME", help="校验备份（不指定名称时校验全部）")
+    parser.add_argument("--chunk-pages", type=int, default=DEFAULT_CHUNK_PAGES,
+                        help=f"每块的页数 (默认 {DEFAULT_CHUNK_PAGES})")
+    parser.add_argument("--no-verify", action="store_true", help="备份时跳过快照完整性校验")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.list:
+        list_backups()
+        return 0
+    if args.restore:
+        output = args.output or os.path.join(Config.get_backup_dir(), f"{args.restore}.db")
+        return 0 if restore_backup(args.restore, output) else 1
+    if args.prune:
+        prune_backups(args.keep, args.retention_days, args.dry_run)
+        return 0
+    if args.verify is not None:
+        return 1 if verify_store(args.verify) else 0
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return 1
+    return 0 if incremental_backup(args.chunk_pages, verify=not args.no_verify) else 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断")
+        sys.exit(1)
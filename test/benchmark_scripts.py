@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+维护脚本基准测试
+按多个规模生成合成数据库（generate_synthetic_db），在独立子进程中运行各个脚本函数，
+记录耗时、峰值内存 (RSS) 和每秒处理行数，结果追加到 JSONL 文件并与上次结果比较，发现性能回退
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# 导入配置
+from config import Config
+from generate_synthetic_db import REPO_ROOT, SyntheticGenerator, generate_database
+
+RESULTS_FILE = "benchmark_results.jsonl"
+DEFAULT_SIZES = (10000, 100000)
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.2         # 耗时超过上次 20% 视为回退
+# 脚本函数自己捕获异常并打印 "❌ ...错误/失败"，以这些输出判定运行失败；
+# "❌ 没有找到..."、失败账号图标、"❌ N 处不一致" 等属于正常输出，不计为失败
+ERROR_PREFIX = "❌"
+ERROR_MARKERS = ("错误", "失败", "不存在")
+
+# 🔥 基准项目: 名称 -> (模块, 函数, 参数 SQL/常量, 处理行数 SQL, 是否修改数据)
+#   参数中的字符串值以 "SQL:" 开头时，在合成库上查询得到实际值
+BENCHMARKS = {
+    'query_message_threads': (
+        'query_message_history', 'query_message_threads', {},
+        "SELECT COUNT(*) FROM message_threads", False),
+    'query_messages': (
+        'query_message_history', 'query_messages', {'limit': 1000},
+        "SELECT MIN(COUNT(*), 1000) FROM messages", False),
+    'query_messages_hot_thread': (
+        'query_message_history', 'query_messages',
+        {'thread_id': "SQL:SELECT thread_id FROM messages GROUP BY thread_id ORDER BY COUNT(*) DESC LIMIT 1",
+         'limit': 5000},
+        "SELECT MIN(MAX(c), 5000) FROM (SELECT COUNT(*) AS c FROM messages GROUP BY thread_id)", False),
+    'query_thread_snapshots': (
+        'query_message_history', 'query_thread_snapshots', {'per_thread': 20},
+        "SELECT SUM(MIN(c, 20)) FROM (SELECT COUNT(*) AS c FROM messages GROUP BY thread_id)", False),
+    'query_content_hash_analysis': (
+        'query_message_history', 'query_content_hash_analysis', {},
+        "SELECT COUNT(*) FROM messages", False),
+    'query_account_info': (
+        'query_account_info', 'query_account_info', {},
+        "SELECT COUNT(*) FROM user_info", False),
+    'query_publish_drilldown': (
+        'query_publish_records', 'query_publish_records',
+        {'status': ('failed', 'partial'), 'drilldown': True},
+        "SELECT COUNT(*) FROM publish_records WHERE status IN ('failed', 'partial')", False),
+    'publish_analytics_rebuild': (
+        'publish_analytics', 'analyze_publish_records', {'days': 0},
+        "SELECT COUNT(*) FROM publish_records", False),
+    'consistency_check': (
+        'consistency_check', 'run_checks', {},
+        "SELECT COUNT(*) FROM messages", False),
+    'delete_douyin_messages': (
+        'clear_douyin_messages', 'delete_douyin_messages', {},
+        "SELECT COUNT(*) FROM messages WHERE thread_id IN "
+        "(SELECT id FROM message_threads WHERE platform = 'douyin')", True),
+}
+
+
+def generator_for_size(messages, seed=42):
+    """按消息数等比例确定其它表的规模"""
+    return SyntheticGenerator(
+        accounts=min(200, max(10, messages // 4000)),
+        threads=max(100, messages // 40),
+        messages=messages,
+        publish_records=max(100, messages // 10),
+        seed=seed,
+    )
+
+
+def prepare_database(workdir, generator, regenerate=False):
+    """生成（或复用已生成的）合成数据库，返回其基础目录"""
+    params = generator.params()
+    base_dir = os.path.join(workdir, f"messages_{params['messages']}", "base")
+    db_path = os.path.join(base_dir, "db", "database.db")
+    params_path = os.path.join(workdir, f"messages_{params['messages']}", "params.json")
+
+    cached = None
+    if os.path.exists(params_path) and os.path.exists(db_path):
+        with open(params_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+
+    if regenerate or cached != params:
+        print(f"🏗️  生成合成数据库: {params}")
+        generate_database(db_path, generator, overwrite=True)
+        with open(params_path, 'w', encoding='utf-8') as f:
+            json.dump(params, f)
+    return base_dir
+
+
+def _scratch_copy(base_dir):
+    """为修改数据的基准复制一份数据库"""
+    scratch_dir = os.path.join(os.path.dirname(base_dir), "scratch")
+    shutil.rmtree(scratch_dir, ignore_errors=True)
+    os.makedirs(os.path.join(scratch_dir, "db"))
+    shutil.copyfile(os.path.join(base_dir, "db", "database.db"), os.path.join(scratch_dir, "db", "database.db"))
+    return scratch_dir
+
+
+def _resolve(db_path, value):
+    if isinstance(value, str) and value.startswith("SQL:"):
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute(value[4:]).fetchone()[0]
+        finally:
+            conn.close()
+    return value
+
+
+def _peak_rss():
+    """当前进程的峰值 RSS（字节）
+
+    Linux 的 ru_maxrss 在 exec 后会保留父进程（fork 时）的峰值，优先读取 /proc 中的 VmHWM
+    """
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+class ErrorCapture(io.TextIOBase):
+    """替代 stdout：丢弃普通输出（不占内存），只保留脚本打印的错误行"""
+
+    def __init__(self):
+        self.error_lines = []
+        self._line = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        lines = (self._line + text).split("\n")
+        self._line = lines.pop()
+        for line in lines:
+            self._check(line)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        if self._line:
+            self._check(self._line)
+            self._line = ""
+        return self.error_lines
+
+    def _check(self, line):
+        line = line.strip()
+        if line.startswith(ERROR_PREFIX) and any(marker in line for marker in ERROR_MARKERS):
+            self.error_lines.append(line[len(ERROR_PREFIX):].strip())
+
+
+def run_one(name, result_file):
+    """子进程入口：运行单个基准并把结果写入 result_file"""
+    module_name, function_name, kwargs, rows_sql, _ = BENCHMARKS[name]
+    db_path = Config.get_db_path()
+    kwargs = {key: _resolve(db_path, value) for key, value in kwargs.items()}
+    rows = _resolve(db_path, "SQL:" + rows_sql)
+
+    capture = ErrorCapture()
+    with contextlib.redirect_stdout(capture):
+        module = __import__(module_name)
+        function = getattr(module, function_name)
+        started_at = time.perf_counter()
+        function(**kwargs)
+        wall = time.perf_counter() - started_at
+
+    with open(result_file, 'w', encoding='utf-8') as f:
+        json.dump({'wall_s': wall, 'peak_rss_bytes': _peak_rss(), 'rows': rows, 'errors': capture.finish()}, f)
+
+
+def measure(name, base_dir, repeat=DEFAULT_REPEAT):
+    """在独立子进程中运行基准 repeat 次，返回最好耗时和最大峰值内存
+
+    任意一次运行打印了错误或异常退出时返回 failed=True 和第一条错误，耗时不可作为性能数据
+    """
+    destructive = BENCHMARKS[name][4]
+    runs = []
+    for _ in range(repeat):
+        target_dir = _scratch_copy(base_dir) if destructive else base_dir
+        # 每次运行使用干净的脚本状态（增量分析的状态库、检查点等）
+        shutil.rmtree(os.path.join(target_dir, "scriptState"), ignore_errors=True)
+
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+            result_file = tmp.name
+        try:
+            env = dict(os.environ, MAB_BASE_DIR=target_dir)
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-one", name, "--result-file", result_file],
+                env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            if completed.returncode != 0:
+                return {'failed': True, 'error': f"子进程异常退出 (退出码 {completed.returncode})",
+                        'repeat': len(runs) + 1}
+            with open(result_file, 'r', encoding='utf-8') as f:
+                runs.append(json.load(f))
+        finally:
+            os.remove(result_file)
+        if runs[-1]['errors']:
+            return {'failed': True, 'error': runs[-1]['errors'][0], 'repeat': len(runs)}
+
+    wall = min(run['wall_s'] for run in runs)
+    rows = runs[0]['rows'] or 0
+    return {
+        'wall_s': round(wall, 4),
+        'peak_rss_bytes': max(run['peak_rss_bytes'] for run in runs),
+        'rows': rows,
+        'rows_per_sec': round(rows / wall, 1) if wall > 0 else None,
+        'repeat': repeat,
+        'failed': False,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _results_path():
+    return os.path.join(Config.get_script_state_dir(), RESULTS_FILE)
+
+
+def load_previous_results(path=None):
+    """读取历史结果，返回 {(基准名, 参数 JSON): 最近一次结果}"""
+    previous = {}
+    path = path or _results_path()
+    if not os.path.exists(path):
+        return previous
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if result.get('failed'):
+                continue
+            previous[(result['benchmark'], json.dumps(result['params'], sort_keys=True))] = result
+    return previous
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, names=None, repeat=DEFAULT_REPEAT, workdir=None,
+                   regenerate=False, threshold=DEFAULT_THRESHOLD, record=True, results_path=None):
+    """运行基准并返回 (结果列表, 回退列表, 失败列表)"""
+    names = names or list(BENCHMARKS)
+    workdir = workdir or os.path.join(tempfile.gettempdir(), "mab_benchmark")
+    results_path = results_path or _results_path()
+    previous = load_previous_results(results_path)
+    environment = {
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+    }
+
+    results = []
+    regressions = []
+    failures = []
+    for size in sizes:
+        generator = generator_for_size(size)
+        base_dir = prepare_database(workdir, generator, regenerate)
+        print(f"\n📏 规模: {size} 条消息")
+        for name in names:
+            measurement = measure(name, base_dir, repeat)
+            result = dict(
+                benchmark=name, params=generator.params(),
+                run_at=datetime.now().isoformat(timespec='seconds'), **environment, **measurement,
+            )
+            results.append(result)
+
+            if measurement['failed']:
+                print(f"   {name:<30} ❌ 运行出错，不计入性能数据: {measurement['error']}")
+                failures.append(result)
+                continue
+            line = (f"   {name:<30} {measurement['wall_s']:>9.3f} 秒  "
+                    f"{measurement['peak_rss_bytes'] / 1024 / 1024:>7.1f} MB  "
+                    f"{measurement['rows_per_sec'] or 0:>12.0f} 行/秒")
+            last = previous.get((name, json.dumps(result['params'], sort_keys=True)))
+            if last and last['wall_s'] > 0:
+                change = measurement['wall_s'] / last['wall_s'] - 1
+                line += f"  ({change:+.0%} vs {last.get('git_commit') or last['run_at']})"
+                if change > threshold:
+                    line += " ⚠️ 回退"
+                    regressions.append((result, last))
+            print(line)
+
+    if record:
+        os.makedirs(os.path.dirname(results_path), exist_ok=True)
+        with open(results_path, 'a', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        print(f"\n📝 结果已记录到: {results_path}")
+    return results, regressions, failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="维护脚本基准测试（合成数据库）")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help=f"消息规模列表 (默认 {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), help="只运行指定的基准")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"每个基准运行次数，取最好耗时 (默认 {DEFAULT_REPEAT})")
+    parser.add_argument("--workdir", help="合成数据库目录（默认系统临时目录下的 mab_benchmark）")
+    parser.add_argument("--regenerate", action="store_true", help="重新生成合成数据库")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"判定回退的耗时增幅 (默认 {DEFAULT_THRESHOLD})")
+    parser.add_argument("--no-record", action="store_true", help="不记录结果")
+    parser.add_argument("--fail-on-regression", action="store_true", help="发现回退时以非零状态退出")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.run_one:
+        run_one(args.run_one, args.result_file)
+        return 0
+
+    print("🚀 维护脚本基准测试")
+    print("=" * 60)
+    _, regressions, failures = run_benchmarks(
+        sizes=args.sizes,
+        names=args.benchmarks,
+        repeat=args.repeat,
+        workdir=args.workdir,
+        regenerate=args.regenerate,
+        threshold=args.threshold,
+        record=not args.no_record,
+    )
+    if regressions:
+        print(f"⚠️  发现 {len(regressions)} 项性能回退")
+    if failures:
+        print(f"❌ {len(failures)} 项基准运行出错")
+        return 1
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断")
+        sys.exit(1)
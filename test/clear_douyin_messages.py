@@ -7,30 +7,21 @@
 import sqlite3
 import json
 import os
-import shutil
 from datetime import datetime
 import sys
 
 # 导入配置
 from config import Config, BASE_DIR, DB_PATH, PLATFORM_TYPE_MAP, get_platform_name
+from backup_store import incremental_backup
+from db_connection import get_readonly_connection
+from message_image_gc import collect_garbage
+from purge_messages import PurgeFilter, purge_messages
+from reclaim_space import full_vacuum, incremental_reclaim
 
 def create_backup():
-    """创建数据库备份"""
+    """创建数据库备份（写入增量去重备份仓库，只保存发生变化的块），返回备份名"""
     try:
-        backup_dir = os.path.join(BASE_DIR, "backups")
-        os.makedirs(backup_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = os.path.join(backup_dir, f"database_backup_{timestamp}.db")
-        
-        print(f"🔄 正在创建数据库备份...")
-        print(f"   原文件: {DB_PATH}")
-        print(f"   备份至: {backup_path}")
-        
-        shutil.copy2(DB_PATH, backup_path)
-        
-        print(f"✅ 备份创建成功!")
-        return backup_path
+        return incremental_backup()
     except Exception as e:
         print(f"❌ 创建备份失败: {e}")
         return None
@@ -38,8 +29,7 @@ def create_backup():
 def get_douyin_statistics():
     """获取抖音平台数据统计"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_readonly_connection()
         cursor = conn.cursor()
         
         # 统计抖音线程数量
@@ -91,9 +81,6 @@ def get_douyin_statistics():
     except sqlite3.Error as e:
         print(f"❌ 获取统计信息失败: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 def print_douyin_statistics(stats):
     """打印抖音平台统计信息"""
@@ -117,118 +104,47 @@ def print_douyin_statistics(stats):
     print("-" * 60)
 
 def delete_douyin_messages():
-    """删除抖音平台的所有消息数据"""
+    """删除抖音平台的所有消息数据（分批删除，可断点续删）"""
     try:
-        conn = sqlite3.connect(DB_PATH, isolation_level=None)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA foreign_keys=ON;")
-        cursor = conn.cursor()
-        
         print("🗑️  开始删除抖音平台消息数据...")
         
-        # 开启事务
-        cursor.execute("BEGIN TRANSACTION;")
+        result = purge_messages(PurgeFilter(platform='douyin'))
         
-        try:
-            # 1. 删除抖音平台的消息记录
-            cursor.execute("""
-                DELETE FROM messages 
-                WHERE thread_id IN (
-                    SELECT id FROM message_threads WHERE platform = 'douyin'
-                )
-            """)
-            deleted_messages = cursor.rowcount
-            print(f"   ✅ 删除消息记录: {deleted_messages} 条")
-            
-            # 2. 删除抖音平台的消息线程
-            cursor.execute("""
-                DELETE FROM message_threads 
-                WHERE platform = 'douyin'
-            """)
-            deleted_threads = cursor.rowcount
-            print(f"   ✅ 删除消息线程: {deleted_threads} 个")
-            
-            # 3. 清理抖音平台的同步状态
-            cursor.execute("""
-                DELETE FROM platform_sync_status 
-                WHERE platform = 'douyin'
-            """)
-            deleted_sync_status = cursor.rowcount
-            print(f"   ✅ 清理同步状态: {deleted_sync_status} 个")
-            
-            # 提交事务
-            cursor.execute("COMMIT;")
-            
-            print("✅ 抖音平台数据删除完成!")
-            return {
-                'messages': deleted_messages,
-                'threads': deleted_threads,
-                'sync_status': deleted_sync_status
-            }
-            
-        except Exception as e:
-            # 回滚事务
-            cursor.execute("ROLLBACK;")
-            raise e
+        print("✅ 抖音平台数据删除完成!")
+        return result
             
     except sqlite3.Error as e:
-        print(f"❌ 删除数据失败: {e}")
+        print(f"\n❌ 删除数据失败: {e}")
+        print("   重新运行将从检查点继续删除")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 def clean_message_images():
-    """清理抖音相关的消息图片文件"""
+    """清理抖音相关的消息图片文件（删除数据库中已不再引用的图片）"""
     try:
-        from config import Config
-        message_images_dir = Config.get_message_images_dir()
-        
-        if not os.path.exists(message_images_dir):
-            print("📁 消息图片目录不存在，跳过清理")
-            return 0
-        
-        print(f"🧹 清理消息图片目录: {message_images_dir}")
-        
-        deleted_count = 0
-        # 这里可以根据实际的文件命名规则来删除抖音相关的图片
-        # 由于不确定具体的文件命名规则，这里提供一个通用的清理逻辑
-        
-        for root, dirs, files in os.walk(message_images_dir):
-            for file in files:
-                # 可以根据文件名模式来判断是否为抖音相关文件
-                # 例如：如果文件名包含 'douyin' 或特定模式
-                if 'douyin' in file.lower():
-                    file_path = os.path.join(root, file)
-                    try:
-                        os.remove(file_path)
-                        deleted_count += 1
-                        print(f"   删除文件: {file}")
-                    except OSError as e:
-                        print(f"   删除文件失败 {file}: {e}")
-        
-        print(f"✅ 清理图片文件: {deleted_count} 个")
-        return deleted_count
+        result = collect_garbage(platform='douyin', delete=True)
+        return result['deleted']
         
     except Exception as e:
         print(f"❌ 清理图片文件失败: {e}")
         return 0
 
-def vacuum_database():
-    """优化数据库，回收空间"""
+def vacuum_database(full=False):
+    """优化数据库，回收空间
+
+    默认按时间片执行 incremental_vacuum；完整 VACUUM 需显式指定 full=True
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        if full:
+            full_vacuum()
+            return
         
-        print("🔧 正在优化数据库...")
-        cursor.execute("VACUUM;")
-        print("✅ 数据库优化完成")
+        print("🔧 正在分步回收空闲空间...")
+        reclaimed = incremental_reclaim()
+        if reclaimed == 0:
+            print("   如需立即回收全部空间，可运行: python reclaim_space.py --full")
         
     except sqlite3.Error as e:
         print(f"❌ 数据库优化失败: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 def main():
     """主函数"""
@@ -276,8 +192,8 @@ def main():
     while True:
         backup_choice = input("\n是否创建数据库备份? 推荐选择 'Y' (Y/N): ").strip().upper()
         if backup_choice in ['Y', 'YES']:
-            backup_path = create_backup()
-            if not backup_path:
+            backup_name = create_backup()
+            if not backup_name:
                 print("❌ 备份失败，建议终止操作")
                 return
             break
@@ -12,7 +12,14 @@ class Config:
     
     @staticmethod
     def get_base_dir():
-        """获取基础目录 - 模拟 electron app.getPath('userData')"""
+        """获取基础目录 - 模拟 electron app.getPath('userData')
+
+        设置环境变量 MAB_BASE_DIR 时使用该目录（例如让脚本运行在合成的测试数据库上）
+        """
+        override = os.environ.get("MAB_BASE_DIR")
+        if override:
+            return os.path.abspath(os.path.expanduser(override))
+
         system = platform.system()
         
         if system == "Darwin":  # macOS
@@ -65,6 +72,26 @@ class Config:
         """获取临时文件目录 - 对应 Config.TEMP_DIR"""
         return os.path.join(Config.get_base_dir(), "temp")
     
+    @staticmethod
+    def get_backup_dir():
+        """获取数据库备份目录 - 仅 Python 脚本使用"""
+        return os.path.join(Config.get_base_dir(), "backups")
+    
+    @staticmethod
+    def get_export_dir():
+        """获取数据导出目录 - 仅 Python 脚本使用"""
+        return os.path.join(Config.get_base_dir(), "exports")
+    
+    @staticmethod
+    def get_archive_dir():
+        """获取消息归档目录 - 仅 Python 脚本使用（按月份的归档数据库）"""
+        return os.path.join(Config.get_base_dir(), "archive")
+    
+    @staticmethod
+    def get_script_state_dir():
+        """获取维护脚本状态目录 - 仅 Python 脚本使用（检查点等，不会被应用清理）"""
+        return os.path.join(Config.get_base_dir(), "scriptState")
+    
     # 🔥 便捷属性访问
     @property
     def BASE_DIR(self):
@@ -101,6 +128,22 @@ class Config:
     @property
     def TEMP_DIR(self):
         return Config.get_temp_dir()
+    
+    @property
+    def BACKUP_DIR(self):
+        return Config.get_backup_dir()
+    
+    @property
+    def EXPORT_DIR(self):
+        return Config.get_export_dir()
+    
+    @property
+    def ARCHIVE_DIR(self):
+        return Config.get_archive_dir()
+    
+    @property
+    def SCRIPT_STATE_DIR(self):
+        return Config.get_script_state_dir()
 
 # 🔥 创建全局配置实例
 config = Config()
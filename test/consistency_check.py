@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+数据一致性检查与修复脚本
+每项检查都是一条 SQL 反连接（NOT EXISTS）或分组聚合，内存占用只与发现的问题数量有关：
+  orphan_messages        线程已不存在的消息
+  unread_count           message_threads.unread_count 与实际未读（对方发送且 is_read=0）消息数
+  last_message_time      message_threads.last_message_time 与 MAX(messages.timestamp)
+  publish_counts         publish_records.success_accounts / failed_accounts 与 publish_account_status
+  orphan_account_status  发布记录已不存在的账号状态行
+修复模式按批执行短事务，在事务内重新计算期望值，不会覆盖检查之后应用写入的数据
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# 导入配置
+from config import DB_PATH
+from db_connection import get_readonly_connection, get_write_connection
+
+DEFAULT_BATCH_SIZE = 500        # 每个修复事务处理的行数
+DEFAULT_PAUSE = 0.05            # 批次之间的暂停秒数
+DEFAULT_SHOW = 10               # 每项检查显示的问题样例数
+
+
+def find_orphan_messages(conn):
+    """线程已不存在的消息，返回 [(thread_id, 消息数)]
+
+    在 idx_messages_thread_id 覆盖索引上分组，每个 thread_id 只做一次主键查找。
+    """
+    return conn.execute("""
+        SELECT m.thread_id, COUNT(*) AS count
+        FROM messages m
+        WHERE NOT EXISTS (SELECT 1 FROM message_threads t WHERE t.id = m.thread_id)
+        GROUP BY m.thread_id
+    """).fetchall()
+
+
+# 🔥 _thread_stats 的结果缓存: (连接, data_version) -> 行，未读数和最后消息时间两项检查共用一次扫描
+_thread_stats_cache = {}
+
+
+def _thread_stats(conn):
+    """一次分组扫描 messages，得到每个线程的实际未读数和最后消息时间
+
+    时间可能是 CURRENT_TIMESTAMP 或 ISO 格式，比较前统一用 datetime() 规范化。
+    数据库没有变化（PRAGMA data_version 相同）时复用上次的结果。
+    """
+    key = (id(conn), conn.execute("PRAGMA data_version").fetchone()[0])
+    if key not in _thread_stats_cache:
+        _thread_stats_cache.clear()
+        _thread_stats_cache[key] = _query_thread_stats(conn)
+    return _thread_stats_cache[key]
+
+
+def _query_thread_stats(conn):
+    return conn.execute("""
+        SELECT t.id, t.unread_count, t.last_message_time,
+               COALESCE(s.unread, 0) AS actual_unread, s.last_timestamp,
+               COALESCE(datetime(t.last_message_time), t.last_message_time) AS recorded_time,
+               COALESCE(datetime(s.last_timestamp), s.last_timestamp) AS actual_time
+        FROM message_threads t
+        LEFT JOIN (
+            SELECT thread_id,
+                   SUM(sender = 'user' AND is_read = 0) AS unread,
+                   MAX(timestamp) AS last_timestamp
+            FROM messages
+            GROUP BY thread_id
+        ) s ON s.thread_id = t.id
+    """).fetchall()
+
+
+def find_unread_mismatches(conn):
+    """unread_count 与实际未读消息数不一致的线程，返回 [(线程ID, 记录值, 实际值)]"""
+    return [
+        (row['id'], row['unread_count'], row['actual_unread'])
+        for row in _thread_stats(conn)
+        if row['unread_count'] is None or row['unread_count'] != row['actual_unread']
+    ]
+
+
+def find_last_message_time_mismatches(conn):
+    """last_message_time 与最新消息时间不一致的线程，返回 [(线程ID, 记录值, 实际值, 类型)]
+
+    类型 stale: 记录值早于最新消息（或为空），可以修复；
+    类型 ahead: 记录值晚于在线库中的最新消息（消息被清理或归档），只报告不修复。
+    """
+    mismatches = []
+    for row in _thread_stats(conn):
+        if row['recorded_time'] == row['actual_time']:
+            continue
+        if row['actual_time'] is not None and (row['recorded_time'] is None
+                                               or row['recorded_time'] < row['actual_time']):
+            kind = 'stale'
+        else:
+            kind = 'ahead'
+        mismatches.append((row['id'], row['last_message_time'], row['last_timestamp'], kind))
+    return mismatches
+
+
+def find_publish_count_mismatches(conn):
+    """success_accounts / failed_accounts 与账号状态行不一致的发布记录
+
+    返回 [(记录ID, 记录的成功数, 实际成功数, 记录的失败数, 实际失败数)]；没有账号状态行的记录不检查
+    """
+    return conn.execute("""
+        SELECT r.id, r.success_accounts, s.success, r.failed_accounts, s.failed
+        FROM publish_records r
+        JOIN (
+            SELECT record_id,
+                   SUM(status = 'success') AS success,
+                   SUM(status = 'failed') AS failed
+            FROM publish_account_status
+            GROUP BY record_id
+        ) s ON s.record_id = r.id
+        WHERE r.success_accounts IS NOT s.success OR r.failed_accounts IS NOT s.failed
+    """).fetchall()
+
+
+def find_orphan_account_status(conn):
+    """发布记录已不存在的账号状态行，返回 [(record_id, 行数)]"""
+    return conn.execute("""
+        SELECT s.record_id, COUNT(*) AS count
+        FROM publish_account_status s
+        WHERE NOT EXISTS (SELECT 1 FROM publish_records r WHERE r.id = s.record_id)
+        GROUP BY s.record_id
+    """).fetchall()
+
+
+def _run_batches(conn, sql, params_list, batch_size, pause):
+    """按批 executemany，每批一个 BEGIN IMMEDIATE 短事务，返回修改的行数"""
+    changed = 0
+    for start in range(0, len(params_list), batch_size):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(sql, params_list[start:start + batch_size])
+            changed += conn.total_changes - before
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if pause > 0 and start + batch_size < len(params_list):
+            time.sleep(pause)
+    return changed
+
+
+def repair_orphan_messages(conn, issues, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE):
+    """按批删除孤儿消息（线程仍不存在时才删除）"""
+    deleted = 0
+    for thread_id, _ in issues:
+        while True:
+            changed = _run_batches(conn, """
+                DELETE FROM messages WHERE id IN (
+                    SELECT id FROM messages
+                    WHERE thread_id = ?1
+                      AND NOT EXISTS (SELECT 1 FROM message_threads WHERE id = ?1)
+                    LIMIT ?2
+                )
+            """, [(thread_id, batch_size)], 1, 0)
+            deleted += changed
+            if changed < batch_size:
+                break
+            if pause > 0:
+                time.sleep(pause)
+    return deleted
+
+
+def repair_unread_counts(conn, issues, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE):
+    """在事务内重新计算未读数并更新"""
+    return _run_batches(conn, """
+        UPDATE message_threads
+        SET unread_count = (
+                SELECT COUNT(*) FROM messages
+                WHERE thread_id = ?1 AND sender = 'user' AND is_read = 0
+            ),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?1
+    """, [(thread_id,) for thread_id, _, _ in issues], batch_size, pause)
+
+
+def repair_last_message_times(conn, issues, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE):
+    """把落后的 last_message_time 更新为最新消息时间（不回退 ahead 的记录）"""
+    return _run_batches(conn, """
+        UPDATE message_threads
+        SET last_message_time = latest, updated_at = CURRENT_TIMESTAMP
+        FROM (SELECT MAX(timestamp) AS latest FROM messages WHERE thread_id = ?1)
+        WHERE id = ?1 AND latest IS NOT NULL
+          AND (last_message_time IS NULL
+               OR COALESCE(datetime(last_message_time), last_message_time)
+                  < COALESCE(datetime(latest), latest))
+    """, [(thread_id,) for thread_id, _, _, kind in issues if kind == 'stale'], batch_size, pause)
+
+
+def repair_publish_counts(conn, issues, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE):
+    """按账号状态行重新计算成功 / 失败账号数（同时更新 updated_at，发布分析会增量刷新这些日期）"""
+    return _run_batches(conn, """
+        UPDATE publish_records
+        SET success_accounts = (SELECT COUNT(*) FROM publish_account_status
+                                WHERE record_id = ?1 AND status = 'success'),
+            failed_accounts = (SELECT COUNT(*) FROM publish_account_status
+                               WHERE record_id = ?1 AND status = 'failed'),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?1
+    """, [(row[0],) for row in issues], batch_size, pause)
+
+
+def repair_orphan_account_status(conn, issues, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE):
+    """删除孤儿账号状态行（发布记录仍不存在时才删除）"""
+    return _run_batches(conn, """
+        DELETE FROM publish_account_status
+        WHERE record_id = ?1 AND NOT EXISTS (SELECT 1 FROM publish_records WHERE id = ?1)
+    """, [(record_id,) for record_id, _ in issues], batch_size, pause)
+
+
+# 🔥 检查项: 名称 -> (说明, 检查函数, 修复函数, 样例格式)
+CHECKS = {
+    'orphan_messages': (
+        "孤儿消息", find_orphan_messages, repair_orphan_messages,
+        lambda row: f"线程ID {row[0]}: {row[1]} 条消息"),
+    'unread_count': (
+        "线程未读数", find_unread_mismatches, repair_unread_counts,
+        lambda row: f"线程ID {row[0]}: 记录 {row[1]}, 实际 {row[2]}"),
+    'last_message_time': (
+        "线程最后消息时间", find_last_message_time_mismatches, repair_last_message_times,
+        lambda row: f"线程ID {row[0]}: 记录 {row[1]}, 最新消息 {row[2]}"
+                    f"{'' if row[3] == 'stale' else ' (晚于在线库中的消息，不修复)'}"),
+    'publish_counts': (
+        "发布记录成功/失败账号数", find_publish_count_mismatches, repair_publish_counts,
+        lambda row: f"记录ID {row[0]}: 成功 {row[1]} → {row[2]}, 失败 {row[3]} → {row[4]}"),
+    'orphan_account_status': (
+        "孤儿账号状态", find_orphan_account_status, repair_orphan_account_status,
+        lambda row: f"记录ID {row[0]}: {row[1]} 行"),
+}
+
+
+def run_checks(names=None, show=DEFAULT_SHOW, db_path=None):
+    """运行检查并打印结果，返回 {检查名: 问题列表}"""
+    conn = get_readonly_connection(db_path)
+    results = {}
+    for name in names or list(CHECKS):
+        description, find, _, describe = CHECKS[name]
+        started_at = time.time()
+        issues = find(conn)
+        results[name] = issues
+
+        elapsed = time.time() - started_at
+        if not issues:
+            print(f"✅ {description}: 一致 ({elapsed:.2f} 秒)")
+            continue
+        print(f"❌ {description}: {len(issues)} 处不一致 ({elapsed:.2f} 秒)")
+        for row in issues[:show]:
+            print(f"     {describe(row)}")
+        if len(issues) > show:
+            print(f"     ... 还有 {len(issues) - show} 处")
+    return results
+
+
+def repair(results, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE, db_path=None):
+    """修复检查发现的问题，返回 {检查名: 修改的行数}"""
+    conn = get_write_connection(db_path)
+    repaired = {}
+    for name, issues in results.items():
+        if not issues:
+            continue
+        description, _, fix, _ = CHECKS[name]
+        repaired[name] = fix(conn, issues, batch_size, pause)
+        print(f"🔧 {description}: 修改 {repaired[name]} 行")
+    return repaired
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="消息与发布数据一致性检查（可批量修复）")
+    parser.add_argument("--checks", nargs="+", choices=list(CHECKS), help="只运行指定的检查")
+    parser.add_argument("--show", type=int, default=DEFAULT_SHOW,
+                        help=f"每项检查显示的样例数 (默认 {DEFAULT_SHOW})")
+    parser.add_argument("--repair", action="store_true", help="修复发现的不一致")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"每个修复事务处理的行数 (默认 {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE,
+                        help=f"批次之间暂停的秒数 (默认 {DEFAULT_PAUSE})")
+    parser.add_argument("--yes", action="store_true", help="修复前不再确认")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return
+
+    print("🚀 数据一致性检查")
+    print("=" * 60)
+
+    try:
+        results = run_checks(args.checks, args.show)
+        if not args.repair or not any(results.values()):
+            return
+
+        if not args.yes:
+            confirm = input("\n是否修复以上不一致? 输入 'YES' 确认: ").strip()
+            if confirm.upper() != 'YES':
+                print("👋 操作已取消")
+                return
+        repair(results, args.batch_size, args.pause)
+    except sqlite3.Error as e:
+        print(f"❌ 数据库错误: {e}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断，已提交的批次不受影响")
+        sys.exit(1)
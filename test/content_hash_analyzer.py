@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+增量内容指纹重复分析脚本
+在 scriptState 下维护一个小型 SQLite 状态库，记录到上次处理的 messages.id 为止
+每个 (thread_id, content_hash) 的出现次数；每次运行只扫描新增的消息，
+报告按线程列出重复指纹，可选按批删除重复消息（保留最早的一条）
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+
+# 导入配置
+from config import Config, DB_PATH
+from db_connection import get_readonly_connection, get_write_connection, open_snapshot
+
+STATE_FILE = "content_hash_state.db"
+SCAN_BATCH_SIZE = 20000         # 每批扫描的新消息数
+DEFAULT_DELETE_BATCH = 500      # 每个删除事务处理的重复指纹组数
+DEFAULT_PAUSE = 0.05
+SNAPSHOT_TABLES = ('messages', 'message_threads')   # --snapshot 默认只复制分析用到的表
+
+
+def _state_path():
+    return os.path.join(Config.get_script_state_dir(), STATE_FILE)
+
+
+def open_state(db_path=None):
+    """打开状态库（不存在则创建），数据库路径变化时自动重置"""
+    db_path = db_path or DB_PATH
+    os.makedirs(Config.get_script_state_dir(), exist_ok=True)
+    state = sqlite3.connect(_state_path())
+    state.row_factory = sqlite3.Row
+    state.executescript("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS hash_counts (
+            thread_id INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            first_id INTEGER NOT NULL,
+            PRIMARY KEY (thread_id, content_hash)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_hash_counts_count ON hash_counts(count);
+    """)
+
+    if get_meta(state, 'db_path') != db_path:
+        reset_state(state)
+        set_meta(state, 'db_path', db_path)
+        state.commit()
+    return state
+
+
+def get_meta(state, key, default=None):
+    row = state.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else default
+
+
+def set_meta(state, key, value):
+    state.execute(
+        "INSERT INTO meta(key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, str(value)),
+    )
+
+
+def reset_state(state=None):
+    """清空状态，下次运行时重新全量统计（例如回填 content_hash 之后）"""
+    close = state is None
+    if state is None:
+        if not os.path.exists(_state_path()):
+            return
+        state = sqlite3.connect(_state_path())
+    state.execute("DELETE FROM hash_counts")
+    state.execute("DELETE FROM meta WHERE key != 'db_path'")
+    state.commit()
+    if close:
+        state.close()
+
+
+def _detect_deletions(state, conn):
+    """已统计范围内的消息数与状态库不一致（清理、归档等批量删除）时重置状态，返回是否重置
+
+    只能按 id <= last_id 的行数发现删除，这一步按主键区间计数，开销与已统计的消息数成正比。
+    """
+    last_id = int(get_meta(state, 'last_id', 0))
+    if last_id == 0:
+        return False
+    total_rows = int(get_meta(state, 'total_rows', 0))
+    live_rows = conn.execute("SELECT COUNT(*) FROM messages WHERE id <= ?", (last_id,)).fetchone()[0]
+    if live_rows == total_rows:
+        return False
+    print(f"   ⚠️  已统计的消息数 {total_rows} 与数据库中的 {live_rows} 不一致（消息被删除或归档），重新全量统计")
+    reset_state(state)
+    return True
+
+
+def update_state(state, db_path=None):
+    """扫描 last_id 之后的新消息并累加指纹计数，返回本次扫描的消息数
+
+    已统计的消息被删除时先重置状态再全量扫描
+    """
+    conn = get_readonly_connection(db_path)
+    _detect_deletions(state, conn)
+    last_id = int(get_meta(state, 'last_id', 0))
+    scanned = 0
+    started_at = time.time()
+
+    while True:
+        # 🔥 按 rowid 区间读取新消息，只取指纹相关的列
+        rows = conn.execute("""
+            SELECT id, thread_id, content_hash FROM messages
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (last_id, SCAN_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+
+        counts = Counter()
+        first_ids = {}
+        null_rows = 0
+        for row in rows:
+            if row['content_hash'] is None:
+                null_rows += 1
+                continue
+            key = (row['thread_id'], row['content_hash'])
+            counts[key] += 1
+            first_ids.setdefault(key, row['id'])
+
+        state.executemany("""
+            INSERT INTO hash_counts(thread_id, content_hash, count, first_id)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(thread_id, content_hash) DO UPDATE SET
+                count = count + excluded.count,
+                first_id = MIN(first_id, excluded.first_id)
+        """, [(key[0], key[1], count, first_ids[key]) for key, count in counts.items()])
+
+        last_id = rows[-1]['id']
+        scanned += len(rows)
+        set_meta(state, 'last_id', last_id)
+        set_meta(state, 'total_rows', int(get_meta(state, 'total_rows', 0)) + len(rows))
+        set_meta(state, 'null_rows', int(get_meta(state, 'null_rows', 0)) + null_rows)
+        state.commit()
+
+    if scanned:
+        print(f"   增量扫描: {scanned} 条新消息, 耗时 {time.time() - started_at:.2f} 秒 (last_id={last_id})")
+    return scanned
+
+
+def refresh_group(state, conn, thread_id, content_hash):
+    """用 idx_messages_thread_hash 重新核对某个指纹组的实际数量（消息可能已被删除）"""
+    row = conn.execute("""
+        SELECT COUNT(*) AS count, MIN(id) AS first_id FROM messages
+        WHERE thread_id = ? AND content_hash = ?
+    """, (thread_id, content_hash)).fetchone()
+    if row['count'] == 0:
+        state.execute("DELETE FROM hash_counts WHERE thread_id = ? AND content_hash = ?",
+                      (thread_id, content_hash))
+    else:
+        state.execute("""
+            UPDATE hash_counts SET count = ?, first_id = ?
+            WHERE thread_id = ? AND content_hash = ?
+        """, (row['count'], row['first_id'], thread_id, content_hash))
+    return row['count']
+
+
+def get_duplicate_groups(state, conn, limit=None):
+    """返回经过核对的重复指纹组 [(thread_id, content_hash, count)]，按数量倒序"""
+    sql = "SELECT thread_id, content_hash FROM hash_counts WHERE count > 1 ORDER BY count DESC"
+    params = []
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    groups = []
+    for row in state.execute(sql, params).fetchall():
+        count = refresh_group(state, conn, row['thread_id'], row['content_hash'])
+        if count > 1:
+            groups.append((row['thread_id'], row['content_hash'], count))
+    state.commit()
+    groups.sort(key=lambda group: -group[2])
+    return groups
+
+
+def print_report(state, top=10, db_path=None):
+    """打印按线程汇总的重复指纹报告"""
+    conn = get_readonly_connection(db_path)
+
+    total_rows = int(get_meta(state, 'total_rows', 0))
+    null_rows = int(get_meta(state, 'null_rows', 0))
+    summary = state.execute("""
+        SELECT COUNT(*) AS groups, COALESCE(SUM(count - 1), 0) AS extra_rows,
+               COUNT(DISTINCT thread_id) AS threads
+        FROM hash_counts WHERE count > 1
+    """).fetchone()
+
+    print("🔍 内容指纹分析:")
+    print(f"   已统计消息数: {total_rows} (截至 id={get_meta(state, 'last_id', 0)})")
+    print(f"   指纹为空的消息数: {null_rows}")
+    if total_rows > 0:
+        print(f"   指纹覆盖率: {((total_rows - null_rows) / total_rows * 100):.2f}%")
+    print(f"   重复指纹组: {summary['groups']} 个, 涉及 {summary['threads']} 个线程, 多余消息 {summary['extra_rows']} 条")
+
+    groups = get_duplicate_groups(state, conn, limit=top)
+    if not groups:
+        print("   ✅ 没有发现重复指纹")
+        print("-" * 50)
+        return groups
+
+    # 按线程分组显示
+    by_thread = {}
+    for thread_id, content_hash, count in groups:
+        by_thread.setdefault(thread_id, []).append((content_hash, count))
+
+    print(f"   重复最多的指纹 (前{top}个):")
+    for thread_id, items in by_thread.items():
+        thread = conn.execute(
+            "SELECT platform, account_id, user_name FROM message_threads WHERE id = ?", (thread_id,)
+        ).fetchone()
+        name = f"{thread['user_name']} ({thread['platform']}/{thread['account_id']})" if thread else "线程已删除"
+        print(f"   🧵 线程 {thread_id}: {name}")
+        for content_hash, count in items:
+            samples = conn.execute("""
+                SELECT DISTINCT sender, text_content FROM messages
+                WHERE thread_id = ? AND content_hash = ?
+                LIMIT 3
+            """, (thread_id, content_hash)).fetchall()
+            print(f"     指纹: {content_hash}  重复次数: {count}")
+            for sample in samples:
+                text = (sample['text_content'] or '[无文本]')[:40]
+                print(f"       {sample['sender']}: {text}")
+    print("-" * 50)
+    return groups
+
+
+def remove_duplicates(state, batch_size=DEFAULT_DELETE_BATCH, pause=DEFAULT_PAUSE, db_path=None):
+    """按批删除重复消息，每组保留 id 最小（最早）的一条，返回删除的消息数"""
+    conn = get_write_connection(db_path)
+    groups = state.execute("""
+        SELECT thread_id, content_hash FROM hash_counts WHERE count > 1
+    """).fetchall()
+    if not groups:
+        print("✅ 没有需要删除的重复消息")
+        return 0
+
+    print(f"🗑️  开始删除重复消息: {len(groups)} 个指纹组, 每批 {batch_size} 组")
+    deleted = 0
+    for start in range(0, len(groups), batch_size):
+        batch = [(row['thread_id'], row['content_hash']) for row in groups[start:start + batch_size]]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany("""
+                DELETE FROM messages
+                WHERE thread_id = ?1 AND content_hash = ?2
+                  AND id > (SELECT MIN(id) FROM messages WHERE thread_id = ?1 AND content_hash = ?2)
+            """, batch)
+            batch_deleted = conn.total_changes - before
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        state.executemany(
+            "UPDATE hash_counts SET count = 1 WHERE thread_id = ? AND content_hash = ?", batch
+        )
+        # 删除的都是已统计的消息，同步减少已统计数，避免下次运行误判为外部删除而全量重建
+        deleted += batch_deleted
+        set_meta(state, 'total_rows', int(get_meta(state, 'total_rows', 0)) - batch_deleted)
+        state.commit()
+
+        sys.stdout.write(f"\r   已处理 {min(start + batch_size, len(groups))}/{len(groups)} 组, 删除 {deleted} 条")
+        sys.stdout.flush()
+        if pause > 0:
+            time.sleep(pause)
+
+    print(f"\n✅ 重复消息删除完成: {deleted} 条")
+    return deleted
+
+
+def analyze_content_hashes(top=10, rebuild=False, db_path=None):
+    """增量更新状态并打印报告"""
+    state = open_state(db_path)
+    try:
+        if rebuild:
+            reset_state(state)
+        update_state(state, db_path)
+        return print_report(state, top, db_path)
+    finally:
+        state.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="增量内容指纹重复分析")
+    parser.add_argument("--top", type=int, default=10, help="显示重复最多的指纹组数量 (默认 10)")
+    parser.add_argument("--rebuild", action="store_true", help="丢弃状态，重新全量统计")
+    parser.add_argument("--remove-duplicates", action="store_true",
+                        help="删除重复消息（每组保留最早的一条）")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_DELETE_BATCH,
+                        help=f"每个删除事务处理的指纹组数 (默认 {DEFAULT_DELETE_BATCH})")
+    parser.add_argument("--yes", action="store_true", help="删除前不再确认")
+    parser.add_argument("--snapshot", nargs="?", const="memory", choices=["memory", "file"],
+                        help="先把数据库复制到内存 (默认) 或临时文件，分析在快照上执行")
+    parser.add_argument("--snapshot-tables", nargs="+", default=list(SNAPSHOT_TABLES),
+                        help=f"快照复制的表 ({' '.join(SNAPSHOT_TABLES)} 总会复制)，传 all 复制整个数据库")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return
+
+    if args.snapshot:
+        # 分析用到的表总会复制，--snapshot-tables 中的其它表追加在后面
+        tables = None if args.snapshot_tables == ['all'] else \
+            list(SNAPSHOT_TABLES) + [table for table in args.snapshot_tables if table not in SNAPSHOT_TABLES]
+        try:
+            open_snapshot(tables, in_memory=args.snapshot == "memory")
+        except (sqlite3.Error, ValueError) as e:
+            print(f"❌ 创建快照失败: {e}")
+            return
+    try:
+        analyze_content_hashes(top=args.top, rebuild=args.rebuild)
+
+        if args.remove_duplicates:
+            if not args.yes:
+                confirm = input("\n是否删除全部重复消息? 输入 'YES' 确认: ").strip()
+                if confirm.upper() != 'YES':
+                    print("👋 操作已取消")
+                    return
+            state = open_state()
+            try:
+                remove_duplicates(state, batch_size=args.batch_size)
+            finally:
+                state.close()
+    except sqlite3.Error as e:
+        print(f"❌ 数据库错误: {e}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断")
+        sys.exit(1)
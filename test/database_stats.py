@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+数据库统计脚本
+行数取自 sqlite_stat1 的近似值（可选先执行 ANALYZE），
+表/索引字节占用取自 dbstat，同时报告 WAL 大小和空闲页；
+只有显式指定 --exact 时才执行 COUNT(*) 全表扫描。输出可为 JSON，便于记录增长趋势
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from statistics import median_low
+
+# 导入配置
+from config import Config, DB_PATH
+from db_connection import get_readonly_connection, get_write_connection
+from reclaim_space import get_object_usage, get_space_info
+
+HISTORY_FILE = "db_stats_history.jsonl"
+DEFAULT_ANALYSIS_LIMIT = 1000    # ANALYZE 每个索引最多采样的行数，0 表示不限制
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def run_analyze(analysis_limit=DEFAULT_ANALYSIS_LIMIT, db_path=None):
+    """执行 ANALYZE 刷新 sqlite_stat1（analysis_limit 限制采样行数，大表也很快）"""
+    conn = get_write_connection(db_path)
+    conn.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+    conn.execute("ANALYZE")
+
+
+def get_approximate_row_counts(conn):
+    """从 sqlite_stat1 读取近似行数，返回 {表名: 行数}（未分析过的表不包含在内）"""
+    has_stat1 = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+    ).fetchone()
+    if not has_stat1:
+        return {}
+
+    estimates = {}
+    for row in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+        try:
+            rows = int(row['stat'].split()[0])
+        except (AttributeError, IndexError, ValueError):
+            continue
+        estimates.setdefault(row['tbl'], []).append(rows)
+
+    # 🔥 限制采样 (analysis_limit) 时各索引的估计值会有偏差，取中位数
+    return {table: median_low(values) for table, values in estimates.items()}
+
+
+def collect_stats(exact=False, db_path=None):
+    """收集数据库统计信息，返回可直接序列化为 JSON 的字典"""
+    db_path = db_path or DB_PATH
+    conn = get_readonly_connection(db_path)
+
+    wal_path = db_path + "-wal"
+    space = get_space_info(conn)
+    stats = {
+        'collected_at': datetime.now().isoformat(timespec='seconds'),
+        'db_path': db_path,
+        'file_bytes': os.path.getsize(db_path),
+        'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        'page_size': space['page_size'],
+        'page_count': space['page_count'],
+        'freelist_count': space['freelist_count'],
+        'auto_vacuum': space['auto_vacuum'],
+        'tables': {},
+        'indexes': {},
+    }
+
+    objects = conn.execute("""
+        SELECT name, type, tbl_name FROM sqlite_master
+        WHERE type IN ('table', 'index') AND name NOT LIKE 'sqlite_%'
+        ORDER BY name
+    """).fetchall()
+
+    approximate = get_approximate_row_counts(conn)
+    for obj in objects:
+        if obj['type'] == 'table':
+            entry = {'rows': approximate.get(obj['name']), 'rows_source': 'stat1', 'bytes': 0, 'pages': 0}
+            if entry['rows'] is None:
+                entry['rows_source'] = 'unknown'
+            if exact:
+                entry['rows'] = conn.execute(f"SELECT COUNT(*) FROM {_quote(obj['name'])}").fetchone()[0]
+                entry['rows_source'] = 'exact'
+            stats['tables'][obj['name']] = entry
+        else:
+            stats['indexes'][obj['name']] = {'table': obj['tbl_name'], 'bytes': 0, 'pages': 0}
+
+    try:
+        for usage in get_object_usage(conn):
+            target = stats['tables'].get(usage['name']) or stats['indexes'].get(usage['name'])
+            if target is not None:
+                target['bytes'] = usage['bytes']
+                target['pages'] = usage['pages']
+    except Exception as e:
+        stats['dbstat_error'] = str(e)
+
+    return stats
+
+
+def print_stats(stats):
+    """以文本形式打印统计信息"""
+    print("📋 数据库统计信息:")
+    print(f"   数据库文件: {stats['db_path']}")
+    print(f"   文件大小: {stats['file_bytes'] / 1024 / 1024:.2f} MB")
+    print(f"   WAL 大小: {stats['wal_bytes'] / 1024 / 1024:.2f} MB")
+    print(f"   空闲页: {stats['freelist_count']} / {stats['page_count']} (页大小 {stats['page_size']})")
+
+    print(f"   表数量: {len(stats['tables'])}")
+    for name, table in stats['tables'].items():
+        if table['rows'] is None:
+            rows = "未知 (可使用 --analyze 或 --exact)"
+        elif table['rows_source'] == 'exact':
+            rows = f"{table['rows']} 条记录"
+        else:
+            rows = f"约 {table['rows']} 条记录"
+        print(f"   {name}: {rows}, {table['bytes'] / 1024 / 1024:.2f} MB")
+
+    if stats['indexes']:
+        print(f"   索引数量: {len(stats['indexes'])}")
+        for name, index in sorted(stats['indexes'].items(), key=lambda item: -item[1]['bytes']):
+            print(f"     • {name} ({index['table']}): {index['bytes'] / 1024 / 1024:.2f} MB")
+
+    if stats.get('dbstat_error'):
+        print(f"   ⚠️  dbstat 不可用，未统计字节占用: {stats['dbstat_error']}")
+    print("-" * 50)
+
+
+def append_history(stats, history_path=None):
+    """将统计结果追加到 JSONL 历史文件"""
+    history_path = history_path or os.path.join(Config.get_script_state_dir(), HISTORY_FILE)
+    os.makedirs(os.path.dirname(os.path.abspath(history_path)), exist_ok=True)
+    with open(history_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(stats, ensure_ascii=False) + "\n")
+    return history_path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="数据库统计（近似行数 + 空间占用）")
+    parser.add_argument("--analyze", action="store_true", help="统计前先执行 ANALYZE 刷新 sqlite_stat1")
+    parser.add_argument("--analysis-limit", type=int, default=DEFAULT_ANALYSIS_LIMIT,
+                        help=f"ANALYZE 采样行数上限，0 为全量 (默认 {DEFAULT_ANALYSIS_LIMIT})")
+    parser.add_argument("--exact", action="store_true", help="使用 COUNT(*) 统计精确行数（全表扫描）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出")
+    parser.add_argument("--record", nargs="?", const="", metavar="FILE",
+                        help="将结果追加到 JSONL 历史文件（默认 scriptState/db_stats_history.jsonl）")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}", file=sys.stderr)
+        return 1
+
+    if args.analyze:
+        run_analyze(args.analysis_limit)
+
+    stats = collect_stats(exact=args.exact)
+
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+    else:
+        print_stats(stats)
+
+    if args.record is not None:
+        history_path = append_history(stats, args.record or None)
+        if not args.json:
+            print(f"📝 已记录到: {history_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Python 数据库连接管理 - 对应 TypeScript 的 DatabaseManager
+为 test/ 下的查询脚本提供复用的只读 SQLite 连接，避免阻塞 Electron 应用的写入；
+维护脚本（清理、回收空间等）通过 get_write_connection 获取写连接；
+耗时较长的分析可以先用 open_snapshot 复制一份快照，之后的只读查询都在快照上执行
+"""
+
+import atexit
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from config import Config
+
+# 🔥 只读连接的性能参数
+MMAP_SIZE = 256 * 1024 * 1024      # 256MB 内存映射
+CACHE_SIZE_KB = 64 * 1024          # 64MB 页缓存
+BUSY_TIMEOUT_MS = 5000             # 应用写入时最多等待 5 秒
+CACHED_STATEMENTS = 256            # 预编译语句缓存数量
+
+# 🔥 快照只在脚本内分析使用，额外建立应用库中没有的索引（不影响应用写入）
+SNAPSHOT_INDEXES = (
+    ('messages', "CREATE INDEX IF NOT EXISTS idx_snapshot_messages_thread_timestamp ON messages(thread_id, timestamp)"),
+)
+
+# 🔥 已打开的连接（按 (模式, 数据库路径) 复用）
+_connections = {}
+_trace_callback = None
+_snapshot_files = []
+
+
+def get_db_uri(db_path=None, readonly=True):
+    """构建数据库 URI - 只读模式使用 mode=ro，写模式使用 mode=rw（不自动创建数据库）"""
+    uri = Path(db_path or Config.get_db_path()).resolve().as_uri()
+    return f"{uri}?mode={'ro' if readonly else 'rw'}"
+
+
+def _apply_readonly_pragmas(conn):
+    """设置只读连接参数"""
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+
+
+def get_readonly_connection(db_path=None):
+    """获取只读连接（同一数据库路径复用同一个连接）
+
+    连接以 URI mode=ro 打开并启用 query_only，不会修改 journal_mode，
+    也不会在应用运行时持有写锁。
+    """
+    db_path = db_path or Config.get_db_path()
+    key = ("ro", db_path)
+    conn = _connections.get(key)
+    if conn is not None:
+        return conn
+
+    conn = sqlite3.connect(
+        get_db_uri(db_path),
+        uri=True,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=CACHED_STATEMENTS,
+    )
+    conn.row_factory = sqlite3.Row
+    _apply_readonly_pragmas(conn)
+    conn.set_trace_callback(_trace_callback)
+
+    _connections[key] = conn
+    return conn
+
+
+def get_write_connection(db_path=None):
+    """获取写连接（自动提交模式，由调用方显式 BEGIN/COMMIT 控制短事务）
+
+    不修改 journal_mode（沿用应用设置的 WAL），与应用保持一致开启外键约束。
+    """
+    db_path = db_path or Config.get_db_path()
+    key = ("rw", db_path)
+    conn = _connections.get(key)
+    if conn is not None:
+        return conn
+
+    conn = sqlite3.connect(
+        get_db_uri(db_path, readonly=False),
+        uri=True,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        cached_statements=CACHED_STATEMENTS,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.set_trace_callback(_trace_callback)
+
+    _connections[key] = conn
+    return conn
+
+
+def _copy_tables(snapshot, db_path, tables):
+    """只复制指定表的数据（同一个读事务内逐表复制后立即释放应用库），返回这些表的索引语句"""
+    snapshot.execute("ATTACH DATABASE ? AS live", (get_db_uri(db_path),))
+    try:
+        snapshot.execute("BEGIN")
+        placeholders = ", ".join("?" for _ in tables)
+        schema = snapshot.execute(f"""
+            SELECT type, name, tbl_name, sql FROM live.sqlite_master
+            WHERE tbl_name IN ({placeholders}) AND type IN ('table', 'index') AND sql IS NOT NULL
+        """, list(tables)).fetchall()
+        missing = set(tables) - {row[2] for row in schema if row[0] == 'table'}
+        if missing:
+            raise ValueError(f"应用数据库中没有这些表: {', '.join(sorted(missing))}")
+
+        for kind, name, _, sql in schema:
+            if kind == 'table':
+                snapshot.execute(sql)
+                snapshot.execute(f'INSERT INTO main."{name}" SELECT * FROM live."{name}"')
+        snapshot.execute("COMMIT")
+    except Exception:
+        if snapshot.in_transaction:
+            snapshot.execute("ROLLBACK")
+        raise
+    finally:
+        snapshot.execute("DETACH DATABASE live")
+    return [sql for kind, _, _, sql in schema if kind == 'index']
+
+
+def open_snapshot(tables=None, in_memory=True, db_path=None):
+    """把应用数据库（或其中几张表）复制到内存 / 临时文件，之后 get_readonly_connection 返回该快照
+
+    整库复制使用在线备份 API 一次完成；只复制部分表时在同一个读事务内完成。
+    复制结束立即关闭应用库的连接，之后的分析不会再持有应用库的读事务（不阻止 WAL 检查点），
+    也不会看到同步过程中的中间状态。快照上额外建立分析用索引并执行 ANALYZE。
+    """
+    db_path = db_path or Config.get_db_path()
+    if in_memory:
+        target = ":memory:"
+    else:
+        os.makedirs(Config.get_temp_dir(), exist_ok=True)
+        fd, target = tempfile.mkstemp(prefix="db_snapshot_", suffix=".db", dir=Config.get_temp_dir())
+        os.close(fd)
+        _snapshot_files.append(target)
+
+    started_at = time.time()
+    snapshot = sqlite3.connect(target, cached_statements=CACHED_STATEMENTS, isolation_level=None)
+    snapshot.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    snapshot.execute("PRAGMA temp_store = MEMORY")
+    if tables:
+        snapshot.execute("PRAGMA journal_mode = OFF")
+        snapshot.execute("PRAGMA synchronous = OFF")
+        index_sql = _copy_tables(snapshot, db_path, tables)
+    else:
+        index_sql = []
+        source = sqlite3.connect(get_db_uri(db_path), uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+        try:
+            source.backup(snapshot)
+        finally:
+            source.close()
+        # 备份会带上源库的 WAL 标记，快照不需要日志
+        snapshot.execute("PRAGMA journal_mode = OFF")
+        snapshot.execute("PRAGMA synchronous = OFF")
+    copied_at = time.time()
+
+    # 🔥 以下都在快照上执行，应用库已释放：先建原有索引（数据导入后再建更快），再建分析用索引
+    for sql in index_sql:
+        snapshot.execute(sql)
+    copied = {row[0] for row in snapshot.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")}
+    for table, sql in SNAPSHOT_INDEXES:
+        if table in copied:
+            snapshot.execute(sql)
+    snapshot.execute("ANALYZE")
+
+    page_count = snapshot.execute("PRAGMA page_count").fetchone()[0]
+    page_size = snapshot.execute("PRAGMA page_size").fetchone()[0]
+    print(f"📸 已创建{'内存' if in_memory else '临时文件'}快照: {len(copied)} 张表, "
+          f"{page_count * page_size / 1024 / 1024:.2f} MB, 读取应用库 {copied_at - started_at:.2f} 秒, "
+          f"建索引 {time.time() - copied_at:.2f} 秒")
+
+    snapshot.row_factory = sqlite3.Row
+    snapshot.execute("PRAGMA query_only = ON")
+    snapshot.set_trace_callback(_trace_callback)
+
+    key = ("ro", db_path)
+    previous = _connections.pop(key, None)
+    if previous is not None:
+        previous.close()
+    _connections[key] = snapshot
+    return snapshot
+
+
+def set_trace_callback(callback):
+    """为所有复用的连接（包括之后打开的）设置语句跟踪回调，传入 None 取消
+
+    回调参数为绑定参数展开后的 SQL 文本，用于收集脚本实际执行的语句（例如执行计划审计）。
+    """
+    global _trace_callback
+    _trace_callback = callback
+    for conn in _connections.values():
+        conn.set_trace_callback(callback)
+
+
+def close_connections():
+    """关闭所有复用的连接，删除临时文件快照"""
+    while _connections:
+        _, conn = _connections.popitem()
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    while _snapshot_files:
+        path = _snapshot_files.pop()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+atexit.register(close_connections)
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+时间字段整数化迁移脚本
+messages.timestamp、message_threads.last_message_time、publish_records.start_time / created_at
+以 TEXT 保存且格式因平台而异（CURRENT_TIMESTAMP、ISO 8601、毫秒/秒级时间戳字符串），
+范围过滤和排序只能比较字符串或逐行解析。本脚本为这些字段增加 <字段>_epoch 整数列（UTC 秒）：
+  1. ALTER TABLE 增加列，并创建 INSERT / UPDATE 触发器，之后应用写入的行自动填充
+  2. 按 rowid 区间分批回填已有数据，每批一个短事务，支持断点续跑
+  3. 回填完成后创建索引（CREATE INDEX 无法分批，是唯一一次较长的写事务）
+查询脚本通过 range_conditions() 在迁移完成后自动改用整数列过滤
+"""
+
+import argparse
+import calendar
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+# 导入配置
+from config import Config, DB_PATH
+from db_connection import get_readonly_connection, get_write_connection
+
+DEFAULT_BATCH_SIZE = 5000       # 每批回填的 rowid 区间大小
+DEFAULT_PAUSE = 0.05            # 批次之间的暂停秒数（让应用写入）
+CHECKPOINT_FILE = "epoch_migration.json"
+
+# 🔥 需要整数化的字段: (表, 字段)
+EPOCH_COLUMNS = (
+    ("messages", "timestamp"),
+    ("message_threads", "last_message_time"),
+    ("publish_records", "start_time"),
+    ("publish_records", "created_at"),
+)
+
+
+def epoch_column(column):
+    return f"{column}_epoch"
+
+
+def epoch_sql(value):
+    """把 TEXT 时间转换为 UTC 秒的 SQL 表达式，无法解析时为 NULL
+
+    纯数字按长度区分毫秒（>= 12 位）和秒级时间戳，其余交给 strftime('%s')
+    （支持 'YYYY-MM-DD HH:MM:SS'、ISO 8601 及时区后缀，'/' 分隔的日期先替换为 '-'）。
+    """
+    return f"""CASE
+        WHEN {value} IS NULL OR {value} = '' THEN NULL
+        WHEN {value} NOT GLOB '*[^0-9]*' THEN
+            CASE WHEN length({value}) >= 12 THEN CAST({value} AS INTEGER) / 1000 ELSE CAST({value} AS INTEGER) END
+        ELSE CAST(strftime('%s', replace({value}, '/', '-')) AS INTEGER)
+    END"""
+
+
+def to_epoch(value):
+    """把命令行输入的日期 / 时间（按 UTC，与数据库中的文本一致）转换为 UTC 秒"""
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return number // 1000 if len(value) >= 12 else number
+    parsed = datetime.fromisoformat(value.replace('/', '-'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return calendar.timegm(parsed.timetuple())
+
+
+def _checkpoint_path():
+    return os.path.join(Config.get_script_state_dir(), CHECKPOINT_FILE)
+
+
+def load_checkpoint(db_path=None):
+    """读取迁移进度 {'db_path': ..., 'columns': {'表.字段': {'last_id', 'max_id', 'done'}}}"""
+    db_path = db_path or DB_PATH
+    path = _checkpoint_path()
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('db_path') == db_path:
+                return checkpoint
+        except (OSError, ValueError) as e:
+            print(f"⚠️  迁移进度文件无法读取，忽略: {e}")
+    return {'db_path': db_path, 'columns': {}}
+
+
+def save_checkpoint(checkpoint):
+    """保存迁移进度（先写临时文件再替换，避免中断时写坏）"""
+    path = _checkpoint_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    checkpoint['updated_at'] = datetime.now().isoformat(timespec='seconds')
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _has_column(conn, table, column):
+    return any(row['name'] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def epoch_ready(table, column, db_path=None):
+    """整数列是否存在且已回填完成（查询脚本据此决定是否使用整数列）"""
+    key = f"{table}.{column}"
+    if not load_checkpoint(db_path)['columns'].get(key, {}).get('done'):
+        return False
+    return _has_column(get_readonly_connection(db_path), table, epoch_column(column))
+
+
+def range_conditions(table, column, since=None, until=None, alias=None, db_path=None):
+    """生成时间范围过滤条件 (条件列表, 参数列表)：since 包含、until 不包含
+
+    整数列迁移完成时比较 <字段>_epoch（走其索引），否则退回到原 TEXT 字段的字符串比较。
+    """
+    conditions = []
+    params = []
+    if not since and not until:
+        return conditions, params
+
+    prefix = f"{alias}." if alias else ""
+    if epoch_ready(table, column, db_path):
+        target = f"{prefix}{epoch_column(column)}"
+        convert = to_epoch
+    else:
+        target = f"{prefix}{column}"
+        convert = str
+    if since:
+        conditions.append(f"{target} >= ?")
+        params.append(convert(since))
+    if until:
+        conditions.append(f"{target} < ?")
+        params.append(convert(until))
+    return conditions, params
+
+
+def _trigger_names(table, column):
+    base = f"trg_{table}_{epoch_column(column)}"
+    return f"{base}_insert", f"{base}_update"
+
+
+def _index_name(table, column):
+    return f"idx_{table}_{epoch_column(column)}"
+
+
+def install_column(conn, table, column):
+    """增加整数列和触发器（一个短事务），返回此时的最大 rowid（更大的行由触发器填充）"""
+    target = epoch_column(column)
+    insert_trigger, update_trigger = _trigger_names(table, column)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not _has_column(conn, table, target):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {target} INTEGER")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {insert_trigger} AFTER INSERT ON {table}
+            BEGIN
+                UPDATE {table} SET {target} = {epoch_sql(f'NEW.{column}')} WHERE rowid = NEW.rowid;
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {update_trigger} AFTER UPDATE OF {column} ON {table}
+            BEGIN
+                UPDATE {table} SET {target} = {epoch_sql(f'NEW.{column}')} WHERE rowid = NEW.rowid;
+            END
+        """)
+        max_id = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+        conn.execute("COMMIT")
+        return max_id
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def backfill_column(conn, table, column, state, checkpoint, batch_size=DEFAULT_BATCH_SIZE,
+                    pause=DEFAULT_PAUSE):
+    """按 rowid 区间分批回填，每批提交后保存进度"""
+    target = epoch_column(column)
+    started_at = time.time()
+    start_id = state['last_id']
+
+    while state['last_id'] < state['max_id']:
+        upper_id = min(state['last_id'] + batch_size, state['max_id'])
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"""
+                UPDATE {table} SET {target} = {epoch_sql(column)}
+                WHERE rowid > ? AND rowid <= ?
+            """, (state['last_id'], upper_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        state['last_id'] = upper_id
+        save_checkpoint(checkpoint)
+
+        done = state['last_id'] - start_id
+        total = state['max_id'] - start_id
+        rate = done / max(time.time() - started_at, 1e-6)
+        sys.stdout.write(f"\r   [{table}.{column}] {done}/{total} ({done / total * 100:.1f}%) - {rate:.0f} 行/秒")
+        sys.stdout.flush()
+
+        # 🔥 让出写锁，应用可以在批次之间写入
+        if pause > 0:
+            time.sleep(pause)
+    if state['last_id'] > start_id:
+        print()
+
+
+def migrate(columns=EPOCH_COLUMNS, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE, db_path=None):
+    """执行（或继续）迁移"""
+    db_path = db_path or DB_PATH
+    conn = get_write_connection(db_path)
+    checkpoint = load_checkpoint(db_path)
+
+    for table, column in columns:
+        key = f"{table}.{column}"
+        state = checkpoint['columns'].get(key)
+        if state is None or not _has_column(conn, table, epoch_column(column)):
+            state = {'last_id': 0, 'max_id': install_column(conn, table, column), 'done': False}
+            checkpoint['columns'][key] = state
+            save_checkpoint(checkpoint)
+            print(f"➕ {key}: 已增加 {epoch_column(column)} 列和触发器")
+        elif state['done']:
+            print(f"✅ {key}: 已完成")
+            continue
+
+        backfill_column(conn, table, column, state, checkpoint, batch_size, pause)
+
+        started_at = time.time()
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {_index_name(table, column)} ON {table}({epoch_column(column)})")
+        state['done'] = True
+        save_checkpoint(checkpoint)
+        print(f"✅ {key}: 回填完成，索引 {_index_name(table, column)} 创建耗时 {time.time() - started_at:.2f} 秒")
+
+
+def drop(columns=EPOCH_COLUMNS, db_path=None):
+    """撤销迁移：删除触发器、索引和整数列"""
+    db_path = db_path or DB_PATH
+    conn = get_write_connection(db_path)
+    checkpoint = load_checkpoint(db_path)
+
+    for table, column in columns:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for trigger in _trigger_names(table, column):
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.execute(f"DROP INDEX IF EXISTS {_index_name(table, column)}")
+            if _has_column(conn, table, epoch_column(column)):
+                conn.execute(f"ALTER TABLE {table} DROP COLUMN {epoch_column(column)}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        checkpoint['columns'].pop(f"{table}.{column}", None)
+        save_checkpoint(checkpoint)
+        print(f"🗑️  {table}.{column}: 已删除 {epoch_column(column)}")
+
+
+def print_status(db_path=None):
+    """打印每个字段的迁移状态，以及已回填部分无法解析的行数"""
+    conn = get_readonly_connection(db_path)
+    checkpoint = load_checkpoint(db_path)
+
+    print("📋 时间字段整数化状态:")
+    for table, column in EPOCH_COLUMNS:
+        key = f"{table}.{column}"
+        state = checkpoint['columns'].get(key)
+        if not _has_column(conn, table, epoch_column(column)):
+            print(f"   {key}: 未迁移")
+            continue
+        if state is None:
+            print(f"   {key}: 列已存在，但没有本机的迁移进度（运行 --migrate 继续）")
+            continue
+        if state['done']:
+            unparsed = conn.execute(f"""
+                SELECT COUNT(*) FROM {table}
+                WHERE {epoch_column(column)} IS NULL AND {column} IS NOT NULL AND {column} != ''
+            """).fetchone()[0]
+            note = f", {unparsed} 行无法解析" if unparsed else ""
+            print(f"   {key}: ✅ 已完成{note}")
+        else:
+            percent = state['last_id'] / state['max_id'] * 100 if state['max_id'] else 100.0
+            print(f"   {key}: 回填中 {state['last_id']}/{state['max_id']} ({percent:.1f}%)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="时间字段整数化迁移（增加并分批回填 *_epoch 列）")
+    parser.add_argument("--migrate", action="store_true", help="执行或继续迁移")
+    parser.add_argument("--drop", action="store_true", help="撤销迁移，删除触发器、索引和整数列")
+    parser.add_argument("--tables", nargs="+", choices=sorted({table for table, _ in EPOCH_COLUMNS}),
+                        help="只处理指定的表")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"每批回填的 rowid 区间大小 (默认 {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE,
+                        help=f"批次之间暂停的秒数 (默认 {DEFAULT_PAUSE})")
+    parser.add_argument("--yes", action="store_true", help="跳过确认提示")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return
+
+    columns = [(table, column) for table, column in EPOCH_COLUMNS if not args.tables or table in args.tables]
+
+    print("🚀 时间字段整数化迁移工具")
+    print("=" * 60)
+
+    try:
+        if args.migrate or args.drop:
+            action = "增加并回填" if args.migrate else "删除"
+            if not args.yes:
+                print(f"将{action}: {', '.join(f'{table}.{epoch_column(column)}' for table, column in columns)}")
+                confirm = input("是否继续? 输入 'YES' 确认: ").strip()
+                if confirm.upper() != 'YES':
+                    print("👋 操作已取消")
+                    return
+            if args.migrate:
+                migrate(columns, args.batch_size, args.pause)
+            else:
+                drop(columns)
+        print_status()
+    except sqlite3.Error as e:
+        print(f"❌ 数据库错误: {e}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断，重新运行 --migrate 即可从检查点继续")
+        sys.exit(1)
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+数据导出脚本
+按 id 键集分块流式导出 message_threads / messages / publish_records / publish_account_status，
+支持 NDJSON、CSV（可 gzip 压缩）以及 Parquet（需要安装 pyarrow），内存占用与表大小无关；
+每次导出后记录高水位，--incremental 时只导出上次之后新增/更新的行
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# 导入配置
+from config import Config, DB_PATH
+from db_connection import get_readonly_connection
+from json_codec import decode_column, dumps
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - 可选依赖
+    pa = None
+    pq = None
+
+# 🔥 默认参数
+DEFAULT_CHUNK_SIZE = 5000
+STATE_FILE = "export_state.json"
+FORMATS = ("ndjson", "csv", "parquet")
+
+# 🔥 可导出的表及其增量方式：
+#   id         - 只追加的表，导出 id 大于高水位的行
+#   updated_at - 会被更新的表，导出 updated_at 不早于高水位的行（同一秒内的行可能重复导出，按 id 去重即可）
+#   parent     - publish_account_status 没有 updated_at，导出新行以及所属发布记录已更新的行
+EXPORT_TABLES = {
+    'message_threads': 'updated_at',
+    'messages': 'id',
+    'publish_records': 'updated_at',
+    'publish_account_status': 'parent',
+}
+
+
+# ==================== 高水位 ====================
+
+def _state_path():
+    return os.path.join(Config.get_script_state_dir(), STATE_FILE)
+
+
+def load_marks(db_path):
+    """读取各表的高水位，数据库路径不一致时视为没有高水位"""
+    try:
+        with open(_state_path(), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if state.get('db_path') != db_path:
+        return {}
+    return state.get('tables', {})
+
+
+def save_mark(db_path, table, mark):
+    """保存单个表的高水位（先写临时文件再替换）"""
+    marks = load_marks(db_path)
+    marks[table] = dict(mark, exported_at=datetime.now().isoformat(timespec='seconds'))
+    path = _state_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'db_path': db_path, 'tables': marks}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _current_mark(conn, table):
+    """读取当前快照中的高水位（与导出在同一读事务内，保证一致）"""
+    max_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+    mark = {'last_id': max_id}
+    if EXPORT_TABLES[table] == 'updated_at':
+        # 🔥 应用同时写入 CURRENT_TIMESTAMP 与 ISO 字符串两种格式，统一用 datetime() 归一化后比较
+        mark['updated_at'] = conn.execute(
+            f"SELECT MAX(datetime(updated_at)) FROM {table}"
+        ).fetchone()[0]
+    elif EXPORT_TABLES[table] == 'parent':
+        mark['records_updated_at'] = conn.execute(
+            "SELECT MAX(datetime(updated_at)) FROM publish_records"
+        ).fetchone()[0]
+    return mark
+
+
+def _incremental_condition(table, mark):
+    """根据上次的高水位生成增量条件，返回 (SQL 条件, 参数)"""
+    mode = EXPORT_TABLES[table]
+    if mode == 'updated_at' and mark.get('updated_at'):
+        return "datetime(updated_at) >= ?", [mark['updated_at']]
+    if mode == 'parent' and mark.get('records_updated_at'):
+        return (
+            "(id > ? OR record_id IN (SELECT id FROM publish_records WHERE datetime(updated_at) >= ?))",
+            [mark.get('last_id', 0), mark['records_updated_at']],
+        )
+    if mode in ('id', 'parent'):
+        return "id > ?", [mark.get('last_id', 0)]
+    return None, []
+
+
+# ==================== 读取 ====================
+
+def _parse_image_paths(value):
+    """messages.image_paths 解析为字符串列表（非法 JSON 时保留原始文本）"""
+    images = decode_column(value, [])
+    if not isinstance(images, list):
+        images = [images]
+    return [image if isinstance(image, str) else dumps(image) for image in images]
+
+
+def iter_chunks(conn, table, condition=None, params=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """按 id 键集分块读取，每次产出一个 dict 列表"""
+    last_id = 0
+    while True:
+        where = "id > ?"
+        if condition:
+            where += f" AND {condition}"
+        rows = conn.execute(
+            f"SELECT * FROM {table} WHERE {where} ORDER BY id LIMIT ?",
+            [last_id] + list(params or []) + [chunk_size],
+        ).fetchall()
+        if not rows:
+            break
+
+        chunk = [dict(row) for row in rows]
+        if table == 'messages':
+            for row in chunk:
+                row['image_paths'] = _parse_image_paths(row['image_paths'])
+        yield chunk
+
+        if len(rows) < chunk_size:
+            break
+        last_id = rows[-1]['id']
+
+
+def get_columns(conn, table):
+    """返回 [(列名, 声明类型)]"""
+    return [(row['name'], (row['type'] or '').upper()) for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+# ==================== 写入 ====================
+
+def _open_text(path, compress):
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+class NdjsonWriter:
+    def __init__(self, path, columns, compress=False):
+        self.file = _open_text(path, compress)
+
+    def write(self, chunk):
+        self.file.write("".join(dumps(row) + "\n" for row in chunk))
+
+    def close(self):
+        self.file.close()
+
+
+class CsvWriter:
+    def __init__(self, path, columns, compress=False):
+        self.file = _open_text(path, compress)
+        self.writer = csv.writer(self.file)
+        self.names = [name for name, _ in columns]
+        self.writer.writerow(self.names)
+
+    def write(self, chunk):
+        self.writer.writerows(
+            [dumps(row[name]) if isinstance(row[name], list) else row[name] for name in self.names]
+            for row in chunk
+        )
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, columns, compress=False):
+        fields = []
+        self.string_columns = []
+        for name, declared in columns:
+            if name == 'image_paths':
+                fields.append(pa.field(name, pa.list_(pa.string())))
+            elif 'INT' in declared or 'BOOL' in declared:
+                fields.append(pa.field(name, pa.int64()))
+            elif 'REAL' in declared or 'FLOA' in declared or 'DOUB' in declared:
+                fields.append(pa.field(name, pa.float64()))
+            else:
+                fields.append(pa.field(name, pa.string()))
+                self.string_columns.append(name)
+        self.schema = pa.schema(fields)
+        # Parquet 自带列压缩，gzip 选项对应 gzip 列编码
+        self.writer = pq.ParquetWriter(path, self.schema, compression='gzip' if compress else 'snappy')
+
+    def write(self, chunk):
+        # SQLite 是动态类型，TEXT 列里可能存有数字，统一转成字符串以符合 schema
+        for row in chunk:
+            for name in self.string_columns:
+                if row[name] is not None and not isinstance(row[name], str):
+                    row[name] = str(row[name])
+        self.writer.write_table(pa.Table.from_pylist(chunk, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {
+    'ndjson': NdjsonWriter,
+    'csv': CsvWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def _output_path(output_dir, table, fmt, compress, stamp):
+    ext = {'ndjson': 'ndjson', 'csv': 'csv', 'parquet': 'parquet'}[fmt]
+    if compress and fmt != 'parquet':
+        ext += '.gz'
+    return os.path.join(output_dir, f"{table}_{stamp}.{ext}")
+
+
+# ==================== 导出 ====================
+
+def export_table(conn, table, fmt, output_path, compress=False, mark=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+    """导出单个表，返回导出的行数；没有数据时不生成文件"""
+    condition, params = _incremental_condition(table, mark) if mark else (None, [])
+    tmp_path = output_path + ".part"
+    writer = None
+    exported = 0
+    started_at = time.time()
+
+    try:
+        for chunk in iter_chunks(conn, table, condition, params, chunk_size):
+            if writer is None:
+                writer = WRITERS[fmt](tmp_path, get_columns(conn, table), compress)
+            writer.write(chunk)
+            exported += len(chunk)
+            elapsed = max(time.time() - started_at, 1e-6)
+            sys.stdout.write(f"\r   {table}: {exported} 行 - {exported / elapsed:.0f} 行/秒")
+            sys.stdout.flush()
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            os.remove(tmp_path)
+        raise
+
+    if writer is None:
+        print(f"   {table}: 没有需要导出的行")
+        return 0
+
+    writer.close()
+    os.replace(tmp_path, output_path)
+    print(f"\n   ✅ {table}: {exported} 行 -> {output_path} ({os.path.getsize(output_path) / 1024 / 1024:.2f} MB)")
+    return exported
+
+
+def export_data(tables=None, fmt="ndjson", compress=False, incremental=False, output_dir=None,
+                chunk_size=DEFAULT_CHUNK_SIZE, db_path=None):
+    """导出多个表，返回 {表名: 导出行数}
+
+    所有表在同一个读事务中导出，保证各表之间（以及与高水位之间）的一致性。
+    """
+    if fmt == 'parquet' and pa is None:
+        raise RuntimeError("导出 Parquet 需要安装 pyarrow: pip install pyarrow")
+
+    db_path = db_path or DB_PATH
+    tables = tables or list(EXPORT_TABLES)
+    output_dir = output_dir or Config.get_export_dir()
+    os.makedirs(output_dir, exist_ok=True)
+
+    conn = get_readonly_connection(db_path)
+    marks = load_marks(db_path) if incremental else {}
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results = {}
+
+    print(f"📤 导出 {len(tables)} 个表 ({fmt}{', gzip' if compress else ''}"
+          f"{', 增量' if incremental else ''}) -> {output_dir}")
+
+    conn.execute("BEGIN")
+    try:
+        for table in tables:
+            if incremental and table not in marks:
+                print(f"   ℹ️  {table}: 没有高水位，执行全量导出")
+            new_mark = _current_mark(conn, table)
+            output_path = _output_path(output_dir, table, fmt, compress, stamp)
+            results[table] = export_table(
+                conn, table, fmt, output_path, compress, marks.get(table), chunk_size
+            )
+            save_mark(db_path, table, new_mark)
+    finally:
+        conn.execute("COMMIT")
+
+    print(f"✅ 导出完成: 共 {sum(results.values())} 行")
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="流式导出私信与发布记录数据")
+    parser.add_argument("--tables", nargs="+", choices=list(EXPORT_TABLES),
+                        help="要导出的表（默认全部）")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson", help="导出格式 (默认 ndjson)")
+    parser.add_argument("--gzip", action="store_true", help="gzip 压缩（Parquet 使用 gzip 列压缩）")
+    parser.add_argument("--incremental", action="store_true", help="只导出上次导出之后新增/更新的行")
+    parser.add_argument("--output", help="输出目录（默认 exports/）")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"每块读取的行数 (默认 {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--show-marks", action="store_true", help="显示当前高水位后退出")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return 1
+
+    if args.show_marks:
+        marks = load_marks(DB_PATH)
+        if not marks:
+            print("ℹ️  还没有导出记录")
+        for table, mark in marks.items():
+            print(f"   {table}: {mark}")
+        return 0
+
+    try:
+        export_data(
+            tables=args.tables,
+            fmt=args.format,
+            compress=args.gzip,
+            incremental=args.incremental,
+            output_dir=args.output,
+            chunk_size=args.chunk_size,
+        )
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断，未完成的文件已删除，高水位未更新")
+        sys.exit(1)
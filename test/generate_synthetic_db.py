@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+合成数据库生成脚本
+直接从 AccountStorage.ts / MessageStorage.ts / PublishRecordStorage.ts 中提取建表语句，
+按指定规模生成账号、私信线程、消息和发布记录（按 Zipf 分布制造热点账号/线程），
+用于在大数据量下测试和评估各个维护脚本
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+# 复用与 MessageStorage 一致的指纹算法
+from backfill_content_hash import stable_history_fingerprint
+
+# 🔥 建表语句来源（与应用保持完全一致，按外键依赖顺序）
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_SOURCES = (
+    "packages/backend/src/main/plugins/login/base/AccountStorage.ts",
+    "packages/backend/src/main/plugins/message/base/MessageStorage.ts",
+    "packages/backend/src/main/plugins/uploader/base/PublishRecordStorage.ts",
+)
+_EXEC_BLOCK = re.compile(r"db\.exec\(\s*`(.*?)`", re.S)
+
+# 🔥 默认规模
+DEFAULT_ACCOUNTS = 50
+DEFAULT_THREADS = 5000
+DEFAULT_MESSAGES = 200000
+DEFAULT_PUBLISH_RECORDS = 20000
+DEFAULT_SKEW = 1.1              # Zipf 指数，越大热点越集中
+INSERT_BATCH = 10000
+HISTORY_DAYS = 180
+
+PLATFORMS = {1: 'xiaohongshu', 2: 'wechat', 3: 'douyin', 4: 'kuaishou'}
+PLATFORM_WEIGHTS = [25, 15, 45, 15]
+PHRASES = [
+    "你好", "在吗", "请问这个还有货吗", "多少钱", "谢谢", "好的", "收到", "已经发货了",
+    "可以便宜点吗", "什么时候发货", "这个颜色有现货吗", "麻烦看一下订单", "👍", "哈哈哈",
+    "视频拍得真好", "求链接", "已关注", "合作请私信", "明天联系你", "辛苦了",
+]
+
+
+def load_schema(repo_root=REPO_ROOT):
+    """从 TS 源码提取 CREATE 语句，返回 (建表语句列表, 建索引语句列表)"""
+    tables = []
+    indexes = []
+    for source in SCHEMA_SOURCES:
+        with open(os.path.join(repo_root, source), 'r', encoding='utf-8') as f:
+            code = f.read()
+        for block in _EXEC_BLOCK.findall(code):
+            statement = ""
+            for piece in block.split(";"):
+                statement += piece + ";"
+                # 分号可能出现在注释中，拼接到语句完整为止
+                if not sqlite3.complete_statement(statement):
+                    continue
+                sql = statement.strip()
+                statement = ""
+                if sql.upper().startswith("CREATE TABLE"):
+                    tables.append(sql)
+                elif sql.upper().startswith("CREATE INDEX"):
+                    indexes.append(sql)
+    if not tables:
+        raise RuntimeError("未能从 TS 源码中提取到建表语句")
+    return tables, indexes
+
+
+def _zipf_cum_weights(n, skew):
+    return list(accumulate(1.0 / (rank ** skew) for rank in range(1, n + 1)))
+
+
+def _timestamp(dt):
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def _insert_batches(conn, sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH:
+            conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+
+
+class SyntheticGenerator:
+    """按给定规模生成数据（同一 seed 生成的数据完全相同）"""
+
+    def __init__(self, accounts=DEFAULT_ACCOUNTS, threads=DEFAULT_THREADS, messages=DEFAULT_MESSAGES,
+                 publish_records=DEFAULT_PUBLISH_RECORDS, skew=DEFAULT_SKEW, seed=42,
+                 hash_coverage=0.85, duplicate_rate=0.01):
+        self.accounts = accounts
+        self.threads = threads
+        self.messages = messages
+        self.publish_records = publish_records
+        self.skew = skew
+        self.seed = seed
+        self.hash_coverage = hash_coverage
+        self.duplicate_rate = duplicate_rate
+        self.random = random.Random(seed)
+        self.now = datetime(2025, 6, 1, 12, 0, 0)
+        self.account_rows = []
+
+    def params(self):
+        return {
+            'accounts': self.accounts, 'threads': self.threads, 'messages': self.messages,
+            'publish_records': self.publish_records, 'skew': self.skew, 'seed': self.seed,
+            'hash_coverage': self.hash_coverage, 'duplicate_rate': self.duplicate_rate,
+        }
+
+    # ==================== 账号 ====================
+
+    def generate_accounts(self, conn):
+        rnd = self.random
+        groups = [("运营组", "#5B73DE"), ("测试组", "#10B981"), ("矩阵号", "#F59E0B")]
+        conn.executemany("INSERT INTO account_groups(name, color) VALUES (?, ?)", groups)
+
+        rows = []
+        for i in range(1, self.accounts + 1):
+            platform_type = rnd.choices(list(PLATFORMS), PLATFORM_WEIGHTS)[0]
+            platform = PLATFORMS[platform_type]
+            user_name = f"{platform}_user_{i}"
+            self.account_rows.append((platform, f"acct_{i}", user_name, platform_type))
+            has_avatar = rnd.random() < 0.8
+            rows.append((
+                platform_type, f"{platform_type}_{user_name}.json", user_name,
+                1 if rnd.random() < 0.85 else 0,
+                rnd.choice([1, 2, 3, None]),
+                f"acct_{i}", f"真实姓名{i}", int(rnd.paretovariate(1.2) * 100), rnd.randint(0, 500),
+                f"这是 {user_name} 的简介",
+                f"https://example.com/avatar/{i}.jpg" if has_avatar else None,
+                f"assets/avatar/{platform}/{user_name}/avatar.jpg" if has_avatar else None,
+                _timestamp(self.now - timedelta(minutes=rnd.randint(0, 60 * 24 * 7))),
+            ))
+        conn.executemany("""
+            INSERT INTO user_info (type, filePath, userName, status, group_id, account_id, real_name,
+                                   followers_count, videos_count, bio, avatar_url, local_avatar, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+    # ==================== 私信 ====================
+
+    def _thread_sizes(self):
+        """按 Zipf 分布把消息分配到线程，返回每个线程的消息数"""
+        sizes = [0] * self.threads
+        cum_weights = _zipf_cum_weights(self.threads, self.skew)
+        order = list(range(self.threads))
+        self.random.shuffle(order)      # 热点线程随机分布在各账号下
+        remaining = self.messages
+        while remaining > 0:
+            block = min(remaining, 100000)
+            for index in self.random.choices(order, cum_weights=cum_weights, k=block):
+                sizes[index] += 1
+            remaining -= block
+        return sizes
+
+    def _message_text(self):
+        rnd = self.random
+        words = rnd.choices(PHRASES, k=max(1, int(rnd.expovariate(0.5))))
+        return "，".join(words)
+
+    def generate_messages(self, conn):
+        rnd = self.random
+        account_weights = _zipf_cum_weights(len(self.account_rows), self.skew)
+        sizes = self._thread_sizes()
+        thread_rows = []
+        sync_accounts = set()
+        message_id = 0
+
+        def message_rows():
+            nonlocal message_id
+            for thread_id, size in enumerate(sizes, 1):
+                platform, account_id, _, _ = rnd.choices(self.account_rows, cum_weights=account_weights)[0]
+                sync_accounts.add((platform, account_id))
+                current = self.now - timedelta(days=rnd.uniform(1, HISTORY_DAYS))
+                history = []
+                unread = 0
+                for index in range(size):
+                    current += timedelta(seconds=int(rnd.expovariate(1 / 3600)) + 1)
+                    kind = rnd.random()
+                    content_type = 'text' if kind < 0.88 else ('image' if kind < 0.96 else 'mixed')
+                    text = self._message_text() if content_type != 'image' else None
+                    images = []
+                    if content_type != 'text':
+                        images = [
+                            f"{platform}/{account_id}/thread_{thread_id}/{int(current.timestamp() * 1000)}_{i}.jpg"
+                            for i in range(rnd.randint(1, 3))
+                        ]
+                    sender = 'user' if rnd.random() < 0.55 else 'me'
+                    history.append((sender, text, images))
+                    content_hash = None
+                    if rnd.random() < self.hash_coverage:
+                        content_hash = stable_history_fingerprint(history, index, thread_id)
+                    is_read = 0 if sender == 'user' and index >= size - 3 and rnd.random() < 0.5 else 1
+                    if not is_read:
+                        unread += 1
+                    row = (thread_id, f"msg_{thread_id}_{index}", sender, content_type, text,
+                           json.dumps(images) if images else None, content_hash, _timestamp(current), is_read,
+                           _timestamp(current + timedelta(seconds=rnd.randint(1, 600))))
+                    message_id += 1
+                    yield row
+                    # 🔥 模拟重复同步产生的重复消息（指纹相同）
+                    if content_hash and rnd.random() < self.duplicate_rate:
+                        message_id += 1
+                        yield row
+
+                thread_rows.append((
+                    platform, account_id, f"u_{thread_id}", f"用户{thread_id}",
+                    f"https://example.com/u/{thread_id}.jpg", unread,
+                    _timestamp(current) if size else None, _timestamp(self.now),
+                    _timestamp(current - timedelta(days=1)), _timestamp(current),
+                ))
+
+        _insert_batches(conn, """
+            INSERT INTO messages (thread_id, message_id, sender, content_type, text_content, image_paths,
+                                  content_hash, timestamp, is_read, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, message_rows())
+
+        conn.executemany("""
+            INSERT INTO message_threads (platform, account_id, user_id, user_name, user_avatar, unread_count,
+                                         last_message_time, last_sync_time, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, thread_rows)
+
+        conn.executemany("""
+            INSERT INTO platform_sync_status (platform, account_id, last_sync_time, sync_count, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(platform, account_id, _timestamp(self.now), rnd.randint(1, 500), _timestamp(self.now))
+              for platform, account_id in sorted(sync_accounts)])
+        return message_id
+
+    # ==================== 发布记录 ====================
+
+    def generate_publish_records(self, conn):
+        rnd = self.random
+        creators = ["system", "admin", "operator1", "operator2", "operator3"]
+        creator_weights = _zipf_cum_weights(len(creators), self.skew)
+        errors = ["上传超时", "登录失效，请重新登录", "视频审核未通过", "网络异常", "封面上传失败"]
+        status_rows = []
+
+        def record_rows():
+            for record_id in range(1, self.publish_records + 1):
+                created = self.now - timedelta(seconds=rnd.uniform(0, HISTORY_DAYS * 86400))
+                accounts = rnd.sample(self.account_rows, min(len(self.account_rows), rnd.randint(1, 8)))
+                videos = [f"video_{record_id}_{i}.mp4" for i in range(rnd.randint(1, 3))]
+                covers = [f"covers/{record_id}_{i}.png" for i in range(rnd.randint(0, 3))]
+                pending = rnd.random() < 0.02
+                fail_rate = rnd.choice([0.02, 0.05, 0.3])
+                duration = int(rnd.lognormvariate(4.5, 0.8))
+                end = created + timedelta(seconds=duration)
+
+                success = failed = 0
+                for platform, _, user_name, _ in accounts:
+                    if pending:
+                        state, error = 'pending', None
+                    elif rnd.random() < fail_rate:
+                        state, error = 'failed', rnd.choice(errors)
+                        failed += 1
+                    else:
+                        state, error = 'success', None
+                        success += 1
+                    status_rows.append((
+                        record_id, user_name, platform, state,
+                        'success' if state == 'success' else ('failed' if state == 'failed' else None),
+                        'success' if state == 'success' else None, None, None, error,
+                        _iso(created), None if pending else _iso(end), _timestamp(created),
+                    ))
+
+                if pending:
+                    status = 'pending'
+                elif failed == 0:
+                    status = 'success'
+                elif success == 0:
+                    status = 'failed'
+                else:
+                    status = 'partial'
+
+                account_list = [
+                    {"accountName": user_name, "platform": platform, "filePath": f"{platform_type}_{user_name}.json"}
+                    for platform, _, user_name, platform_type in accounts
+                ]
+                config = {"title": f"发布任务 {record_id}", "tags": rnd.sample(PHRASES, 3),
+                          "description": self._message_text() * 5, "enableTimer": False}
+                yield (
+                    f"发布任务 {record_id}", json.dumps(videos), json.dumps(account_list, ensure_ascii=False),
+                    json.dumps(covers), rnd.choice(list(PLATFORMS)), status, len(accounts), success, failed,
+                    _iso(created), None if pending else _iso(end), None if pending else duration,
+                    rnd.choices(creators, cum_weights=creator_weights)[0],
+                    _timestamp(created), _iso(end if not pending else created),
+                    json.dumps(config, ensure_ascii=False),
+                    json.dumps({"fileList": videos, "accountList": account_list}, ensure_ascii=False),
+                )
+
+        _insert_batches(conn, """
+            INSERT INTO publish_records (title, video_files, account_list, cover_screenshots, platform_type,
+                                         status, total_accounts, success_accounts, failed_accounts, start_time,
+                                         end_time, duration, created_by, created_at, updated_at,
+                                         publish_config, original_request_data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, record_rows())
+
+        _insert_batches(conn, """
+            INSERT INTO publish_account_status (record_id, account_name, platform, status, upload_status,
+                                                push_status, transcode_status, review_status, error_message,
+                                                start_time, end_time, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, status_rows)
+        return len(status_rows)
+
+
+def generate_database(db_path, generator, overwrite=False, repo_root=REPO_ROOT):
+    """生成合成数据库，返回各表行数"""
+    if os.path.exists(db_path) and not overwrite:
+        raise FileExistsError(f"数据库已存在: {db_path}")
+
+    tables, indexes = load_schema(repo_root)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    tmp_path = db_path + ".building"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    started_at = time.time()
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        # 🔥 生成期间关闭日志和同步，先写数据再建索引
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -262144")
+        for sql in tables:
+            conn.execute(sql)
+
+        conn.execute("BEGIN")
+        generator.generate_accounts(conn)
+        print(f"   账号: {generator.accounts} 个")
+        inserted = generator.generate_messages(conn)
+        print(f"   线程: {generator.threads} 个, 消息: {inserted} 条 (含 {inserted - generator.messages} 条重复)")
+        status_count = generator.generate_publish_records(conn)
+        print(f"   发布记录: {generator.publish_records} 条, 账号发布状态: {status_count} 条")
+        conn.execute("COMMIT")
+
+        for sql in indexes:
+            conn.execute(sql)
+        conn.execute("PRAGMA journal_mode = WAL")
+
+        counts = {
+            row[0]: conn.execute(f'SELECT COUNT(*) FROM "{row[0]}"').fetchone()[0]
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            ).fetchall()
+        }
+    finally:
+        conn.close()
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    os.replace(tmp_path, db_path)
+    print(f"✅ 生成完成: {db_path} ({os.path.getsize(db_path) / 1024 / 1024:.1f} MB, "
+          f"耗时 {time.time() - started_at:.1f} 秒)")
+    return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="生成合成测试数据库（使用应用的建表语句）")
+    parser.add_argument("output", help="输出数据库路径")
+    parser.add_argument("--accounts", type=int, default=DEFAULT_ACCOUNTS, help=f"账号数 (默认 {DEFAULT_ACCOUNTS})")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS, help=f"私信线程数 (默认 {DEFAULT_THREADS})")
+    parser.add_argument("--messages", type=int, default=DEFAULT_MESSAGES, help=f"消息数 (默认 {DEFAULT_MESSAGES})")
+    parser.add_argument("--publish-records", type=int, default=DEFAULT_PUBLISH_RECORDS,
+                        help=f"发布记录数 (默认 {DEFAULT_PUBLISH_RECORDS})")
+    parser.add_argument("--skew", type=float, default=DEFAULT_SKEW, help=f"Zipf 偏斜指数 (默认 {DEFAULT_SKEW})")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子 (默认 42)")
+    parser.add_argument("--overwrite", action="store_true", help="覆盖已存在的数据库")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    generator = SyntheticGenerator(
+        accounts=args.accounts,
+        threads=args.threads,
+        messages=args.messages,
+        publish_records=args.publish_records,
+        skew=args.skew,
+        seed=args.seed,
+    )
+    print(f"🏗️  生成合成数据库: {generator.params()}")
+    try:
+        counts = generate_database(args.output, generator, overwrite=args.overwrite)
+    except FileExistsError as e:
+        print(f"❌ {e}（使用 --overwrite 覆盖）")
+        return 1
+    for table, count in counts.items():
+        print(f"   {table}: {count} 行")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断")
+        sys.exit(1)
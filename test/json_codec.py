@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+JSON 编解码工具
+安装了 orjson 时使用 orjson（解析速度快数倍），否则回退到标准库 json
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def loads(value):
+    """解析 JSON 文本（str 或 bytes）"""
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
+
+
+def dumps(value):
+    """序列化为 JSON 文本（保留中文字符，不做 ASCII 转义）"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str).decode('utf-8')
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def decode_column(value, default=None):
+    """解析数据库中的 JSON 列，空值返回 default，非法 JSON 返回原始文本"""
+    if value is None or value == '':
+        return default
+    try:
+        return loads(value)
+    except ValueError:
+        return value
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+私信消息冷归档脚本
+把早于保留期限的消息按月份移动到 archive/messages_YYYY-MM.db：
+ATTACH 当月归档库后按 rowid 区间分批 INSERT ... SELECT，核对归档中的行与在线库一致后再分批 DELETE；
+归档库同时保存相关线程信息的快照，查询模式按时间范围按需 ATTACH 归档库，与在线库一起检索
+"""
+
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+# 导入配置
+from config import Config, DB_PATH
+from db_connection import get_db_uri, get_readonly_connection, get_write_connection
+
+DEFAULT_RETENTION_DAYS = 180
+DEFAULT_BATCH_SIZE = 2000       # 每批归档的行数
+DEFAULT_PAUSE = 0.05            # 批次之间的暂停秒数（让应用的消息同步写入）
+DEFAULT_LIMIT = 50
+ATTACH_LIMIT = 8                # 查询时一次 ATTACH 的归档库数量（SQLite 默认最多 10 个）
+ARCHIVE_SCHEMA = "archive"
+ARCHIVE_TABLES = ("message_threads", "messages")
+_MONTH = re.compile(r"^\d{4}-\d{2}$")
+
+
+def archive_path(month):
+    return os.path.join(Config.get_archive_dir(), f"messages_{month}.db")
+
+
+def list_archives():
+    """返回已有归档 {月份: 文件路径}，按月份排序"""
+    archives = {}
+    for path in glob.glob(os.path.join(Config.get_archive_dir(), "messages_*.db")):
+        month = os.path.basename(path)[len("messages_"):-len(".db")]
+        if _MONTH.match(month):
+            archives[month] = path
+    return dict(sorted(archives.items()))
+
+
+def _next_month(month):
+    year, number = map(int, month.split("-"))
+    return f"{year + number // 12}-{number % 12 + 1:02d}"
+
+
+def archivable_months(conn, cutoff):
+    """返回早于 cutoff 的消息所在月份列表
+
+    每个月份用 idx_messages_timestamp 定位一次（MIN(timestamp) 跳到下一个月），不扫描消息。
+    timestamp 不是 YYYY-MM 开头的消息不归档。
+    """
+    months = []
+    lower = ""
+    while True:
+        timestamp = conn.execute(
+            "SELECT MIN(timestamp) FROM messages WHERE timestamp >= ? AND timestamp < ?", (lower, cutoff)
+        ).fetchone()[0]
+        if timestamp is None:
+            return months
+        month = timestamp[:7]
+        if _MONTH.match(month):
+            months.append(month)
+            lower = _next_month(month)
+        else:
+            # 跳过格式异常的时间戳
+            lower = timestamp + "\x00"
+
+
+def _ensure_archive_tables(conn):
+    """按在线库的列定义创建 / 补齐归档表
+
+    归档表只保留列和主键，不带外键和唯一约束，INSERT OR REPLACE 不会级联删除已归档的消息；
+    应用以后新增的列会通过 ALTER TABLE 补齐。
+    """
+    for table in ARCHIVE_TABLES:
+        columns = conn.execute(f"PRAGMA main.table_info({table})").fetchall()
+        definitions = [
+            f"{column['name']} {column['type']}{' PRIMARY KEY' if column['pk'] else ''}"
+            for column in columns
+        ]
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.{table} ({', '.join(definitions)})")
+        existing = {row['name'] for row in conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.table_info({table})")}
+        for column in columns:
+            if column['name'] not in existing:
+                conn.execute(f"ALTER TABLE {ARCHIVE_SCHEMA}.{table} ADD COLUMN {column['name']} {column['type']}")
+
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_messages_thread_id ON messages(thread_id)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_messages_timestamp ON messages(timestamp)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_message_threads_platform_account "
+                 f"ON message_threads(platform, account_id)")
+
+
+def _column_list(conn, table):
+    return [row['name'] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+
+
+def _archive_batch(conn, columns, thread_columns, month_range, last_id, batch_size):
+    """归档下一批消息，返回 (本批最大 id, 复制行数, 删除行数)；没有剩余时返回 (None, 0, 0)"""
+    condition = "timestamp >= ? AND timestamp < ? AND id > ? AND id <= ?"
+    column_sql = ", ".join(columns)
+    thread_column_sql = ", ".join(thread_columns)
+
+    # 🔥 第一步：在归档库中写入本批消息和线程快照（只写归档库，提交后即持久化）
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        upper_id = conn.execute("""
+            SELECT MAX(id) FROM (
+                SELECT id FROM main.messages
+                WHERE timestamp >= ? AND timestamp < ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+            )
+        """, (*month_range, last_id, batch_size)).fetchone()[0]
+        if upper_id is None:
+            conn.execute("COMMIT")
+            return None, 0, 0
+
+        params = (*month_range, last_id, upper_id)
+        conn.execute(f"""
+            INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.message_threads ({thread_column_sql})
+            SELECT {thread_column_sql} FROM main.message_threads
+            WHERE id IN (SELECT thread_id FROM main.messages WHERE {condition})
+        """, params)
+        copied = conn.execute(f"""
+            INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.messages ({column_sql})
+            SELECT {column_sql} FROM main.messages WHERE {condition}
+        """, params).rowcount
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    # 🔥 第二步：核对归档中逐列相同的行数，再只删除这些行
+    # 两步之间被应用修改过的消息保留在在线库，下次运行时重新归档
+    same_row = " AND ".join(f"a.{column} IS m.{column}" for column in columns)
+    archived = f"EXISTS (SELECT 1 FROM {ARCHIVE_SCHEMA}.messages a WHERE a.id = m.id AND {same_row})"
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        live_count, verified = conn.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM({archived}), 0) FROM main.messages m WHERE {condition}
+        """, params).fetchone()
+        if verified != live_count:
+            print(f"\n   ⚠️  id {last_id + 1}-{upper_id}: {live_count - verified} 条消息在复制后被修改，本次保留")
+        deleted = conn.execute(f"""
+            DELETE FROM main.messages AS m WHERE {condition} AND {archived}
+        """, params).rowcount
+        if deleted != verified:
+            raise sqlite3.DatabaseError(f"删除行数 {deleted} 与核对行数 {verified} 不一致")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    return upper_id, copied, deleted
+
+
+def archive_month(conn, month, cutoff, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE):
+    """把指定月份中早于 cutoff 的消息移动到该月的归档库，返回 (复制行数, 删除行数)"""
+    os.makedirs(Config.get_archive_dir(), exist_ok=True)
+    month_range = (month, min(_next_month(month), cutoff))
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path(month),))
+    try:
+        _ensure_archive_tables(conn)
+        columns = _column_list(conn, "messages")
+        thread_columns = _column_list(conn, "message_threads")
+
+        last_id = 0
+        copied = deleted = 0
+        started_at = time.time()
+        while True:
+            upper_id, batch_copied, batch_deleted = _archive_batch(
+                conn, columns, thread_columns, month_range, last_id, batch_size
+            )
+            if upper_id is None:
+                break
+            last_id = upper_id
+            copied += batch_copied
+            deleted += batch_deleted
+
+            rate = deleted / max(time.time() - started_at, 1e-6)
+            sys.stdout.write(f"\r   [{month}] 已归档 {deleted} 条 - {rate:.0f} 行/秒")
+            sys.stdout.flush()
+
+            # 🔥 让出写锁，应用的消息同步可以在批次之间写入
+            if pause > 0:
+                time.sleep(pause)
+        if deleted:
+            print()
+        return copied, deleted
+    finally:
+        conn.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+
+def archive_messages(retention_days=DEFAULT_RETENTION_DAYS, batch_size=DEFAULT_BATCH_SIZE,
+                     pause=DEFAULT_PAUSE, db_path=None):
+    """归档早于保留期限的消息，返回 {月份: 删除行数}"""
+    conn = get_write_connection(db_path)
+    cutoff = (datetime.now() - timedelta(days=retention_days)).strftime("%Y-%m-%d")
+    months = archivable_months(conn, cutoff)
+    if not months:
+        print(f"✅ 没有早于 {cutoff} 的消息需要归档")
+        return {}
+
+    print(f"📦 归档早于 {cutoff} 的消息: {len(months)} 个月份 ({months[0]} ~ {months[-1]})")
+    result = {}
+    for month in months:
+        _, result[month] = archive_month(conn, month, cutoff, batch_size, pause)
+    return result
+
+
+def iter_archive_image_paths(fetch_size=5000):
+    """逐个只读打开已有归档库，流式返回 messages.image_paths 原始值
+
+    归档的消息仍引用 messageImages 下的图片，图片垃圾回收需要把这些引用计入；
+    任何一个归档库无法读取时抛出 sqlite3.Error，调用方不应在引用不完整时删除文件。
+    """
+    for path in list_archives().values():
+        conn = sqlite3.connect(get_db_uri(path), uri=True)
+        try:
+            if not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages'"
+            ).fetchone():
+                continue
+            cursor = conn.execute(
+                "SELECT image_paths FROM messages WHERE image_paths IS NOT NULL AND image_paths != ''"
+            )
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row[0]
+        finally:
+            conn.close()
+
+
+def _query_sources(conn, schemas, conditions, params, limit):
+    """在多个 schema（main / 已 ATTACH 的归档）上执行同一查询，按时间倒序合并"""
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    parts = []
+    all_params = []
+    for schema, source in schemas:
+        parts.append(f"""
+            SELECT * FROM (
+                SELECT '{source}' AS source, m.id, m.thread_id, m.sender, m.text_content, m.image_paths,
+                       m.timestamp, t.user_name, t.platform, t.account_id
+                FROM {schema}.messages m
+                LEFT JOIN {schema}.message_threads t ON t.id = m.thread_id
+                {where}
+                ORDER BY m.timestamp DESC
+                LIMIT ?
+            )
+        """)
+        all_params.extend(params + [limit])
+    return conn.execute(
+        f"{' UNION ALL '.join(parts)} ORDER BY timestamp DESC LIMIT ?", all_params + [limit]
+    ).fetchall()
+
+
+def query_archived_messages(since=None, until=None, thread_id=None, platform=None, account_id=None,
+                            keyword=None, limit=DEFAULT_LIMIT, include_live=True, db_path=None):
+    """在在线库和时间范围内的归档库中查询消息，按时间倒序返回最多 limit 条"""
+    conditions = []
+    params = []
+    if since:
+        conditions.append("m.timestamp >= ?")
+        params.append(since)
+    if until:
+        conditions.append("m.timestamp < ?")
+        params.append(until)
+    if thread_id:
+        conditions.append("m.thread_id = ?")
+        params.append(thread_id)
+    if platform:
+        conditions.append("t.platform = ?")
+        params.append(platform)
+    if account_id:
+        conditions.append("t.account_id = ?")
+        params.append(account_id)
+    if keyword:
+        conditions.append("instr(m.text_content, ?) > 0")
+        params.append(keyword)
+
+    # 🔥 只 ATTACH 与时间范围重叠的月份，新的月份优先
+    months = [
+        month for month in list_archives()
+        if (not since or month >= since[:7]) and (not until or month <= until[:7])
+    ]
+    months.reverse()
+
+    conn = get_readonly_connection(db_path)
+    results = []
+    sources = [("main", "live")] if include_live else []
+    for start in range(0, max(len(months), 1), ATTACH_LIMIT):
+        chunk = months[start:start + ATTACH_LIMIT]
+        attached = []
+        try:
+            for index, month in enumerate(chunk):
+                schema = f"archive_{index}"
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (get_db_uri(archive_path(month)),))
+                attached.append(schema)
+                sources.append((schema, month))
+            if sources:
+                results.extend(_query_sources(conn, sources, conditions, params, limit))
+        finally:
+            for schema in attached:
+                conn.execute(f"DETACH DATABASE {schema}")
+        sources = []
+
+        # 按月份倒序处理：已凑满 limit 且更早的月份不可能更新时即可停止
+        results.sort(key=lambda row: row['timestamp'], reverse=True)
+        results = results[:limit]
+        if len(results) >= limit and start + ATTACH_LIMIT < len(months):
+            oldest = results[-1]['timestamp'][:7]
+            if months[start + ATTACH_LIMIT] < oldest:
+                break
+    return results
+
+
+def print_archives():
+    """打印已有归档库的月份、消息数和文件大小"""
+    archives = list_archives()
+    if not archives:
+        print("📭 还没有归档")
+        return archives
+
+    print(f"📦 已有归档: {len(archives)} 个月份")
+    for month, path in archives.items():
+        conn = sqlite3.connect(get_db_uri(path), uri=True)
+        try:
+            count = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        except sqlite3.Error:
+            count = "?"
+        finally:
+            conn.close()
+        print(f"   {month}: {count} 条消息, {os.path.getsize(path) / 1024 / 1024:.2f} MB")
+    return archives
+
+
+def print_messages(rows):
+    if not rows:
+        print("❌ 没有找到消息记录")
+        return
+    for row in rows:
+        source = "在线" if row['source'] == 'live' else f"归档 {row['source']}"
+        print(f"💬 [{row['timestamp']}] ({source}) {row['platform']}/{row['account_id']} "
+              f"{row['user_name']} (线程 {row['thread_id']}) {row['sender']}: {row['text_content'] or ''}")
+    print(f"📊 共 {len(rows)} 条消息")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="私信消息冷归档（按月份归档库）")
+    parser.add_argument("--archive", action="store_true", help="归档早于保留期限的消息")
+    parser.add_argument("--retention-days", type=int, default=DEFAULT_RETENTION_DAYS,
+                        help=f"在线库保留最近多少天的消息 (默认 {DEFAULT_RETENTION_DAYS})")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"每批归档的行数 (默认 {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE,
+                        help=f"批次之间暂停的秒数 (默认 {DEFAULT_PAUSE})")
+    parser.add_argument("--yes", action="store_true", help="跳过确认提示")
+    parser.add_argument("--query", action="store_true", help="查询在线库和归档库中的消息")
+    parser.add_argument("--since", help="查询起始时间（包含）")
+    parser.add_argument("--until", help="查询截止时间（不包含）")
+    parser.add_argument("--thread", type=int, help="查询指定线程ID")
+    parser.add_argument("--platform", help="查询指定平台")
+    parser.add_argument("--account", help="查询指定账号ID")
+    parser.add_argument("--keyword", help="消息文本包含的关键词")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help=f"最多显示的条数 (默认 {DEFAULT_LIMIT})")
+    parser.add_argument("--archived-only", action="store_true", help="查询时只检索归档库")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return
+
+    print("🚀 私信消息冷归档工具")
+    print("=" * 60)
+
+    try:
+        if args.archive:
+            if not args.yes:
+                confirm = input(f"\n是否把 {args.retention_days} 天前的消息移动到归档库? 输入 'YES' 确认: ").strip()
+                if confirm.upper() != 'YES':
+                    print("👋 操作已取消")
+                    return
+            result = archive_messages(args.retention_days, args.batch_size, args.pause)
+            if result:
+                print(f"✅ 共归档 {sum(result.values())} 条消息")
+                print("💡 运行 reclaim_space.py 回收在线库空间，message_search.py --prune 清理搜索索引")
+                print("💡 归档消息的图片仍保留在 messageImages 中；message_image_gc.py 会把归档库中的引用计入，"
+                      "请勿手动删除图片或移走 archive 目录下的归档库")
+        elif args.query:
+            rows = query_archived_messages(
+                since=args.since, until=args.until, thread_id=args.thread, platform=args.platform,
+                account_id=args.account, keyword=args.keyword, limit=args.limit,
+                include_live=not args.archived_only,
+            )
+            print_messages(rows)
+        else:
+            print_archives()
+    except sqlite3.Error as e:
+        print(f"❌ 数据库错误: {e}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断，已提交的批次不受影响，重新运行即可继续")
+        sys.exit(1)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+消息图片垃圾回收脚本
+以数据库 messages.image_paths（包括 archive 下归档库中的消息）为准，找出 messageImages 目录下未被引用的图片文件，
+并列出被引用但已丢失的文件；目录扫描和删除均在线程池中并行执行
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# 导入配置
+from config import Config, DB_PATH
+from db_connection import get_readonly_connection
+from message_archive import iter_archive_image_paths
+
+# 🔥 默认参数
+DEFAULT_WORKERS = 16
+DEFAULT_MIN_AGE = 3600          # 最近 1 小时内修改的文件不删除（可能是正在同步、尚未入库的图片）
+FETCH_SIZE = 5000
+
+
+def _normalize(path):
+    """统一为相对 messageImages 的 posix 路径"""
+    return os.path.normpath(path).replace(os.sep, '/').lstrip('/')
+
+
+def _iter_live_image_paths(db_path=None):
+    """流式读取在线库 messages.image_paths 原始值"""
+    conn = get_readonly_connection(db_path)
+    cursor = conn.cursor()
+    cursor.arraysize = FETCH_SIZE
+    cursor.execute("SELECT image_paths FROM messages WHERE image_paths IS NOT NULL AND image_paths != ''")
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            break
+        for row in rows:
+            yield row[0]
+
+
+def _add_references(referenced, values, images_root):
+    """解析 image_paths 原始值并加入引用集合，返回无法解析的行数"""
+    invalid_rows = 0
+    for value in values:
+        try:
+            paths = json.loads(value)
+        except ValueError:
+            invalid_rows += 1
+            continue
+        if not isinstance(paths, list):
+            paths = [paths]
+        for path in paths:
+            if isinstance(path, dict):
+                path = path.get('path')
+            if not isinstance(path, str) or not path or path.startswith('data:'):
+                continue
+            # 兼容存储了完整路径的旧数据
+            if os.path.isabs(path):
+                path = os.path.relpath(os.path.abspath(path), images_root)
+            referenced.add(_normalize(path))
+    return invalid_rows
+
+
+def load_referenced_paths(images_dir, db_path=None):
+    """流式读取在线库和全部归档库的 messages.image_paths，返回被引用的相对路径集合
+
+    归档库无法读取时抛出 sqlite3.Error（引用不完整，不能据此删除文件）。
+    """
+    referenced = set()
+    images_root = os.path.abspath(images_dir)
+
+    invalid_rows = _add_references(referenced, _iter_live_image_paths(db_path), images_root)
+    live_count = len(referenced)
+    invalid_rows += _add_references(referenced, iter_archive_image_paths(FETCH_SIZE), images_root)
+    if len(referenced) > live_count:
+        print(f"   归档库中额外引用的图片: {len(referenced) - live_count} 个")
+
+    if invalid_rows:
+        print(f"   ⚠️  {invalid_rows} 条消息的 image_paths 不是合法 JSON，已跳过")
+    return referenced
+
+
+def _scan_directory(path):
+    """扫描单个目录，返回 (文件列表[(路径, 大小, 修改时间)], 子目录列表)"""
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        files.append((entry.path, stat.st_size, stat.st_mtime))
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"   ⚠️  无法读取目录 {path}: {e}")
+    return files, subdirs
+
+
+def scan_image_files(root, workers=DEFAULT_WORKERS):
+    """并行扫描目录树，返回 {相对路径: (完整路径, 大小, 修改时间)}"""
+    found = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_scan_directory, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                for full_path, size, mtime in files:
+                    found[_normalize(os.path.relpath(full_path, root))] = (full_path, size, mtime)
+                for subdir in subdirs:
+                    pending.add(executor.submit(_scan_directory, subdir))
+    return found
+
+
+def _remove_file(full_path):
+    try:
+        os.remove(full_path)
+        return True, None
+    except OSError as e:
+        return False, str(e)
+
+
+def _prune_empty_dirs(dirs, root):
+    """删除清理后变空的目录（不删除根目录）"""
+    root = os.path.abspath(root)
+    removed = 0
+    for path in sorted(dirs, key=len, reverse=True):
+        while os.path.abspath(path) != root and path.startswith(root):
+            try:
+                os.rmdir(path)
+                removed += 1
+            except OSError:
+                break
+            path = os.path.dirname(path)
+    return removed
+
+
+def collect_garbage(platform=None, delete=False, min_age=DEFAULT_MIN_AGE,
+                    workers=DEFAULT_WORKERS, show_files=20, db_path=None):
+    """比对数据库引用和磁盘文件，删除（或仅报告）未被引用的图片
+
+    platform 指定时只扫描 messageImages/<platform> 子目录。
+    返回 {'unreferenced': 数量, 'reclaimable_bytes': 字节数, 'deleted': 删除数量, 'missing': 丢失数量}
+    """
+    images_dir = Config.get_message_images_dir()
+    scan_root = os.path.join(images_dir, platform) if platform else images_dir
+
+    result = {'unreferenced': 0, 'reclaimable_bytes': 0, 'deleted': 0, 'missing': 0}
+    if not os.path.exists(scan_root):
+        print(f"📁 消息图片目录不存在，跳过清理: {scan_root}")
+        return result
+
+    started_at = time.time()
+    print(f"🔍 读取数据库中的图片引用（包括归档库）...")
+    try:
+        referenced = load_referenced_paths(images_dir, db_path)
+    except sqlite3.Error as e:
+        # 引用集合不完整时任何"未引用"的判断都不可靠，直接放弃本次清理
+        print(f"❌ 读取图片引用失败，为避免误删已归档消息的图片，本次不做清理: {e}")
+        return result
+    print(f"   被引用的图片: {len(referenced)} 个")
+
+    print(f"🔍 并行扫描图片目录: {scan_root}")
+    on_disk = scan_image_files(scan_root, workers)
+    prefix = f"{platform}/" if platform else ""
+    on_disk = {prefix + rel: info for rel, info in on_disk.items()}
+    print(f"   磁盘上的文件: {len(on_disk)} 个")
+
+    cutoff = time.time() - min_age
+    unreferenced = [
+        (rel, info) for rel, info in on_disk.items()
+        if rel not in referenced and info[2] < cutoff
+    ]
+    skipped_recent = sum(1 for rel, info in on_disk.items() if rel not in referenced and info[2] >= cutoff)
+    missing = sorted(rel for rel in referenced if rel.startswith(prefix) and rel not in on_disk)
+
+    result['unreferenced'] = len(unreferenced)
+    result['reclaimable_bytes'] = sum(info[1] for _, info in unreferenced)
+    result['missing'] = len(missing)
+
+    print(f"\n📊 扫描结果 (耗时 {time.time() - started_at:.1f} 秒):")
+    print(f"   未被引用的文件: {len(unreferenced)} 个, 可回收 {result['reclaimable_bytes'] / 1024 / 1024:.2f} MB")
+    if skipped_recent:
+        print(f"   最近修改、暂不处理的文件: {skipped_recent} 个")
+    print(f"   被引用但已丢失的文件: {len(missing)} 个")
+
+    if show_files:
+        for rel, info in unreferenced[:show_files]:
+            print(f"     - 未引用: {rel} ({info[1]} bytes)")
+        for rel in missing[:show_files]:
+            print(f"     - 已丢失: {rel}")
+
+    if not delete or not unreferenced:
+        if unreferenced:
+            print("   (dry-run 模式，未删除任何文件)")
+        return result
+
+    print(f"\n🧹 并行删除 {len(unreferenced)} 个未被引用的文件...")
+    failed = 0
+    touched_dirs = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        paths = [info[0] for _, info in unreferenced]
+        for full_path, (ok, error) in zip(paths, executor.map(_remove_file, paths)):
+            if ok:
+                result['deleted'] += 1
+                touched_dirs.add(os.path.dirname(full_path))
+            else:
+                failed += 1
+                print(f"   删除文件失败 {full_path}: {error}")
+
+    pruned = _prune_empty_dirs(touched_dirs, images_dir)
+    print(f"✅ 清理图片文件: {result['deleted']} 个, 失败 {failed} 个, 删除空目录 {pruned} 个")
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="消息图片垃圾回收（以在线库和归档库中的引用为准）")
+    parser.add_argument("--platform", help="只处理 messageImages/<platform> 子目录")
+    parser.add_argument("--delete", action="store_true", help="删除未被引用的文件（默认只报告）")
+    parser.add_argument("--min-age", type=int, default=DEFAULT_MIN_AGE,
+                        help=f"只处理修改时间早于该秒数的文件 (默认 {DEFAULT_MIN_AGE})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"扫描/删除线程数 (默认 {DEFAULT_WORKERS})")
+    parser.add_argument("--show", type=int, default=20, help="列出的文件数量 (默认 20)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return
+
+    print("🚀 消息图片垃圾回收工具")
+    print("=" * 60)
+    collect_garbage(
+        platform=args.platform,
+        delete=args.delete,
+        min_age=args.min_age,
+        workers=args.workers,
+        show_files=args.show,
+    )
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断")
+        sys.exit(1)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+消息全文搜索脚本
+在 scriptState 下维护 FTS5 索引库（trigram 分词，适合中文），rowid 与 messages.id 一致；
+按 id 分批建立索引，之后每次只从上次索引到的 id 之后增量追加。
+搜索时以只读方式 ATTACH 应用数据库，通过 message_threads 按平台 / 账号过滤，并显示高亮片段
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+# 导入配置
+from config import Config, DB_PATH
+from db_connection import BUSY_TIMEOUT_MS, get_db_uri
+
+STATE_FILE = "message_search.db"
+INDEX_BATCH_SIZE = 20000        # 每批索引的消息数
+DEFAULT_LIMIT = 20
+SNIPPET_TOKENS = 24             # 片段长度（trigram 下约等于字符数）
+HIGHLIGHT = ('【', '】')
+MIN_MATCH_CHARS = 3             # trigram 索引要求关键词至少 3 个字符
+
+
+def _state_path():
+    return os.path.join(Config.get_script_state_dir(), STATE_FILE)
+
+
+def open_index(db_path=None):
+    """打开索引库（不存在则创建）并只读 ATTACH 应用数据库为 app，数据库路径变化时自动重建"""
+    db_path = db_path or DB_PATH
+    os.makedirs(Config.get_script_state_dir(), exist_ok=True)
+    index = sqlite3.connect(Path(_state_path()).resolve().as_uri(), uri=True,
+                            timeout=BUSY_TIMEOUT_MS / 1000)
+    index.row_factory = sqlite3.Row
+    index.executescript("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+            text_content,
+            tokenize = 'trigram'
+        );
+    """)
+    index.execute("ATTACH DATABASE ? AS app", (get_db_uri(db_path),))
+    index.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+
+    if get_meta(index, 'db_path') != db_path:
+        reset_index(index)
+        set_meta(index, 'db_path', db_path)
+        index.commit()
+    return index
+
+
+def get_meta(index, key, default=None):
+    row = index.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else default
+
+
+def set_meta(index, key, value):
+    index.execute(
+        "INSERT INTO meta(key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, str(value)),
+    )
+
+
+def reset_index(index):
+    """清空索引，下次更新时重新全量建立"""
+    index.execute("DELETE FROM message_fts")
+    index.execute("DELETE FROM meta WHERE key != 'db_path'")
+    index.commit()
+
+
+def update_index(index, batch_size=INDEX_BATCH_SIZE):
+    """从上次索引到的 messages.id 之后分批追加，返回本次处理的消息数"""
+    last_id = int(get_meta(index, 'last_id', 0))
+    scanned = 0
+    started_at = time.time()
+
+    while True:
+        # 🔥 先确定本批的 id 上界（只读主键），再整批 INSERT ... SELECT
+        row = index.execute("""
+            SELECT MAX(id) AS end_id, COUNT(*) AS count FROM (
+                SELECT id FROM app.messages WHERE id > ? ORDER BY id LIMIT ?
+            )
+        """, (last_id, batch_size)).fetchone()
+        if not row['count']:
+            break
+
+        index.execute("""
+            INSERT INTO message_fts(rowid, text_content)
+            SELECT id, text_content FROM app.messages
+            WHERE id > ? AND id <= ? AND text_content IS NOT NULL AND text_content != ''
+        """, (last_id, row['end_id']))
+        last_id = row['end_id']
+        scanned += row['count']
+        set_meta(index, 'last_id', last_id)
+        index.commit()
+
+        sys.stdout.write(f"\r   已索引到 id={last_id} (本次 {scanned} 条)")
+        sys.stdout.flush()
+
+    if scanned:
+        print(f"\n   增量索引: {scanned} 条新消息, 耗时 {time.time() - started_at:.2f} 秒")
+    return scanned
+
+
+def prune_index(index):
+    """删除应用库中已不存在的消息（清理 / 归档之后），返回删除的条数"""
+    before = index.total_changes
+    index.execute("DELETE FROM message_fts WHERE rowid NOT IN (SELECT id FROM app.messages)")
+    index.commit()
+    return index.total_changes - before
+
+
+def optimize_index(index):
+    """合并 FTS5 索引段，减小索引体积并加快查询"""
+    index.execute("INSERT INTO message_fts(message_fts) VALUES ('optimize')")
+    index.commit()
+
+
+def _match_expression(keywords):
+    """把关键词转成 FTS5 查询：每个关键词作为短语（转义双引号），多个关键词同时匹配"""
+    return " AND ".join('"' + keyword.replace('"', '""') + '"' for keyword in keywords)
+
+
+def search_messages(index, keywords, platform=None, account_id=None, limit=DEFAULT_LIMIT):
+    """搜索消息，按消息 id 倒序（最新的在前）返回结果行
+
+    关键词都不少于 3 个字符时走 trigram 索引（MATCH）；
+    更短的关键词无法使用索引，改为在索引库的文本上逐行 instr 匹配。
+    """
+    conditions = []
+    params = []
+    short = [keyword for keyword in keywords if len(keyword) < MIN_MATCH_CHARS]
+    indexed = [keyword for keyword in keywords if len(keyword) >= MIN_MATCH_CHARS]
+
+    if indexed:
+        conditions.append("message_fts MATCH ?")
+        params.append(_match_expression(indexed))
+        snippet = f"snippet(message_fts, 0, '{HIGHLIGHT[0]}', '{HIGHLIGHT[1]}', '…', {SNIPPET_TOKENS})"
+    else:
+        snippet = "f.text_content"
+    for keyword in short:
+        conditions.append("instr(f.text_content, ?) > 0")
+        params.append(keyword)
+    if platform:
+        conditions.append("t.platform = ?")
+        params.append(platform)
+    if account_id:
+        conditions.append("t.account_id = ?")
+        params.append(account_id)
+
+    return index.execute(f"""
+        SELECT f.rowid AS id, {snippet} AS snippet,
+               m.thread_id, m.sender, m.timestamp,
+               t.platform, t.account_id, t.user_name
+        FROM message_fts f
+        JOIN app.messages m ON m.id = f.rowid
+        JOIN app.message_threads t ON t.id = m.thread_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY f.rowid DESC
+        LIMIT ?
+    """, params + [limit]).fetchall()
+
+
+def _highlight(text, keywords):
+    """手动标出未走索引的短关键词（snippet 只会高亮 MATCH 的关键词）"""
+    for keyword in keywords:
+        if len(keyword) >= MIN_MATCH_CHARS:
+            continue
+        text = text.replace(keyword, f"{HIGHLIGHT[0]}{keyword}{HIGHLIGHT[1]}")
+    return text
+
+
+def print_results(results, keywords):
+    """打印搜索结果"""
+    if not results:
+        print("❌ 没有找到匹配的消息")
+        return
+
+    print(f"🔎 找到 {len(results)} 条匹配消息:\n")
+    for row in results:
+        snippet = _highlight(row['snippet'] or '', keywords)
+        print(f"💬 消息 {row['id']}  线程 {row['thread_id']}  "
+              f"{row['user_name']} ({row['platform']}/{row['account_id']})")
+        print(f"   [{row['timestamp']}] {row['sender']}: {snippet}")
+        print("-" * 50)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="消息全文搜索（FTS5 trigram 索引）")
+    parser.add_argument("keywords", nargs="*", help="搜索关键词（多个关键词需同时出现）")
+    parser.add_argument("--platform", help="只搜索指定平台")
+    parser.add_argument("--account", help="只搜索指定账号ID")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help=f"最多显示的条数 (默认 {DEFAULT_LIMIT})")
+    parser.add_argument("--batch-size", type=int, default=INDEX_BATCH_SIZE,
+                        help=f"每批索引的消息数 (默认 {INDEX_BATCH_SIZE})")
+    parser.add_argument("--no-update", action="store_true", help="搜索前不增量更新索引")
+    parser.add_argument("--rebuild", action="store_true", help="丢弃索引，重新全量建立")
+    parser.add_argument("--prune", action="store_true", help="删除应用库中已不存在的消息")
+    parser.add_argument("--optimize", action="store_true", help="合并索引段")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return
+
+    try:
+        index = open_index()
+    except sqlite3.Error as e:
+        print(f"❌ 打开索引失败: {e}")
+        return
+
+    try:
+        if args.rebuild:
+            reset_index(index)
+        if not args.no_update:
+            update_index(index, batch_size=args.batch_size)
+        if args.prune:
+            print(f"🧹 已删除 {prune_index(index)} 条失效索引")
+        if args.optimize:
+            optimize_index(index)
+            print("✅ 索引已合并")
+
+        if args.keywords:
+            results = search_messages(index, args.keywords, args.platform, args.account, args.limit)
+            print_results(results, args.keywords)
+    except sqlite3.Error as e:
+        print(f"❌ 数据库错误: {e}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断")
+        sys.exit(1)
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+发布效果分析脚本
+在 scriptState 下维护一个小型 SQLite 状态库：
+  publish_durations  每条发布记录的精简副本（日期、平台、创建者、状态、耗时），用于计算百分位数
+  daily_summary      按 (日期, 平台, 创建者) 物化的可累加计数（记录数、各状态数、账号数、耗时总和）
+每次运行只刷新上次之后 updated_at 有变化（或记录数变化）的日期；
+报告的记录数、成功率、失败数和平均耗时直接由 daily_summary 累加得到，
+百分位数无法由分组结果累加，在 publish_durations 上用窗口函数计算，不再重新读取发布历史
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+# 导入配置
+from config import Config, DB_PATH, get_platform_name
+from db_connection import get_readonly_connection
+
+STATE_FILE = "publish_analytics.db"
+DEFAULT_DAYS = 30
+REFRESH_BATCH_DAYS = 31         # 每个刷新事务处理的日期数
+SCHEMA_VERSION = 2              # 状态库结构版本，变化时重建状态库
+
+# 🔥 报告维度: 名称 -> (分组列, 标题)
+DIMENSIONS = {
+    'day': ('day', '按日期'),
+    'platform': ('platform_type', '按平台'),
+    'creator': ('created_by', '按创建者'),
+}
+
+
+def _state_path():
+    return os.path.join(Config.get_script_state_dir(), STATE_FILE)
+
+
+def open_state(db_path=None):
+    """打开状态库（不存在则创建），数据库路径变化时自动重置"""
+    db_path = db_path or DB_PATH
+    os.makedirs(Config.get_script_state_dir(), exist_ok=True)
+    state = sqlite3.connect(_state_path())
+    state.row_factory = sqlite3.Row
+    state.executescript("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS publish_durations (
+            record_id INTEGER PRIMARY KEY,
+            day TEXT NOT NULL,
+            platform_type INTEGER NOT NULL,
+            created_by TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total_accounts INTEGER NOT NULL,
+            failed_accounts INTEGER NOT NULL,
+            duration INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_publish_durations_day ON publish_durations(day);
+    """)
+    if get_meta(state, 'schema_version') != str(SCHEMA_VERSION):
+        # 旧版 daily_summary 存的是不可累加的比率和百分位数，直接重建
+        state.execute("DROP TABLE IF EXISTS daily_summary")
+    state.executescript("""
+        CREATE TABLE IF NOT EXISTS daily_summary (
+            day TEXT NOT NULL,
+            platform_type INTEGER NOT NULL,
+            created_by TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            success INTEGER NOT NULL,
+            partial INTEGER NOT NULL,
+            failed INTEGER NOT NULL,
+            pending INTEGER NOT NULL,
+            total_accounts INTEGER NOT NULL,
+            failed_accounts INTEGER NOT NULL,
+            duration_count INTEGER NOT NULL,
+            duration_sum INTEGER NOT NULL,
+            refreshed_at TEXT NOT NULL,
+            PRIMARY KEY (day, platform_type, created_by)
+        ) WITHOUT ROWID;
+    """)
+
+    if get_meta(state, 'schema_version') != str(SCHEMA_VERSION):
+        reset_state(state)
+        set_meta(state, 'schema_version', SCHEMA_VERSION)
+        state.commit()
+    if get_meta(state, 'db_path') != db_path:
+        reset_state(state)
+        set_meta(state, 'db_path', db_path)
+        state.commit()
+    return state
+
+
+def get_meta(state, key, default=None):
+    row = state.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row['value'] if row else default
+
+
+def set_meta(state, key, value):
+    state.execute(
+        "INSERT INTO meta(key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, str(value)),
+    )
+
+
+def reset_state(state):
+    """清空状态，下次刷新时重新全量统计"""
+    state.execute("DELETE FROM publish_durations")
+    state.execute("DELETE FROM daily_summary")
+    state.execute("DELETE FROM meta WHERE key NOT IN ('db_path', 'schema_version')")
+    state.commit()
+
+
+def _summary_sql(column, where):
+    """把 daily_summary 按 column 累加的 SQL（计数、成功率和平均耗时都可由分组结果精确累加）"""
+    return f"""
+        SELECT {column},
+               SUM(total) AS total, SUM(success) AS success, SUM(partial) AS partial,
+               SUM(failed) AS failed, SUM(pending) AS pending,
+               SUM(total_accounts) AS total_accounts, SUM(failed_accounts) AS failed_accounts,
+               CASE WHEN SUM(total) > SUM(pending)
+                    THEN 1.0 * SUM(success) / (SUM(total) - SUM(pending)) END AS success_rate,
+               CASE WHEN SUM(duration_count) > 0
+                    THEN 1.0 * SUM(duration_sum) / SUM(duration_count) END AS avg_duration
+        FROM daily_summary
+        WHERE {where}
+        GROUP BY {column}
+    """
+
+
+def _percentile_sql(column, where):
+    """在 publish_durations 上按 column 计算 p50/p95/p99 耗时的 SQL
+
+    百分位数不能由分组结果累加，只能在逐条副本上计算。最近秩法：窗口函数按耗时排序编号，
+    取编号 = ceil(p * n) 的值；只有已结束（非 pending）且有耗时的记录参与。
+    """
+    return f"""
+        WITH ranked AS (
+            SELECT {column}, duration,
+                   ROW_NUMBER() OVER (PARTITION BY {column} ORDER BY duration) AS rn,
+                   COUNT(*) OVER (PARTITION BY {column}) AS n
+            FROM publish_durations
+            WHERE {where} AND status != 'pending' AND duration IS NOT NULL
+        )
+        SELECT {column},
+               MAX(CASE WHEN rn = (n * 50 + 99) / 100 THEN duration END) AS p50_duration,
+               MAX(CASE WHEN rn = (n * 95 + 99) / 100 THEN duration END) AS p95_duration,
+               MAX(CASE WHEN rn = (n * 99 + 99) / 100 THEN duration END) AS p99_duration
+        FROM ranked
+        GROUP BY {column}
+    """
+
+
+def find_stale_days(state, conn):
+    """返回需要刷新的日期集合
+
+    一次扫描按日期统计源库的记录数和最后更新时间（读取全部发布记录的 created_at / updated_at 两列）：
+    updated_at 不早于上次刷新标记的日期、或记录数与状态库不一致（删除/新增）的日期需要刷新。
+    updated_at 同时存在 CURRENT_TIMESTAMP 和 ISO 格式，统一用 datetime() 比较。
+    updated_at 没有索引，且删除只能通过记录数变化发现，因此这一步的开销与发布历史总量成正比；
+    之后只重新读取、重算变化的日期。
+    """
+    mark = get_meta(state, 'updated_at_mark')
+    source = {
+        row['day']: (row['records'], row['last_updated'])
+        for row in conn.execute("""
+            SELECT date(created_at) AS day, COUNT(*) AS records, MAX(datetime(updated_at)) AS last_updated
+            FROM publish_records
+            GROUP BY day
+        """)
+    }
+    known = {
+        row['day']: row['records']
+        for row in state.execute("SELECT day, COUNT(*) AS records FROM publish_durations GROUP BY day")
+    }
+
+    stale = set(day for day in known if day not in source)
+    for day, (records, last_updated) in source.items():
+        if mark is None or known.get(day) != records or (last_updated or '') >= mark:
+            stale.add(day)
+
+    latest = max((last_updated for _, last_updated in source.values() if last_updated), default=mark)
+    return stale, latest
+
+
+def _refresh_days(state, conn, days, refreshed_at):
+    """重新读取指定日期的记录，更新逐条副本并重算这些日期的 daily_summary"""
+    placeholders = ", ".join("?" * len(days))
+    rows = []
+    for day in days:
+        # 🔥 按 created_at 范围读取（走 idx_publish_records_created_at），两种时间格式都以日期开头
+        next_day = (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+        rows.extend(conn.execute("""
+            SELECT id, date(created_at) AS day, COALESCE(platform_type, 0) AS platform_type,
+                   COALESCE(created_by, '') AS created_by, COALESCE(status, 'pending') AS status,
+                   COALESCE(total_accounts, 0) AS total_accounts,
+                   COALESCE(failed_accounts, 0) AS failed_accounts, duration
+            FROM publish_records
+            WHERE created_at >= ? AND created_at < ?
+        """, (day, next_day)).fetchall())
+
+    state.execute(f"DELETE FROM publish_durations WHERE day IN ({placeholders})", days)
+    state.execute(f"DELETE FROM daily_summary WHERE day IN ({placeholders})", days)
+    state.executemany("""
+        INSERT OR REPLACE INTO publish_durations(record_id, day, platform_type, created_by, status,
+                                                 total_accounts, failed_accounts, duration)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [tuple(row) for row in rows if row['day'] in days])
+    state.execute(f"""
+        INSERT INTO daily_summary(day, platform_type, created_by, total, success, partial, failed, pending,
+                                  total_accounts, failed_accounts, duration_count, duration_sum, refreshed_at)
+        SELECT day, platform_type, created_by,
+               COUNT(*), SUM(status = 'success'), SUM(status = 'partial'),
+               SUM(status = 'failed'), SUM(status = 'pending'),
+               SUM(total_accounts), SUM(failed_accounts),
+               COUNT(CASE WHEN status != 'pending' THEN duration END),
+               COALESCE(SUM(CASE WHEN status != 'pending' THEN duration END), 0),
+               ?
+        FROM publish_durations
+        WHERE day IN ({placeholders})
+        GROUP BY day, platform_type, created_by
+    """, [refreshed_at] + list(days))
+    return len(rows)
+
+
+def refresh(state, db_path=None):
+    """增量刷新状态库，返回 (刷新的日期数, 读取的记录数)"""
+    conn = get_readonly_connection(db_path)
+    started_at = time.time()
+    refreshed_at = datetime.now().isoformat(timespec='seconds')
+
+    # 🔥 在同一个读事务内找出变化的日期并读取，避免两步之间应用写入造成遗漏
+    conn.execute("BEGIN")
+    try:
+        stale, latest = find_stale_days(state, conn)
+        days = sorted(stale)
+        rows = 0
+        for start in range(0, len(days), REFRESH_BATCH_DAYS):
+            rows += _refresh_days(state, conn, days[start:start + REFRESH_BATCH_DAYS], refreshed_at)
+            state.commit()
+    finally:
+        conn.execute("COMMIT")
+
+    if latest is not None:
+        set_meta(state, 'updated_at_mark', latest)
+    set_meta(state, 'refreshed_at', refreshed_at)
+    state.commit()
+
+    if days:
+        print(f"   增量刷新: {len(days)} 天, {rows} 条记录, 耗时 {time.time() - started_at:.2f} 秒")
+    return len(days), rows
+
+
+def summarize(state, dimension, since=None):
+    """按维度汇总状态库（day / platform / creator），返回结果行
+
+    计数、成功率和平均耗时由 daily_summary 累加，百分位数来自 publish_durations。
+    """
+    column = DIMENSIONS[dimension][0]
+    where = "day >= ?" if since else "1"
+    params = [since, since] if since else []
+    return state.execute(f"""
+        SELECT counts.*, p50_duration, p95_duration, p99_duration
+        FROM ({_summary_sql(column, where)}) AS counts
+        LEFT JOIN ({_percentile_sql(column, where)}) AS percentiles USING ({column})
+        ORDER BY {column} {'DESC' if dimension == 'day' else ''}
+    """, params).fetchall()
+
+
+def _format_label(dimension, value):
+    if dimension == 'platform':
+        return f"{get_platform_name(value)} ({value})"
+    return value or '(空)'
+
+
+def _format_duration(value):
+    return "-" if value is None else f"{value:.0f}s"
+
+
+def print_summary(state, dimension, since=None):
+    """打印一个维度的汇总表"""
+    rows = summarize(state, dimension, since)
+    print(f"\n📊 {DIMENSIONS[dimension][1]}:")
+    if not rows:
+        print("   (无数据)")
+        return rows
+
+    print(f"   {'分组':<16} {'记录':>6} {'成功率':>7} {'失败':>5} {'部分':>5} {'失败账号':>8} "
+          f"{'p50':>7} {'p95':>7} {'p99':>7}")
+    for row in rows:
+        rate = "-" if row['success_rate'] is None else f"{row['success_rate'] * 100:.1f}%"
+        print(f"   {str(_format_label(dimension, row[DIMENSIONS[dimension][0]])):<16} {row['total']:>6} "
+              f"{rate:>7} {row['failed']:>5} {row['partial']:>5} {row['failed_accounts']:>8} "
+              f"{_format_duration(row['p50_duration']):>7} {_format_duration(row['p95_duration']):>7} "
+              f"{_format_duration(row['p99_duration']):>7}")
+    return rows
+
+
+def analyze_publish_records(days=DEFAULT_DAYS, dimensions=None, rebuild=False, db_path=None):
+    """增量刷新状态并打印报告"""
+    state = open_state(db_path)
+    try:
+        if rebuild:
+            reset_state(state)
+        refresh(state, db_path)
+
+        since = None
+        if days:
+            since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        print(f"🔍 发布效果分析 ({f'{since} 起' if since else '全部历史'})")
+        for dimension in dimensions or list(DIMENSIONS):
+            print_summary(state, dimension, since)
+        print("-" * 50)
+    finally:
+        state.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="发布效果分析（增量物化汇总表）")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS,
+                        help=f"统计最近多少天，0 表示全部历史 (默认 {DEFAULT_DAYS})")
+    parser.add_argument("--by", nargs="+", choices=list(DIMENSIONS), help="只显示指定维度")
+    parser.add_argument("--rebuild", action="store_true", help="丢弃状态，重新全量统计")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return
+
+    try:
+        analyze_publish_records(days=args.days, dimensions=args.by, rebuild=args.rebuild)
+    except sqlite3.Error as e:
+        print(f"❌ 数据库错误: {e}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断")
+        sys.exit(1)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+分批清理私信消息数据脚本
+按 rowid 分批删除，每批一个短事务，批次之间让出写锁，支持断点续删
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# 导入配置
+from config import Config, DB_PATH
+from db_connection import get_write_connection
+
+# 🔥 默认参数
+DEFAULT_BATCH_SIZE = 2000      # 每批删除的行数
+DEFAULT_PAUSE = 0.05           # 批次之间的暂停秒数（让应用的消息同步写入）
+CHECKPOINT_FILE = "purge_checkpoint.json"
+
+# 🔥 清理阶段（按顺序执行）
+STAGES = ("messages", "threads", "sync_status")
+
+
+class PurgeFilter:
+    """清理范围：平台 / 账号 / 消息时间范围"""
+
+    def __init__(self, platform=None, account_id=None, since=None, until=None):
+        self.platform = platform
+        self.account_id = account_id
+        self.since = since
+        self.until = until
+
+    @property
+    def has_date_range(self):
+        return bool(self.since or self.until)
+
+    def to_dict(self):
+        return {
+            'platform': self.platform,
+            'account_id': self.account_id,
+            'since': self.since,
+            'until': self.until,
+        }
+
+    def describe(self):
+        parts = []
+        if self.platform:
+            parts.append(f"平台={self.platform}")
+        if self.account_id:
+            parts.append(f"账号={self.account_id}")
+        if self.since:
+            parts.append(f"起始={self.since}")
+        if self.until:
+            parts.append(f"截止={self.until}")
+        return ", ".join(parts) if parts else "全部数据"
+
+    def thread_conditions(self):
+        """message_threads / platform_sync_status 的过滤条件"""
+        conditions = []
+        params = []
+        if self.platform:
+            conditions.append("platform = ?")
+            params.append(self.platform)
+        if self.account_id:
+            conditions.append("account_id = ?")
+            params.append(self.account_id)
+        return conditions, params
+
+    def message_conditions(self):
+        """messages 的过滤条件"""
+        conditions = []
+        params = []
+
+        thread_conditions, thread_params = self.thread_conditions()
+        if thread_conditions:
+            conditions.append(
+                f"thread_id IN (SELECT id FROM message_threads WHERE {' AND '.join(thread_conditions)})"
+            )
+            params.extend(thread_params)
+        if self.since:
+            conditions.append("timestamp >= ?")
+            params.append(self.since)
+        if self.until:
+            conditions.append("timestamp < ?")
+            params.append(self.until)
+        return conditions, params
+
+
+def _checkpoint_path():
+    return os.path.join(Config.get_script_state_dir(), CHECKPOINT_FILE)
+
+
+def load_checkpoint(purge_filter, db_path):
+    """读取与当前过滤条件一致的检查点"""
+    path = _checkpoint_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  检查点文件无法读取，忽略: {e}")
+        return None
+
+    if checkpoint.get('db_path') != db_path or checkpoint.get('filter') != purge_filter.to_dict():
+        print("⚠️  已有检查点的清理条件与本次不同，忽略旧检查点")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint):
+    """保存检查点（先写临时文件再替换，避免中断时写坏）"""
+    path = _checkpoint_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    checkpoint['updated_at'] = datetime.now().isoformat(timespec='seconds')
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint():
+    path = _checkpoint_path()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def count_purge_targets(conn, purge_filter):
+    """统计待删除的数据量"""
+    message_conditions, message_params = purge_filter.message_conditions()
+    where = f"WHERE {' AND '.join(message_conditions)}" if message_conditions else ""
+    message_count = conn.execute(
+        f"SELECT COUNT(*) FROM messages {where}", message_params
+    ).fetchone()[0]
+
+    thread_count = 0
+    sync_status_count = 0
+    if not purge_filter.has_date_range:
+        thread_conditions, thread_params = purge_filter.thread_conditions()
+        where = f"WHERE {' AND '.join(thread_conditions)}" if thread_conditions else ""
+        thread_count = conn.execute(
+            f"SELECT COUNT(*) FROM message_threads {where}", thread_params
+        ).fetchone()[0]
+        sync_status_count = conn.execute(
+            f"SELECT COUNT(*) FROM platform_sync_status {where}", thread_params
+        ).fetchone()[0]
+
+    return {
+        'messages': message_count,
+        'threads': thread_count,
+        'sync_status': sync_status_count,
+    }
+
+
+def _stage_query(stage, purge_filter):
+    """返回 (表名, 过滤条件, 参数)"""
+    if stage == "messages":
+        conditions, params = purge_filter.message_conditions()
+        return "messages", conditions, params
+    conditions, params = purge_filter.thread_conditions()
+    table = "message_threads" if stage == "threads" else "platform_sync_status"
+    return table, conditions, params
+
+
+def _delete_batch(conn, table, conditions, params, last_id, batch_size):
+    """删除 id > last_id 的下一批数据，返回 (删除行数, 本批最大 id)"""
+    where = " AND ".join(["id > ?"] + conditions)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # 🔥 先确定本批的 rowid 上界，再按区间删除，锁持有时间与批大小成正比
+        upper_id = conn.execute(f"""
+            SELECT MAX(id) FROM (
+                SELECT id FROM {table}
+                WHERE {where}
+                ORDER BY id
+                LIMIT ?
+            )
+        """, [last_id] + params + [batch_size]).fetchone()[0]
+
+        if upper_id is None:
+            conn.execute("COMMIT")
+            return 0, last_id
+
+        cursor = conn.execute(f"""
+            DELETE FROM {table}
+            WHERE {where} AND id <= ?
+        """, [last_id] + params + [upper_id])
+        deleted = cursor.rowcount
+        conn.execute("COMMIT")
+        return deleted, upper_id
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _print_progress(stage, done, total, started_at):
+    elapsed = max(time.time() - started_at, 1e-6)
+    rate = done / elapsed
+    percent = (done / total * 100) if total else 100.0
+    sys.stdout.write(
+        f"\r   [{stage}] {done}/{total} ({percent:.1f}%) - {rate:.0f} 行/秒"
+    )
+    sys.stdout.flush()
+
+
+def purge_messages(purge_filter, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE,
+                   resume=True, db_path=None):
+    """分批删除消息数据
+
+    - messages 始终按过滤条件删除
+    - 未指定时间范围时，同时删除对应的 message_threads 和 platform_sync_status
+    - 每批提交后写入检查点，中断后重新运行会从检查点继续
+    """
+    db_path = db_path or DB_PATH
+    conn = get_write_connection(db_path)
+
+    checkpoint = load_checkpoint(purge_filter, db_path) if resume else None
+    if checkpoint:
+        print(f"🔁 从检查点继续: 阶段 {checkpoint['stage']}, last_id={checkpoint['last_id']}")
+    else:
+        checkpoint = {
+            'db_path': db_path,
+            'filter': purge_filter.to_dict(),
+            'stage': STAGES[0],
+            'last_id': 0,
+            'deleted': {stage: 0 for stage in STAGES},
+        }
+
+    totals = count_purge_targets(conn, purge_filter)
+    stages = STAGES[:1] if purge_filter.has_date_range else STAGES
+
+    for stage in stages[stages.index(checkpoint['stage']):]:
+        table, conditions, params = _stage_query(stage, purge_filter)
+        # 🔥 进度总数 = 已删除 + 剩余
+        total = checkpoint['deleted'][stage] + totals[stage]
+        started_at = time.time()
+        stage_start_deleted = checkpoint['deleted'][stage]
+
+        while True:
+            deleted, last_id = _delete_batch(
+                conn, table, conditions, params, checkpoint['last_id'], batch_size
+            )
+            if deleted == 0:
+                break
+
+            checkpoint['last_id'] = last_id
+            checkpoint['deleted'][stage] += deleted
+            save_checkpoint(checkpoint)
+            _print_progress(stage, checkpoint['deleted'][stage] - stage_start_deleted,
+                            total - stage_start_deleted, started_at)
+
+            # 🔥 让出写锁，应用的消息同步可以在批次之间写入
+            if pause > 0:
+                time.sleep(pause)
+
+        print(f"\n   ✅ {table}: 删除 {checkpoint['deleted'][stage]} 行")
+
+        # 进入下一阶段
+        next_index = stages.index(stage) + 1
+        if next_index < len(stages):
+            checkpoint['stage'] = stages[next_index]
+            checkpoint['last_id'] = 0
+            save_checkpoint(checkpoint)
+
+    clear_checkpoint()
+    return dict(checkpoint['deleted'])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="分批清理私信消息数据（可断点续删）")
+    parser.add_argument("--platform", help="平台，如 douyin / wechat / xiaohongshu")
+    parser.add_argument("--account", dest="account_id", help="账号ID（message_threads.account_id）")
+    parser.add_argument("--since", help="只删除该时间之后（包含）的消息")
+    parser.add_argument("--until", help="只删除该时间之前（不包含）的消息")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"每批删除的行数 (默认 {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE,
+                        help=f"批次之间暂停的秒数 (默认 {DEFAULT_PAUSE})")
+    parser.add_argument("--no-resume", action="store_true", help="忽略已有检查点，重新开始")
+    parser.add_argument("--yes", action="store_true", help="跳过确认提示")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return
+
+    purge_filter = PurgeFilter(args.platform, args.account_id, args.since, args.until)
+
+    print("🚀 私信消息分批清理工具")
+    print("=" * 60)
+    print(f"🔍 数据库路径: {DB_PATH}")
+    print(f"🔍 清理范围: {purge_filter.describe()}")
+
+    targets = count_purge_targets(get_write_connection(), purge_filter)
+    print(f"   待删除消息: {targets['messages']} 条")
+    if not purge_filter.has_date_range:
+        print(f"   待删除线程: {targets['threads']} 个")
+        print(f"   待清理同步状态: {targets['sync_status']} 个")
+
+    if not args.yes:
+        confirm = input("\n是否继续? 输入 'YES' 确认: ").strip()
+        if confirm.upper() != 'YES':
+            print("👋 操作已取消")
+            return
+
+    print("\n🗑️  开始分批删除...")
+    result = purge_messages(
+        purge_filter,
+        batch_size=args.batch_size,
+        pause=args.pause,
+        resume=not args.no_resume,
+    )
+
+    print(f"\n📋 删除结果汇总:")
+    print(f"   删除消息: {result['messages']} 条")
+    print(f"   删除线程: {result['threads']} 个")
+    print(f"   清理同步状态: {result['sync_status']} 个")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断，重新运行即可从检查点继续")
+        sys.exit(1)
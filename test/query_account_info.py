@@ -7,6 +7,8 @@ import sys
 
 # 🔥 导入配置
 from config import Config, BASE_DIR, DB_PATH, PLATFORM_TYPE_MAP, get_platform_name
+from db_connection import get_readonly_connection
+from avatar_audit import audit_avatars, print_audit
 
 print(f"🔍 基础目录: {BASE_DIR}")
 print(f"🔍 数据库路径: {DB_PATH}")
@@ -14,8 +16,7 @@ print(f"🔍 数据库路径: {DB_PATH}")
 def query_account_info():
     try:
         # 连接数据库
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row  # 让结果可以通过列名访问
+        conn = get_readonly_connection()
         cursor = conn.cursor()
         
         # 查询所有账号信息
@@ -44,6 +45,10 @@ def query_account_info():
         print(f"   异常账号: {invalid_accounts}")
         print("=" * 60)
         
+        # 🔥 按目录并行扫描头像文件（每个目录只 scandir 一次）
+        avatar_audit = audit_avatars(accounts)
+        avatar_files = avatar_audit['files']
+        
         # 显示每个账号的详细信息
         for i, account in enumerate(accounts, 1):
             platform_name = get_platform_name(account['type'])
@@ -63,31 +68,27 @@ def query_account_info():
             print(f"   远程头像URL: {account['avatar_url'] or 'NULL'}")
             print(f"   本地头像路径: {account['local_avatar'] or 'NULL'}")
             
-            # 🔥 检查本地头像文件是否存在（使用 Config 路径逻辑）
+            # 🔥 检查本地头像文件是否存在（使用预先并行扫描的结果）
             if account['local_avatar']:
                 # 本地头像路径格式：assets/avatar/{platform}/{username}/avatar.jpg
-                local_avatar_full_path = os.path.join(BASE_DIR, account['local_avatar'])
-                file_exists = os.path.exists(local_avatar_full_path)
-                print(f"   本地文件存在: {'✅' if file_exists else '❌'}")
-                print(f"   完整路径: {local_avatar_full_path}")
+                avatar_file = avatar_files[account['id']]
+                print(f"   本地文件存在: {'✅' if avatar_file['exists'] else '❌'}")
+                print(f"   完整路径: {avatar_file['path']}")
                 
-                if file_exists:
-                    file_size = os.path.getsize(local_avatar_full_path)
-                    print(f"   文件大小: {file_size} bytes")
+                if avatar_file['exists']:
+                    print(f"   文件大小: {avatar_file['size']} bytes")
                     
                     # 🔥 验证路径格式是否正确
-                    if account['local_avatar'].startswith('assets/avatar/'):
+                    if avatar_file['standard']:
                         print(f"   路径格式: ✅ 标准格式")
                     else:
                         print(f"   路径格式: ⚠️ 非标准格式")
                 else:
                     # 🔥 如果文件不存在，检查可能的路径问题
                     print(f"   🔍 诊断信息:")
-                    avatar_dir = os.path.dirname(local_avatar_full_path)
-                    print(f"     目录存在: {'✅' if os.path.exists(avatar_dir) else '❌'}")
-                    if os.path.exists(avatar_dir):
-                        files_in_dir = os.listdir(avatar_dir)
-                        print(f"     目录文件: {files_in_dir}")
+                    print(f"     目录存在: {'✅' if avatar_file['dir_exists'] else '❌'}")
+                    if avatar_file['dir_exists']:
+                        print(f"     目录文件: {avatar_file['dir_files']}")
             else:
                 print(f"   本地头像: 无")
             
@@ -151,19 +152,19 @@ def query_account_info():
             print(f"     总数: {stats['total']} | 正常: {stats['valid']}")
             print(f"     远程头像: {stats['with_remote_avatar']} | 本地头像: {stats['with_local_avatar']}")
         
+        # 🔥 头像文件审计（缺失文件、重复头像）
+        print()
+        print_audit(accounts, avatar_audit)
+        
     except sqlite3.Error as e:
         print(f"❌ 数据库错误: {e}")
     except Exception as e:
         print(f"❌ 脚本错误: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 def query_specific_account(username=None, platform_type=None):
     """查询特定账号"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_readonly_connection()
         cursor = conn.cursor()
         
         sql = """
@@ -202,9 +203,6 @@ def query_specific_account(username=None, platform_type=None):
             
     except sqlite3.Error as e:
         print(f"❌ 数据库错误: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 if __name__ == "__main__":
     import sys
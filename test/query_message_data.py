@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import argparse
 import sqlite3
 import json
 from datetime import datetime
@@ -7,15 +8,18 @@ import os
 # 数据库路径 - 请根据实际路径修改
 # 数据库路径配置
 from config import Config, BASE_DIR, DB_PATH, PLATFORM_TYPE_MAP, get_platform_name
+from consistency_check import find_orphan_messages
+from db_connection import get_readonly_connection, open_snapshot
 
 print(f"🔍 基础目录: {BASE_DIR}")
 print(f"🔍 数据库路径: {DB_PATH}")
 
+SNAPSHOT_TABLES = ('messages', 'message_threads')
+
 def debug_message_count_issue():
     """调试消息数量查询问题"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_readonly_connection()
         cursor = conn.cursor()
         
         print("🔍 调试消息数量查询问题")
@@ -33,28 +37,14 @@ def debug_message_count_issue():
         total_threads = cursor.fetchone()['total']
         print(f"   message_threads表总记录数: {total_threads}")
         
-        # 3. 检查thread_id关联
+        # 3. 检查thread_id关联（SQL 反连接，不把 thread_id 全部读入内存）
         print("\n📊 3. 检查thread_id关联:")
-        cursor.execute("""
-            SELECT DISTINCT thread_id 
-            FROM messages 
-            ORDER BY thread_id
-        """)
-        message_thread_ids = [row['thread_id'] for row in cursor.fetchall()]
-        print(f"   messages表中的thread_id: {message_thread_ids}")
-        
-        cursor.execute("""
-            SELECT DISTINCT id 
-            FROM message_threads 
-            ORDER BY id
-        """)
-        thread_ids = [row['id'] for row in cursor.fetchall()]
-        print(f"   message_threads表中的id: {thread_ids}")
-        
-        # 检查关联
-        orphaned = set(message_thread_ids) - set(thread_ids)
+        orphaned = find_orphan_messages(conn)
         if orphaned:
-            print(f"   ❌ 发现孤儿消息的thread_id: {orphaned}")
+            print(f"   ❌ 发现孤儿消息: {sum(row['count'] for row in orphaned)} 条")
+            for row in orphaned:
+                print(f"     thread_id {row['thread_id']}: {row['count']} 条消息")
+            print("   💡 运行 consistency_check.py --repair 可删除孤儿消息")
         else:
             print(f"   ✅ 所有消息都有对应的线程")
         
@@ -105,9 +95,24 @@ def debug_message_count_issue():
         print(f"❌ 数据库查询失败: {e}")
     except Exception as e:
         print(f"❌ 脚本执行失败: {e}")
-    finally:
-        if conn:
-            conn.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="调试消息数量统计")
+    parser.add_argument("--snapshot", nargs="?", const="memory", choices=["memory", "file"],
+                        help="先把数据库复制到内存 (默认) 或临时文件，统计在快照上执行")
+    parser.add_argument("--snapshot-tables", nargs="+", default=list(SNAPSHOT_TABLES),
+                        help=f"快照复制的表 ({' '.join(SNAPSHOT_TABLES)} 总会复制)，传 all 复制整个数据库")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.snapshot:
+        # 分析用到的表总会复制，--snapshot-tables 中的其它表追加在后面
+        tables = None if args.snapshot_tables == ['all'] else \
+            list(SNAPSHOT_TABLES) + [table for table in args.snapshot_tables if table not in SNAPSHOT_TABLES]
+        try:
+            open_snapshot(tables, in_memory=args.snapshot == "memory")
+        except (sqlite3.Error, ValueError) as e:
+            print(f"❌ 创建快照失败: {e}")
+            raise SystemExit(1)
     debug_message_count_issue()
\ No newline at end of file
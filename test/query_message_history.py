@@ -1,27 +1,36 @@
 #!/usr/bin/env python3
+import argparse
 import sqlite3
 import json
+import time
 from datetime import datetime
 import os
+import sys
 
 # 数据库路径配置
 from config import Config, BASE_DIR, DB_PATH, PLATFORM_TYPE_MAP, get_platform_name
+from content_hash_analyzer import analyze_content_hashes
+from database_stats import collect_stats
+from db_connection import get_readonly_connection, open_snapshot
+from epoch_columns import range_conditions
+from json_codec import decode_column
 
 print(f"🔍 基础目录: {BASE_DIR}")
 print(f"🔍 数据库路径: {DB_PATH}")
 
-def query_message_threads():
-    """查询消息线程表"""
+def query_message_threads(since=None, until=None):
+    """查询消息线程表（since / until 按最后消息时间过滤，完成整数化迁移后使用 last_message_time_epoch 列）"""
     try:
-        conn = sqlite3.connect(DB_PATH, isolation_level=None)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.row_factory = sqlite3.Row
+        conn = get_readonly_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
+        conditions, params = range_conditions('message_threads', 'last_message_time', since, until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor.execute(f"""
             SELECT * FROM message_threads 
+            {where}
             ORDER BY last_message_time DESC NULLS LAST, created_at DESC
-        """)
+        """, params)
         threads = cursor.fetchall()
         
         if not threads:
@@ -50,40 +59,30 @@ def query_message_threads():
     except sqlite3.Error as e:
         print(f"❌ 查询消息线程失败: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
 
-def query_messages(thread_id=None, limit=50):
-    """查询消息表"""
+def query_messages(thread_id=None, limit=50, since=None, until=None):
+    """查询消息表（since / until 按消息时间过滤，完成整数化迁移后使用 timestamp_epoch 列）"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_readonly_connection()
         cursor = conn.cursor()
         
+        conditions, params = range_conditions('messages', 'timestamp', since, until)
         if thread_id:
-            cursor.execute("""
-                SELECT m.*, t.user_name, t.platform, t.account_id
-                FROM (
-                    SELECT * FROM messages 
-                    WHERE thread_id = ? 
-                    ORDER BY id DESC 
-                    LIMIT ?
-                ) m
-                JOIN message_threads t ON m.thread_id = t.id
-                ORDER BY m.id ASC
-            """, (thread_id, limit))
-        else:
-            cursor.execute("""
-                SELECT m.*, t.user_name, t.platform, t.account_id
-                FROM (
-                    SELECT * FROM messages 
-                    ORDER BY id DESC 
-                    LIMIT ?
-                ) m
-                JOIN message_threads t ON m.thread_id = t.id
-                ORDER BY m.id ASC
-            """, (limit,))
+            conditions.insert(0, "thread_id = ?")
+            params.insert(0, thread_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        cursor.execute(f"""
+            SELECT m.*, t.user_name, t.platform, t.account_id
+            FROM (
+                SELECT * FROM messages 
+                {where}
+                ORDER BY id DESC 
+                LIMIT ?
+            ) m
+            JOIN message_threads t ON m.thread_id = t.id
+            ORDER BY m.id ASC
+        """, params + [limit])
         
         messages = cursor.fetchall()
         
@@ -126,15 +125,207 @@ def query_messages(thread_id=None, limit=50):
     except sqlite3.Error as e:
         print(f"❌ 查询消息失败: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
+
+# 🔥 会话快照按主键回表时每批查询的消息数
+SNAPSHOT_LOOKUP_BATCH = 500
+
+
+def _lookup_snapshot_messages(conn, ids):
+    """按主键批量读取消息和线程信息，按传入的 id 顺序返回（期间被删除的消息跳过）"""
+    rows = conn.execute(f"""
+        SELECT m.*, t.user_name, t.platform, t.account_id
+        FROM messages m
+        JOIN message_threads t ON t.id = m.thread_id
+        WHERE m.id IN ({', '.join('?' * len(ids))})
+    """, ids).fetchall()
+    by_id = {row['id']: row for row in rows}
+    return [by_id[message_id] for message_id in ids if message_id in by_id]
+
+
+def iter_thread_snapshots(conn, per_thread=5, platform=None, account_id=None):
+    """逐个线程产出 (线程信息, 最近 per_thread 条消息)，按线程 ID 顺序流式返回
+
+    第一条查询用 ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY id DESC) 在
+    idx_messages_thread_id 覆盖索引上编号，只对选出的窄键 (thread_id, id) 排序；
+    随后按这个顺序每 SNAPSHOT_LOOKUP_BATCH 条按主键回表读取完整消息，
+    完整的消息行不会整体缓存或排序，第一个线程读完即可产出。
+    image_paths 保持原始文本，需要时再用 decode_image_paths 解析。
+    """
+    conditions = []
+    params = []
+    if platform:
+        conditions.append("platform = ?")
+        params.append(platform)
+    if account_id:
+        conditions.append("account_id = ?")
+        params.append(account_id)
+    thread_filter = ""
+    if conditions:
+        thread_filter = f"WHERE thread_id IN (SELECT id FROM message_threads WHERE {' AND '.join(conditions)})"
+
+    keys = conn.cursor()
+    keys.execute(f"""
+        SELECT id, thread_id FROM (
+            SELECT id, thread_id,
+                   ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY id DESC) AS rn
+            FROM messages
+            {thread_filter}
+        )
+        WHERE rn <= ?
+        ORDER BY thread_id, id
+    """, params + [per_thread])
+
+    def messages_in_order():
+        batch = []
+        for message_id, _ in keys:
+            batch.append(message_id)
+            if len(batch) >= SNAPSHOT_LOOKUP_BATCH:
+                yield from _lookup_snapshot_messages(conn, batch)
+                batch = []
+        if batch:
+            yield from _lookup_snapshot_messages(conn, batch)
+
+    thread = None
+    messages = []
+    for msg in messages_in_order():
+        if thread is not None and msg['thread_id'] != thread['thread_id']:
+            yield thread, messages
+            messages = []
+        if not messages:
+            thread = {key: msg[key] for key in ('thread_id', 'user_name', 'platform', 'account_id')}
+        messages.append(msg)
+    if messages:
+        yield thread, messages
+
+
+def decode_image_paths(msg):
+    """解析消息的 image_paths（JSON 数组），非法 JSON 时返回原始文本"""
+    return decode_column(msg['image_paths'], [])
+
+
+def query_thread_snapshots(per_thread=5, platform=None, account_id=None):
+    """会话快照：每个线程（或指定平台/账号的线程）最近 per_thread 条消息"""
+    try:
+        conn = get_readonly_connection()
+
+        thread_count = 0
+        message_count = 0
+        for thread, messages in iter_thread_snapshots(conn, per_thread, platform, account_id):
+            thread_count += 1
+            message_count += len(messages)
+            print(f"🧵 线程 {thread['thread_id']}: {thread['user_name']} ({thread['platform']}/{thread['account_id']})")
+            for msg in messages:
+                line = f"   [{msg['timestamp']}] {msg['sender']}: {msg['text_content'] or ''}"
+                if msg['image_paths']:
+                    image_paths = decode_image_paths(msg)
+                    line += f"  🖼️ {len(image_paths) if isinstance(image_paths, list) else image_paths} 张图片"
+                print(line)
+            print("-" * 50)
+
+        if thread_count == 0:
+            print("❌ 没有找到消息记录")
+            return 0
+
+        print(f"📊 共 {thread_count} 个线程, {message_count} 条消息")
+        return thread_count
+
+    except sqlite3.Error as e:
+        print(f"❌ 查询会话快照失败: {e}")
+        return 0
+
+# 🔥 --follow 模式的轮询间隔和每次读取的最大消息数
+FOLLOW_INTERVAL = 1.0
+FOLLOW_BATCH_SIZE = 500
+
+
+def _sync_status_key(status):
+    return (status['last_sync_time'], status['sync_count'], status['last_error'], status['updated_at'])
+
+
+def follow_messages(interval=FOLLOW_INTERVAL, platform=None, account_id=None):
+    """持续输出新消息和同步状态变化（Ctrl+C 退出）
+
+    复用一个长期打开的只读连接，每隔 interval 秒读取 PRAGMA data_version：
+    只有其它连接（应用）提交过写入时该值才会变化，此时才查询
+    messages.id > 上次扫描到的 id 的新消息，以及与上次不同的 platform_sync_status 行
+    （每个账号一行，表很小，整表读取后在内存中比较）。两次轮询之间进程处于休眠状态。
+    """
+    conn = get_readonly_connection()
+    cursor = conn.cursor()
+
+    conditions = ["m.id > ?", "m.id <= ?"]
+    filters = []
+    if platform:
+        conditions.append("t.platform = ?")
+        filters.append(platform)
+    if account_id:
+        conditions.append("t.account_id = ?")
+        filters.append(account_id)
+
+    last_seen = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+    statuses = {row['id']: _sync_status_key(row) for row in cursor.execute("SELECT * FROM platform_sync_status")}
+    data_version = cursor.execute("PRAGMA data_version").fetchone()[0]
+
+    print(f"👀 正在跟踪新消息 (从 id={last_seen} 之后开始, 每 {interval} 秒检查一次, Ctrl+C 退出)")
+
+    while True:
+        time.sleep(interval)
+        version = cursor.execute("PRAGMA data_version").fetchone()[0]
+        if version == data_version:
+            continue
+        data_version = version
+
+        # 🔥 新消息：先在同一个读事务内取当前最大 id 作为本轮上界，再按主键范围读取，
+        # 一次最多 FOLLOW_BATCH_SIZE 条；无论有没有符合过滤条件的消息，last_seen 都推进到上界，
+        # 过滤的账号长时间没有新消息时也不会反复扫描其它账号的消息
+        conn.execute("BEGIN")
+        try:
+            upper = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+            scanned = last_seen
+            while True:
+                messages = cursor.execute(f"""
+                    SELECT m.id, m.thread_id, m.sender, m.content_type, m.text_content, m.image_paths,
+                           m.timestamp, t.user_name, t.platform, t.account_id
+                    FROM messages m
+                    JOIN message_threads t ON m.thread_id = t.id
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY m.id
+                    LIMIT ?
+                """, [scanned, upper] + filters + [FOLLOW_BATCH_SIZE]).fetchall()
+                for msg in messages:
+                    line = (f"💬 [{msg['timestamp']}] {msg['platform']}/{msg['account_id']} "
+                            f"{msg['user_name']} (线程 {msg['thread_id']}) {msg['sender']}: {msg['text_content'] or ''}")
+                    if msg['image_paths']:
+                        image_paths = decode_image_paths(msg)
+                        line += f"  🖼️ {len(image_paths) if isinstance(image_paths, list) else image_paths} 张图片"
+                    print(line)
+                if len(messages) < FOLLOW_BATCH_SIZE:
+                    break
+                scanned = messages[-1]['id']
+        finally:
+            conn.execute("COMMIT")
+        last_seen = max(last_seen, upper)
+
+        # 🔥 同步状态：只打印有变化的行
+        for status in cursor.execute("SELECT * FROM platform_sync_status ORDER BY id").fetchall():
+            if platform and status['platform'] != platform:
+                continue
+            if account_id and status['account_id'] != account_id:
+                continue
+            key = _sync_status_key(status)
+            if statuses.get(status['id']) == key:
+                continue
+            statuses[status['id']] = key
+            error = f"  ❌ {status['last_error']}" if status['last_error'] else ""
+            print(f"🔄 同步 {status['platform']}/{status['account_id']}: "
+                  f"第 {status['sync_count']} 次, 最后同步 {status['last_sync_time']}{error}")
+        sys.stdout.flush()
+
 
 def query_sync_status():
     """查询同步状态表"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_readonly_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -165,100 +356,62 @@ def query_sync_status():
     except sqlite3.Error as e:
         print(f"❌ 查询同步状态失败: {e}")
         return []
-    finally:
-        if conn:
-            conn.close()
 
-def query_database_info():
-    """查询数据库基本信息"""
+def query_database_info(exact=False):
+    """查询数据库基本信息
+
+    记录数默认取自 sqlite_stat1 的近似值，exact=True 时才逐表 COUNT(*)
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        stats = collect_stats(exact=exact)
+        tables = stats['tables']
         
         print("📋 数据库基本信息:")
         print(f"   数据库文件: {DB_PATH}")
-        print(f"   文件大小: {os.path.getsize(DB_PATH) / 1024 / 1024:.2f} MB")
-        
-        # 查询表信息
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = cursor.fetchall()
+        print(f"   文件大小: {stats['file_bytes'] / 1024 / 1024:.2f} MB")
+        print(f"   WAL 大小: {stats['wal_bytes'] / 1024 / 1024:.2f} MB")
         print(f"   表数量: {len(tables)}")
-        print(f"   表列表: {[table['name'] for table in tables]}")
-        
-        # 查询各表记录数
-        for table in tables:
-            table_name = table['name']
-            cursor.execute(f"SELECT COUNT(*) as count FROM {table_name}")
-            count = cursor.fetchone()['count']
-            print(f"   {table_name}: {count} 条记录")
+        print(f"   表列表: {list(tables)}")
+        
+        # 各表记录数
+        for table_name, table in tables.items():
+            if table['rows'] is None:
+                print(f"   {table_name}: 记录数未知 (运行 database_stats.py --analyze 后可用)")
+            elif table['rows_source'] == 'exact':
+                print(f"   {table_name}: {table['rows']} 条记录")
+            else:
+                print(f"   {table_name}: 约 {table['rows']} 条记录")
         
         print("-" * 50)
         
     except sqlite3.Error as e:
         print(f"❌ 查询数据库信息失败: {e}")
-    finally:
-        if conn:
-            conn.close()
 
 def query_content_hash_analysis():
-    """分析内容指纹的分布情况"""
+    """分析内容指纹的分布情况（增量统计，只扫描上次分析之后的新消息）"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        print("🔍 内容指纹分析:")
-        
-        # 查询重复指纹
-        cursor.execute("""
-            SELECT content_hash, COUNT(*) as count, 
-                   GROUP_CONCAT(DISTINCT text_content) as texts,
-                   GROUP_CONCAT(DISTINCT sender) as senders
-            FROM messages 
-            WHERE content_hash IS NOT NULL
-            GROUP BY content_hash 
-            HAVING COUNT(*) > 1
-            ORDER BY count DESC
-            LIMIT 10
-        """)
-        
-        duplicates = cursor.fetchall()
-        
-        if duplicates:
-            print(f"   发现 {len(duplicates)} 个重复指纹:")
-            for dup in duplicates:
-                print(f"   指纹: {dup['content_hash']}")
-                print(f"   重复次数: {dup['count']}")
-                print(f"   文本内容: {dup['texts']}")
-                print(f"   发送者: {dup['senders']}")
-                print("   ---")
-        else:
-            print("   ✅ 没有发现重复指纹")
-        
-        # 查询指纹为空的记录
-        cursor.execute("SELECT COUNT(*) as count FROM messages WHERE content_hash IS NULL")
-        null_hash_count = cursor.fetchone()['count']
-        print(f"   指纹为空的消息数: {null_hash_count}")
-        
-        # 查询总消息数
-        cursor.execute("SELECT COUNT(*) as count FROM messages")
-        total_count = cursor.fetchone()['count']
-        print(f"   总消息数: {total_count}")
-        
-        if total_count > 0:
-            print(f"   指纹覆盖率: {((total_count - null_hash_count) / total_count * 100):.2f}%")
-        
-        print("-" * 50)
+        analyze_content_hashes(top=10)
         
     except sqlite3.Error as e:
         print(f"❌ 内容指纹分析失败: {e}")
-    finally:
-        if conn:
-            conn.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="消息数据库查询工具（不带参数时进入交互菜单）")
+    parser.add_argument("--follow", action="store_true", help="持续输出新消息和同步状态变化")
+    parser.add_argument("--interval", type=float, default=FOLLOW_INTERVAL,
+                        help=f"--follow 的检查间隔秒数 (默认 {FOLLOW_INTERVAL})")
+    parser.add_argument("--platform", help="--follow 只显示指定平台")
+    parser.add_argument("--account", help="--follow 只显示指定账号ID")
+    parser.add_argument("--snapshot", nargs="?", const="memory", choices=["memory", "file"],
+                        help="先把数据库复制到内存 (默认) 或临时文件，所有查询在快照上执行")
+    parser.add_argument("--snapshot-tables", nargs="+",
+                        help="快照只复制指定的表 (默认复制整个数据库)")
+    return parser.parse_args()
 
 def main():
     """主函数"""
+    args = parse_args()
+
     print("🚀 消息数据库查询工具")
     print("=" * 60)
     
@@ -266,6 +419,25 @@ def main():
     if not os.path.exists(DB_PATH):
         print(f"❌ 数据库文件不存在: {DB_PATH}")
         return
+
+    if args.follow and args.snapshot:
+        print("❌ --follow 需要读取实时数据库，不能与 --snapshot 同时使用")
+        return
+    if args.snapshot:
+        try:
+            open_snapshot(args.snapshot_tables, in_memory=args.snapshot == "memory")
+        except (sqlite3.Error, ValueError) as e:
+            print(f"❌ 创建快照失败: {e}")
+            return
+
+    if args.follow:
+        try:
+            follow_messages(interval=args.interval, platform=args.platform, account_id=args.account)
+        except KeyboardInterrupt:
+            print("\n👋 已停止跟踪")
+        except sqlite3.Error as e:
+            print(f"❌ 跟踪失败: {e}")
+        return
     
     while True:
         print("\n📋 请选择查询选项:")
@@ -276,9 +448,11 @@ def main():
         print("5. 查询同步状态")
         print("6. 内容指纹分析")
         print("7. 完整报告")
+        print("8. 会话快照 (每个线程最近N条消息)")
+        print("9. 按时间范围查询线程和消息")
         print("0. 退出")
         
-        choice = input("\n请输入选项 (0-7): ").strip()
+        choice = input("\n请输入选项 (0-9): ").strip()
         
         if choice == '0':
             print("👋 再见!")
@@ -307,6 +481,23 @@ def main():
             query_messages(limit=20)
             query_sync_status()
             query_content_hash_analysis()
+        elif choice == '8':
+            platform = input("平台 (回车表示全部): ").strip() or None
+            account_id = input("账号ID (回车表示全部): ").strip() or None
+            per_thread = input("每个线程显示条数 (默认5): ").strip()
+            try:
+                per_thread = int(per_thread) if per_thread else 5
+                query_thread_snapshots(per_thread=per_thread, platform=platform, account_id=account_id)
+            except ValueError:
+                print("❌ 请输入有效的数字")
+        elif choice == '9':
+            since = input("起始时间 (包含, UTC, 如 2025-01-01, 回车表示不限): ").strip() or None
+            until = input("截止时间 (不包含, 回车表示不限): ").strip() or None
+            try:
+                query_message_threads(since=since, until=until)
+                query_messages(since=since, until=until)
+            except ValueError:
+                print("❌ 请输入有效的时间，如 2025-01-01 或 '2025-01-01 08:00:00'")
         else:
             print("❌ 无效选项，请重新选择")
 
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+查询计划审计脚本
+运行各个查询脚本并跟踪它们实际执行的 SQL，对每条语句执行 EXPLAIN QUERY PLAN，
+标记全表扫描 (SCAN) 和临时排序 (USE TEMP B-TREE)，给出覆盖索引建议；
+--apply 时创建建议的索引并重新计时对比
+
+审计其它数据库（例如 benchmark_scripts 生成的合成库）时设置环境变量 MAB_BASE_DIR
+"""
+
+import argparse
+import contextlib
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import time
+
+# 导入配置
+from config import DB_PATH
+from db_connection import close_connections, get_readonly_connection, get_write_connection, set_trace_callback
+
+# 🔥 审计时运行的脚本函数（只读）
+WORKLOAD = [
+    ('query_message_history', 'query_database_info', {}),
+    ('query_message_history', 'query_message_threads', {}),
+    ('query_message_history', 'query_messages', {}),
+    ('query_message_history', 'query_messages', {'thread_id': 1}),
+    ('query_message_history', 'query_thread_snapshots', {}),
+    ('query_message_history', 'query_thread_snapshots', {'platform': 'douyin', 'account_id': 'a'}),
+    ('query_message_history', 'query_sync_status', {}),
+    ('query_message_history', 'query_content_hash_analysis', {}),
+    ('query_message_data', 'debug_message_count_issue', {}),
+    ('query_account_info', 'query_account_info', {}),
+    ('query_account_info', 'query_specific_account', {'username': 'a', 'platform_type': 3}),
+    ('query_publish_records', 'query_publish_records', {'limit': 50}),
+    ('query_publish_records', 'query_publish_records', {'limit': 50, 'status': 'failed'}),
+    ('query_publish_records', 'query_publish_records',
+     {'limit': 50, 'status': ('failed', 'partial'), 'drilldown': True}),
+    ('clear_douyin_messages', 'get_douyin_statistics', {}),
+    ('consistency_check', 'run_checks', {}),
+]
+
+# 🔥 不放进建议索引的大字段（会让索引接近整表大小）
+LARGE_COLUMNS = {
+    'text_content', 'image_paths', 'publish_config', 'original_request_data', 'video_files',
+    'account_list', 'cover_screenshots', 'error_message', 'bio',
+}
+SMALL_TABLE_ROWS = 1000         # 行数低于此值的表的全表扫描只作提示
+DEFAULT_REPEAT = 3
+EXPERT_TIMEOUT = 60
+_SYSTEM_OBJECTS = re.compile(r"\b(sqlite_master|sqlite_schema|sqlite_stat\d|dbstat|pragma_\w+)\b", re.I)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.I)
+_CLAUSE_END = r"(?=\b(?:GROUP\s+BY|ORDER\s+BY|LIMIT|HAVING)\b|\)|$)"
+
+
+def normalize_sql(sql):
+    """去掉字面量和多余空白，用于合并同一条语句的多次执行"""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    return " ".join(sql.split())
+
+
+# ==================== 收集语句 ====================
+
+def collect_statements(workload=WORKLOAD):
+    """运行脚本函数并收集执行过的 SELECT 语句
+
+    返回 {规范化 SQL: {'sql': 第一次执行的展开 SQL, 'sources': [来源函数], 'executions': 次数}}
+    """
+    statements = {}
+    current = [None]
+
+    def trace(sql):
+        text = sql.strip()
+        if not re.match(r"(SELECT|WITH)\b", text, re.I) or _SYSTEM_OBJECTS.search(text):
+            return
+        key = normalize_sql(text)
+        entry = statements.setdefault(key, {'sql': text, 'sources': [], 'executions': 0})
+        entry['executions'] += 1
+        if current[0] not in entry['sources']:
+            entry['sources'].append(current[0])
+
+    set_trace_callback(trace)
+    try:
+        for module_name, function_name, kwargs in workload:
+            current[0] = f"{module_name}.{function_name}"
+            try:
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    module = __import__(module_name)
+                    getattr(module, function_name)(**kwargs)
+            except Exception as e:
+                print(f"   ⚠️  {current[0]} 运行失败: {e}")
+    finally:
+        set_trace_callback(None)
+    return statements
+
+
+# ==================== 执行计划 ====================
+
+def explain(conn, sql):
+    """返回 [(缩进层级, 计划步骤)]"""
+    depths = {0: -1}
+    plan = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        node_id, parent, detail = row[0], row[1], row[3]
+        depths[node_id] = depths.get(parent, -1) + 1
+        plan.append((depths[node_id], detail))
+    return plan
+
+
+def _table_aliases(conn, sql):
+    """返回 {别名或表名: 表名}（只包含真实存在的表）"""
+    tables = {row[0].lower() for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        if table.lower() not in tables:
+            continue
+        aliases[table.lower()] = table
+        if alias and alias.upper() not in ("WHERE", "ON", "LEFT", "JOIN", "INNER", "ORDER", "GROUP", "LIMIT"):
+            aliases[alias.lower()] = table
+    return aliases
+
+
+def _estimate_rows(conn, table, cache):
+    if table not in cache:
+        try:
+            cache[table] = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+        except sqlite3.Error:
+            cache[table] = None
+    return cache[table]
+
+
+def find_issues(conn, sql, plan, row_cache):
+    """从执行计划中找出全表扫描和临时排序，返回 [(级别, 说明, 表名)]"""
+    aliases = _table_aliases(conn, sql)
+    issues = []
+    for _, detail in plan:
+        if detail.startswith("SCAN "):
+            name = detail.split()[1].lower()
+            table = aliases.get(name)
+            if table is None:
+                continue        # 子查询 / CTE 的扫描
+            rows = _estimate_rows(conn, table, row_cache)
+            covering = "COVERING INDEX" in detail
+            level = "info" if (rows is not None and rows < SMALL_TABLE_ROWS) or covering else "warn"
+            issues.append((level, f"{detail} (约 {rows} 行)", table))
+        elif "USE TEMP B-TREE" in detail:
+            issues.append(("warn", detail, None))
+    return issues
+
+
+# ==================== 索引建议 ====================
+
+def _index_name(table, columns):
+    names = [column.split()[0].strip('"') for column in columns]
+    return f"idx_{table}_{'_'.join(names)}"
+
+
+def _rename_index(create_sql):
+    """把 .expert 生成的随机索引名改为仓库的 idx_<表>_<列> 命名，并加上 IF NOT EXISTS"""
+    match = re.match(r"CREATE INDEX (\S+) ON (\w+)\((.*)\);?$", create_sql.strip(), re.I)
+    if not match:
+        return create_sql.strip().rstrip(';')
+    table, columns = match.group(2), [column.strip() for column in match.group(3).split(",")]
+    return f"CREATE INDEX IF NOT EXISTS {_index_name(table, columns)} ON {table}({', '.join(columns)})"
+
+
+def filter_suggestion(conn, create_sql):
+    """去掉大字段，并丢弃以 rowid 开头或已被现有索引覆盖的建议；返回 None 表示不需要"""
+    match = re.match(r"CREATE INDEX IF NOT EXISTS \S+ ON (\w+)\((.*)\)$", create_sql)
+    if not match:
+        return create_sql
+    table = match.group(1)
+    columns = []
+    for column in (column.strip() for column in match.group(2).split(",")):
+        if column.split()[0].strip('"').lower() in LARGE_COLUMNS:
+            break
+        columns.append(column)
+    if not columns:
+        return None
+
+    rowid_columns = {
+        row[1].lower() for row in conn.execute(f'PRAGMA table_info("{table}")')
+        if row[5] == 1 and (row[2] or '').upper() == 'INTEGER'
+    }
+    # 索引末尾隐含 rowid，末尾的 rowid 列是多余的
+    while columns and columns[-1].split()[0].strip('"').lower() in rowid_columns:
+        columns.pop()
+    names = [column.split()[0].strip('"').lower() for column in columns]
+    if not names or names[0] in rowid_columns:
+        return None
+    for index in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+        existing = [row[2].lower() for row in conn.execute(f'PRAGMA index_info("{index[1]}")') if row[2]]
+        if existing[:len(names)] == names:
+            return None
+    return f"CREATE INDEX IF NOT EXISTS {_index_name(table, columns)} ON {table}({', '.join(columns)})"
+
+
+def expert_suggest(db_path, sql):
+    """使用 sqlite3 命令行的 .expert 生成索引建议；命令行不可用时返回 None"""
+    cli = shutil.which("sqlite3")
+    if not cli:
+        return None
+    try:
+        result = subprocess.run(
+            [cli, "-readonly", db_path, ".expert", sql.rstrip().rstrip(';') + ";"],
+            capture_output=True, text=True, timeout=EXPERT_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return [_rename_index(line) for line in result.stdout.splitlines() if line.upper().startswith("CREATE INDEX")]
+
+
+def heuristic_suggest(conn, sql, table):
+    """没有 sqlite3 命令行时的简单建议：WHERE 等值列 + ORDER BY 列"""
+    columns = {row[1].lower(): row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+    prefixes = {alias for alias, name in _table_aliases(conn, sql).items() if name == table}
+    prefixes.add(None)
+
+    def own(prefix, column):
+        return (prefix.lower() if prefix else None) in prefixes and column.lower() in columns
+
+    picked = []
+    for where in re.findall(r"\bWHERE\b(.*?)" + _CLAUSE_END, sql, re.I | re.S):
+        for prefix, column in re.findall(r"(?:(\w+)\.)?(\w+)\s*=\s*(?:\?|'|\d)", where):
+            if own(prefix, column) and columns[column.lower()] not in picked:
+                picked.append(columns[column.lower()])
+
+    order = re.search(r"\bORDER\s+BY\b(.*?)(?=\bLIMIT\b|\)|$)", sql, re.I | re.S)
+    if order:
+        for item in order.group(1).split(","):
+            match = re.match(r"\s*(?:(\w+)\.)?(\w+)(\s+DESC)?", item, re.I)
+            if match and own(match.group(1), match.group(2)):
+                name = columns[match.group(2).lower()]
+                if name not in picked:
+                    picked.append(name + (" DESC" if match.group(3) else ""))
+
+    if not picked:
+        return []
+    return [f"CREATE INDEX IF NOT EXISTS {_index_name(table, picked)} ON {table}({', '.join(picked)})"]
+
+
+def time_query(conn, sql, repeat=DEFAULT_REPEAT):
+    """返回多次执行中的最短耗时（秒）"""
+    best = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        conn.execute(sql).fetchall()
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# ==================== 审计 ====================
+
+def audit(statements, repeat=DEFAULT_REPEAT, db_path=None):
+    """对收集到的语句执行计划分析，返回审计结果列表"""
+    db_path = db_path or DB_PATH
+    conn = get_readonly_connection(db_path)
+    row_cache = {}
+    results = []
+    for key, entry in statements.items():
+        sql = entry['sql']
+        try:
+            plan = explain(conn, sql)
+        except sqlite3.Error as e:
+            results.append({'key': key, **entry, 'error': str(e), 'plan': [], 'issues': [], 'suggestions': []})
+            continue
+
+        issues = find_issues(conn, sql, plan, row_cache)
+        suggestions = []
+        if any(level == "warn" for level, _, _ in issues):
+            candidates = expert_suggest(db_path, sql)
+            if candidates is None:
+                candidates = []
+                tables = [table for _, _, table in issues if table] or list(_table_aliases(conn, sql).values())
+                for table in dict.fromkeys(tables):
+                    candidates.extend(heuristic_suggest(conn, sql, table))
+            suggestions = [
+                suggestion for suggestion in (filter_suggestion(conn, candidate) for candidate in candidates)
+                if suggestion
+            ]
+
+        results.append({
+            'key': key, **entry, 'plan': plan, 'issues': issues, 'suggestions': suggestions,
+            'time_s': time_query(conn, sql, repeat) if issues else None,
+        })
+    return results
+
+
+def print_audit(results, show_ok=False):
+    flagged = [result for result in results if result['issues'] or result.get('error')]
+    print(f"\n📋 共审计 {len(results)} 条语句, 有问题的 {len(flagged)} 条")
+    print("=" * 60)
+
+    for result in results:
+        if not show_ok and not result['issues'] and not result.get('error'):
+            continue
+        warn = any(level == "warn" for level, _, _ in result['issues'])
+        icon = "⚠️ " if warn else ("❌" if result.get('error') else "ℹ️ ")
+        print(f"{icon} {result['key'][:200]}")
+        print(f"   来源: {', '.join(result['sources'])} (执行 {result['executions']} 次)")
+        if result.get('error'):
+            print(f"   执行计划失败: {result['error']}")
+        for depth, detail in result['plan']:
+            print(f"   {'  ' * depth}{detail}")
+        for level, message, _ in result['issues']:
+            print(f"   {'🔴' if level == 'warn' else '⚪'} {message}")
+        if result.get('time_s') is not None:
+            print(f"   耗时: {result['time_s'] * 1000:.2f} ms")
+        for suggestion in result['suggestions']:
+            print(f"   💡 {suggestion}")
+        print("-" * 60)
+
+    suggestions = unique_suggestions(results)
+    if suggestions:
+        print("💡 建议的索引:")
+        for suggestion in suggestions:
+            print(f"   {suggestion};")
+
+
+def unique_suggestions(results):
+    return list(dict.fromkeys(suggestion for result in results for suggestion in result['suggestions']))
+
+
+def apply_suggestions(results, repeat=DEFAULT_REPEAT, db_path=None):
+    """创建建议的索引，并重新分析和计时相关语句"""
+    db_path = db_path or DB_PATH
+    writer = get_write_connection(db_path)
+    for suggestion in unique_suggestions(results):
+        started_at = time.time()
+        writer.execute(suggestion)
+        print(f"✅ {suggestion} ({time.time() - started_at:.2f} 秒)")
+
+    # 脚本中未读完的游标会让复用的只读连接停留在旧快照（看不到新索引），重新打开连接
+    close_connections()
+    conn = get_readonly_connection(db_path)
+    print("\n⏱️  索引创建后重新计时:")
+    for result in results:
+        if not result['suggestions']:
+            continue
+        after = time_query(conn, result['sql'], repeat)
+        before = result['time_s']
+        speedup = f"{before / after:.1f}x" if after > 0 else "-"
+        print(f"   {before * 1000:9.2f} ms -> {after * 1000:9.2f} ms ({speedup})  {result['key'][:100]}")
+        for depth, detail in explain(conn, result['sql']):
+            print(f"      {'  ' * depth}{detail}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="查询脚本执行计划审计")
+    parser.add_argument("--show-ok", action="store_true", help="同时列出没有问题的语句")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"计时执行次数，取最短耗时 (默认 {DEFAULT_REPEAT})")
+    parser.add_argument("--apply", action="store_true", help="创建建议的索引并重新计时")
+    parser.add_argument("--yes", action="store_true", help="创建索引前不再确认")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return 1
+
+    print(f"🔍 运行查询脚本并收集 SQL: {DB_PATH}")
+    statements = collect_statements()
+    results = audit(statements, args.repeat)
+    print_audit(results, args.show_ok)
+
+    if args.apply:
+        if not unique_suggestions(results):
+            print("✅ 没有需要创建的索引")
+            return 0
+        if not args.yes:
+            confirm = input("\n是否在数据库中创建以上索引? 输入 'YES' 确认: ").strip()
+            if confirm.upper() != 'YES':
+                print("👋 操作已取消")
+                return 0
+        apply_suggestions(results, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断")
+        sys.exit(1)
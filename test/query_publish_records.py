@@ -1,77 +1,311 @@
 #!/usr/bin/env python3
 import sqlite3
-import json
+import argparse
 from datetime import datetime
 
 # 数据库路径
 from config import Config, BASE_DIR, DB_PATH, PLATFORM_TYPE_MAP, get_platform_name
+from db_connection import get_readonly_connection
+from epoch_columns import epoch_column, epoch_ready, range_conditions
+from json_codec import BACKEND as JSON_BACKEND, decode_column
 
 print(f"🔍 基础目录: {BASE_DIR}")
 print(f"🔍 数据库路径: {DB_PATH}")
 
+# 🔥 每页读取的记录数
+DEFAULT_PAGE_SIZE = 500
 
-def query_publish_records():
+# 🔥 按 record_id IN (...) 批量读取账号状态时每批的 ID 数（低于旧版 SQLite 999 个参数的限制）
+STATUS_BATCH_SIZE = 500
+
+# 🔥 需要排查的记录状态（--failed）
+PROBLEM_STATUSES = ('failed', 'partial')
+
+# 🔥 账号发布状态展示需要的列
+ACCOUNT_STATUS_COLUMNS = """
+    record_id, account_name, platform, status, upload_status, push_status,
+    transcode_status, review_status, error_message, start_time, end_time
+"""
+
+# 🔥 列表展示需要的列（不读取 publish_config / original_request_data 等大字段）
+SUMMARY_COLUMNS = """
+    id, title, platform_type, status, total_accounts, success_accounts,
+    failed_accounts, start_time, end_time, duration, created_by,
+    created_at, updated_at
+"""
+
+# 🔥 列表字段的摘要在 SQLite 端用 JSON1 计算，Python 端不做 json.loads
+# 非法 JSON 时计数为 NULL，并带回原始文本用于展示
+JSON_SUMMARY_COLUMNS = """
+    CASE WHEN json_valid(video_files) AND json_type(video_files) = 'array'
+         THEN json_array_length(video_files) END AS video_count,
+    CASE WHEN json_valid(video_files) AND json_type(video_files) = 'array'
+         THEN json_extract(video_files, '$[0]') END AS first_video,
+    CASE WHEN json_valid(account_list) AND json_type(account_list) = 'array'
+         THEN json_array_length(account_list) END AS account_count,
+    CASE WHEN json_valid(account_list) AND json_type(account_list) = 'array'
+         THEN (SELECT group_concat(platform, ',') FROM (
+                  SELECT DISTINCT json_extract(value, '$.platform') AS platform
+                  FROM json_each(account_list)
+                  WHERE json_type(value) = 'object'
+              )) END AS account_platforms,
+    CASE WHEN json_valid(cover_screenshots) AND json_type(cover_screenshots) = 'array'
+         THEN json_array_length(cover_screenshots) END AS cover_count,
+    CASE WHEN json_valid(cover_screenshots) AND json_type(cover_screenshots) = 'array'
+         THEN json_extract(cover_screenshots, '$[0]') END AS first_cover,
+    CASE WHEN NOT json_valid(video_files) THEN video_files END AS video_files_raw,
+    CASE WHEN NOT json_valid(account_list) THEN account_list END AS account_list_raw,
+    CASE WHEN NOT json_valid(cover_screenshots) THEN cover_screenshots END AS cover_screenshots_raw
+"""
+
+# 🔥 详情视图才读取完整的列表字段，并在打印时解析
+DETAIL_COLUMNS = "video_files, account_list, cover_screenshots"
+
+
+def iter_publish_record_pages(conn, since=None, until=None, status=None, limit=None,
+                              page_size=DEFAULT_PAGE_SIZE, detail=False):
+    """按 (created_at, id) 键集分页，逐页产出发布记录
+
+    不过滤状态时使用 idx_publish_records_created_at 索引倒序读取；
+    指定时间范围且 created_at 已完成整数化迁移时，过滤、排序和键集都改用 created_at_epoch，
+    由 idx_publish_records_created_at_epoch 同时完成范围定位和排序，每页不需要临时排序；
+    status 可以是单个状态或状态列表（如 failed + partial），此时走 idx_publish_records_status，
+    只读取并排序这些状态的记录，不会扫描成功的记录。
+    每次只取一页，内存占用与总记录数无关。
+    detail=True 时额外读取完整的 video_files / account_list / cover_screenshots。
+    """
+    # 🔥 过滤和排序必须使用同一个列，否则每页都要读出整个范围重新排序
+    sort_column = 'created_at'
+    if (since or until) and epoch_ready('publish_records', 'created_at'):
+        sort_column = epoch_column('created_at')
+
+    columns = f"{SUMMARY_COLUMNS}, {JSON_SUMMARY_COLUMNS}, {sort_column} AS sort_key"
+    if detail:
+        columns += f", {DETAIL_COLUMNS}"
+
+    # 🔥 created_at 范围：完成整数化迁移后使用 created_at_epoch 列
+    conditions, params = range_conditions('publish_records', 'created_at', since, until)
+    if status:
+        statuses = [status] if isinstance(status, str) else list(status)
+        if len(statuses) == 1:
+            conditions.append("status = ?")
+        else:
+            conditions.append(f"status IN ({', '.join('?' * len(statuses))})")
+        params.extend(statuses)
+
+    cursor = conn.cursor()
+    last_key = None
+    remaining = limit
+
+    while remaining is None or remaining > 0:
+        page_conditions = list(conditions)
+        page_params = list(params)
+
+        # 🔥 键集条件：从上一页最后一条记录之后继续
+        if last_key is not None:
+            page_conditions.append(f"({sort_column}, id) < (?, ?)")
+            page_params.extend(last_key)
+
+        where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
+        fetch_size = page_size if remaining is None else min(page_size, remaining)
+
+        cursor.execute(f"""
+            SELECT {columns}
+            FROM publish_records
+            {where}
+            ORDER BY {sort_column} DESC, id DESC
+            LIMIT ?
+        """, page_params + [fetch_size])
+        page = cursor.fetchall()
+
+        if not page:
+            break
+
+        yield page
+
+        if remaining is not None:
+            remaining -= len(page)
+        if len(page) < fetch_size:
+            break
+
+        last_key = (page[-1]['sort_key'], page[-1]['id'])
+
+
+def iter_publish_records(conn, since=None, until=None, status=None, limit=None,
+                         page_size=DEFAULT_PAGE_SIZE, detail=False):
+    """逐条产出发布记录（参数同 iter_publish_record_pages）"""
+    for page in iter_publish_record_pages(conn, since, until, status, limit, page_size, detail):
+        yield from page
+
+
+def fetch_account_statuses(conn, record_ids, batch_size=STATUS_BATCH_SIZE):
+    """批量读取多条发布记录的账号状态，返回 {record_id: [账号状态行]}
+
+    每批使用一条 record_id IN (...) 查询（走 idx_publish_account_status_record_id），
+    避免逐条记录查询（N+1）。
+    """
+    grouped = {record_id: [] for record_id in record_ids}
+    record_ids = list(grouped)
+    cursor = conn.cursor()
+
+    for start in range(0, len(record_ids), batch_size):
+        batch = record_ids[start:start + batch_size]
+        cursor.execute(f"""
+            SELECT {ACCOUNT_STATUS_COLUMNS}
+            FROM publish_account_status
+            WHERE record_id IN ({', '.join('?' * len(batch))})
+            ORDER BY record_id, id
+        """, batch)
+        for row in cursor:
+            grouped[row['record_id']].append(row)
+
+    return grouped
+
+
+def iter_publish_drilldown(conn, since=None, until=None, status=None, limit=None,
+                           page_size=DEFAULT_PAGE_SIZE, detail=False):
+    """逐条产出 (发布记录, 账号状态列表)，每页记录只额外执行一批账号状态查询"""
+    for page in iter_publish_record_pages(conn, since, until, status, limit, page_size, detail):
+        statuses = fetch_account_statuses(conn, [record['id'] for record in page])
+        for record in page:
+            yield record, statuses[record['id']]
+
+
+def print_publish_record(index, record, accounts=None):
+    """打印单条发布记录（传入 accounts 时同时打印各账号的发布状态）"""
+    print(f"🔥 记录 {index}")
+    print(f"   ID: {record['id']}")
+    print(f"   标题: {record['title']}")
+    print(f"   平台类型: {record['platform_type']}")
+    print(f"   状态: {record['status']}")
+    print(f"   总账号数: {record['total_accounts']}")
+    print(f"   成功账号数: {record['success_accounts']}")
+    print(f"   失败账号数: {record['failed_accounts']}")
+    print(f"   开始时间: {record['start_time']}")
+    print(f"   结束时间: {record['end_time']}")
+    print(f"   耗时(秒): {record['duration']}")
+    print(f"   创建者: {record['created_by']}")
+    print(f"   创建时间: {record['created_at']}")
+    print(f"   更新时间: {record['updated_at']}")
+
+    if 'video_files' in record.keys():
+        # 详情视图：解析完整的 JSON 字段
+        video_files = decode_column(record['video_files'], [])
+        account_list = decode_column(record['account_list'], [])
+        cover_screenshots = decode_column(record['cover_screenshots'], [])
+        print(f"   视频文件: {video_files}")
+        if isinstance(account_list, list):
+            print(f"   账号列表: {len(account_list)} 个账号")
+            for account in account_list:
+                print(f"     • {account}")
+        else:
+            print(f"   账号列表: {account_list}")
+        print(f"   封面截图: {cover_screenshots}")
+    else:
+        # 列表视图：只使用 SQL 端计算的摘要
+        print(f"   视频文件: {_format_list_summary(record['video_count'], record['first_video'], record['video_files_raw'])}")
+        if record['account_count'] is not None:
+            platforms = f" ({record['account_platforms']})" if record['account_platforms'] else ""
+            print(f"   账号列表: {record['account_count']} 个账号{platforms}")
+        else:
+            print(f"   账号列表: {record['account_list_raw']}")
+        print(f"   封面截图: {_format_list_summary(record['cover_count'], record['first_cover'], record['cover_screenshots_raw'])}")
+
+    if accounts is not None:
+        print_account_statuses(accounts)
+
+    print("-" * 50)
+
+
+def print_account_statuses(accounts):
+    """打印一条发布记录下各账号的发布状态"""
+    if not accounts:
+        print("   账号状态: 无记录")
+        return
+
+    print(f"   账号状态: {len(accounts)} 个账号")
+    for account in accounts:
+        icon = {'success': '✅', 'failed': '❌'}.get(account['status'], '⏳')
+        print(f"     {icon} {account['account_name']} ({account['platform']}): {account['status']}")
+        print(f"        上传: {account['upload_status'] or '-'}  推送: {account['push_status'] or '-'}  "
+              f"转码: {account['transcode_status'] or '-'}  审核: {account['review_status'] or '-'}")
+        if account['start_time'] or account['end_time']:
+            print(f"        时间: {account['start_time'] or '-'} → {account['end_time'] or '-'}")
+        if account['error_message']:
+            print(f"        错误: {account['error_message']}")
+
+
+def _format_list_summary(count, first, raw):
+    """格式化 JSON 数组摘要：数量 + 第一个元素（字段为 NULL 时与旧版一样显示 []）"""
+    if count is None:
+        return "[]" if raw is None else raw
+    if count == 0:
+        return "[]"
+    more = f" 等 {count} 个" if count > 1 else ""
+    return f"{first}{more}"
+
+
+def query_publish_records(since=None, until=None, status=None, limit=None,
+                          page_size=DEFAULT_PAGE_SIZE, detail=False, drilldown=False):
     try:
-        # 连接数据库
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row  # 让结果可以通过列名访问
-        cursor = conn.cursor()
-        
-        # 查询所有发布记录
-        cursor.execute("SELECT * FROM publish_records ORDER BY created_at DESC")
-        records = cursor.fetchall()
-        
-        if not records:
+        # 连接数据库（复用只读连接）
+        conn = get_readonly_connection()
+
+        # 🔥 流式读取：第一页到达后立即开始打印
+        count = 0
+        if drilldown:
+            # 每页记录的账号状态一次批量读取后在内存中分组
+            for count, (record, accounts) in enumerate(
+                iter_publish_drilldown(conn, since, until, status, limit, page_size, detail), 1
+            ):
+                print_publish_record(count, record, accounts)
+        else:
+            for count, record in enumerate(
+                iter_publish_records(conn, since, until, status, limit, page_size, detail), 1
+            ):
+                print_publish_record(count, record)
+
+        if count == 0:
             print("❌ 没有找到发布记录")
             return
-            
-        print(f"📊 找到 {len(records)} 条发布记录\n")
-        
-        # 显示每条记录
-        for i, record in enumerate(records, 1):
-            print(f"🔥 记录 {i}")
-            print(f"   ID: {record['id']}")
-            print(f"   标题: {record['title']}")
-            print(f"   平台类型: {record['platform_type']}")
-            print(f"   状态: {record['status']}")
-            print(f"   总账号数: {record['total_accounts']}")
-            print(f"   成功账号数: {record['success_accounts']}")
-            print(f"   失败账号数: {record['failed_accounts']}")
-            print(f"   开始时间: {record['start_time']}")
-            print(f"   结束时间: {record['end_time']}")
-            print(f"   耗时(秒): {record['duration']}")
-            print(f"   创建者: {record['created_by']}")
-            print(f"   创建时间: {record['created_at']}")
-            print(f"   更新时间: {record['updated_at']}")
-            
-            # 解析 JSON 字段
-            try:
-                video_files = json.loads(record['video_files']) if record['video_files'] else []
-                print(f"   视频文件: {video_files}")
-            except:
-                print(f"   视频文件: {record['video_files']}")
-            
-            try:
-                account_list = json.loads(record['account_list']) if record['account_list'] else []
-                print(f"   账号列表: {len(account_list)} 个账号")
-            except:
-                print(f"   账号列表: {record['account_list']}")
-            
-            try:
-                cover_screenshots = json.loads(record['cover_screenshots']) if record['cover_screenshots'] else []
-                print(f"   封面截图: {cover_screenshots}")
-            except:
-                print(f"   封面截图: {record['cover_screenshots']}")
-                
-            print("-" * 50)
-        
+
+        print(f"📊 共显示 {count} 条发布记录")
+
     except sqlite3.Error as e:
         print(f"❌ 数据库错误: {e}")
+    except ValueError as e:
+        # --since / --until 换算为整数时间失败
+        print(f"❌ 无法识别的时间: {e}")
+        print("   请使用 YYYY-MM-DD、'YYYY-MM-DD HH:MM:SS' 或 ISO 8601 格式（月、日需补零），如 2025-03-01")
     except Exception as e:
         print(f"❌ 脚本错误: {e}")
-    finally:
-        if conn:
-            conn.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="查询发布记录")
+    parser.add_argument("--since", help="起始创建时间（包含, UTC），如 2025-01-01 或 '2025-01-01 08:00:00'")
+    parser.add_argument("--until", help="截止创建时间（不包含）")
+    parser.add_argument("--status", nargs="+", help="按状态过滤（可指定多个）: pending/success/partial/failed")
+    parser.add_argument("--failed", action="store_true",
+                        help=f"只显示失败或部分失败的记录（等同 --status {' '.join(PROBLEM_STATUSES)}），并显示账号状态")
+    parser.add_argument("--limit", type=int, help="最多显示的记录数")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help=f"每页读取的记录数 (默认 {DEFAULT_PAGE_SIZE})")
+    parser.add_argument("--detail", action="store_true",
+                        help=f"显示完整的视频/账号/封面列表（JSON 解析后端: {JSON_BACKEND}）")
+    parser.add_argument("--drilldown", action="store_true",
+                        help="显示每条记录下各账号的上传/推送/转码/审核状态和错误信息")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    query_publish_records()
+    args = parse_args()
+    query_publish_records(
+        since=args.since,
+        until=args.until,
+        status=PROBLEM_STATUSES if args.failed else args.status,
+        limit=args.limit,
+        page_size=args.page_size,
+        detail=args.detail,
+        drilldown=args.drilldown or args.failed,
+    )
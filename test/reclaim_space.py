@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+数据库空间回收脚本
+统计空闲页与各表/索引占用，一次性切换到 auto_vacuum=INCREMENTAL，
+之后按时间片分步执行 incremental_vacuum，完整 VACUUM 仅在显式指定时执行
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# 导入配置
+from config import DB_PATH
+from db_connection import get_readonly_connection, get_write_connection
+
+# 🔥 默认参数
+DEFAULT_STEP_PAGES = 256        # 每步回收的页数
+DEFAULT_TIME_BUDGET = 30.0      # 本次回收的总时间预算（秒）
+DEFAULT_STEP_PAUSE = 0.05       # 每步之间暂停的秒数（让应用写入）
+
+AUTO_VACUUM_MODES = {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}
+
+
+def get_space_info(conn):
+    """获取页大小、总页数、空闲页数和 auto_vacuum 模式"""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    return {
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(auto_vacuum, str(auto_vacuum)),
+        'total_bytes': page_size * page_count,
+        'free_bytes': page_size * freelist_count,
+    }
+
+
+def get_object_usage(conn):
+    """按表/索引统计页数和字节占用（dbstat 聚合模式）"""
+    rows = conn.execute("""
+        SELECT d.name, m.type, d.pageno AS pages, d.pgsize AS bytes, d.unused
+        FROM dbstat AS d
+        LEFT JOIN sqlite_master AS m ON m.name = d.name
+        WHERE d.aggregate = TRUE
+        ORDER BY d.pgsize DESC
+    """).fetchall()
+    return [dict(row) for row in rows]
+
+
+def print_space_report(db_path=None, top=20):
+    """打印空间占用报告"""
+    conn = get_readonly_connection(db_path)
+    info = get_space_info(conn)
+
+    print("📊 数据库空间统计:")
+    print(f"   页大小: {info['page_size']} bytes")
+    print(f"   总页数: {info['page_count']} ({info['total_bytes'] / 1024 / 1024:.2f} MB)")
+    print(f"   空闲页数: {info['freelist_count']} ({info['free_bytes'] / 1024 / 1024:.2f} MB)")
+    print(f"   auto_vacuum: {info['auto_vacuum']}")
+
+    try:
+        usage = get_object_usage(conn)
+    except Exception as e:
+        print(f"   ⚠️  dbstat 不可用，跳过表级统计: {e}")
+        return info
+
+    print(f"   占用最多的表/索引 (前{top}个):")
+    for row in usage[:top]:
+        kind = row['type'] or 'internal'
+        print(f"     • {row['name']} [{kind}]: {row['bytes'] / 1024 / 1024:.2f} MB, "
+              f"{row['pages']} 页, 未使用 {row['unused'] / 1024:.1f} KB")
+    print("-" * 60)
+    return info
+
+
+def enable_incremental_vacuum(db_path=None):
+    """一次性切换到 auto_vacuum=INCREMENTAL
+
+    从 NONE 切换需要执行一次完整 VACUUM 才能生效，之后即可分步回收。
+    """
+    conn = get_write_connection(db_path)
+    info = get_space_info(conn)
+    if info['auto_vacuum'] == 'INCREMENTAL':
+        print("✅ 数据库已经是 auto_vacuum=INCREMENTAL")
+        return True
+
+    print(f"🔧 切换 auto_vacuum: {info['auto_vacuum']} -> INCREMENTAL (需要执行一次完整 VACUUM)...")
+    started_at = time.time()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+    info = get_space_info(conn)
+    if info['auto_vacuum'] != 'INCREMENTAL':
+        print(f"❌ 切换失败，当前模式: {info['auto_vacuum']}")
+        return False
+    print(f"✅ 已切换为 INCREMENTAL，耗时 {time.time() - started_at:.1f} 秒")
+    return True
+
+
+def incremental_reclaim(step_pages=DEFAULT_STEP_PAGES, time_budget=DEFAULT_TIME_BUDGET,
+                        pause=DEFAULT_STEP_PAUSE, db_path=None):
+    """按时间片分步执行 incremental_vacuum，返回回收的页数
+
+    每步一个短事务，只回收 step_pages 页，超出时间预算后停止，剩余空闲页留给下次。
+    """
+    conn = get_write_connection(db_path)
+    info = get_space_info(conn)
+
+    if info['auto_vacuum'] != 'INCREMENTAL':
+        print(f"⚠️  当前 auto_vacuum={info['auto_vacuum']}，无法分步回收")
+        print("   请先运行: python reclaim_space.py --enable-incremental")
+        return 0
+
+    start_free = info['freelist_count']
+    if start_free == 0:
+        print("✅ 没有空闲页需要回收")
+        return 0
+
+    print(f"🧹 开始分步回收: 空闲页 {start_free}, 每步 {step_pages} 页, 时间预算 {time_budget:.0f} 秒")
+    started_at = time.time()
+    freelist_count = start_free
+
+    while freelist_count > 0 and time.time() - started_at < time_budget:
+        # 🔥 incremental_vacuum 每次 step 只释放一页，而 execute() 对无结果列的语句只 step 一次，
+        # 所以用 executescript 把整个短事务执行完
+        try:
+            conn.executescript(
+                f"BEGIN IMMEDIATE; PRAGMA incremental_vacuum({int(step_pages)}); COMMIT;"
+            )
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+        freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        reclaimed = start_free - freelist_count
+        sys.stdout.write(
+            f"\r   已回收: {reclaimed}/{start_free} 页 "
+            f"({reclaimed * info['page_size'] / 1024 / 1024:.2f} MB)"
+        )
+        sys.stdout.flush()
+
+        if pause > 0 and freelist_count > 0:
+            time.sleep(pause)
+
+    reclaimed = start_free - freelist_count
+    print()
+    if freelist_count > 0:
+        print(f"⏱️  已达到时间预算，剩余空闲页 {freelist_count}，可再次运行继续回收")
+    else:
+        print(f"✅ 空间回收完成，共回收 {reclaimed} 页")
+    return reclaimed
+
+
+def full_vacuum(db_path=None):
+    """完整 VACUUM（重写整个数据库，需要约两倍磁盘空间，期间应用无法写入）"""
+    conn = get_write_connection(db_path)
+    print("🔧 正在执行完整 VACUUM...")
+    started_at = time.time()
+    conn.execute("VACUUM")
+    print(f"✅ 完整 VACUUM 完成，耗时 {time.time() - started_at:.1f} 秒")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="数据库空间统计与分步回收")
+    parser.add_argument("--report", action="store_true", help="只显示空间统计，不回收")
+    parser.add_argument("--enable-incremental", action="store_true",
+                        help="一次性切换到 auto_vacuum=INCREMENTAL（会执行一次完整 VACUUM）")
+    parser.add_argument("--step-pages", type=int, default=DEFAULT_STEP_PAGES,
+                        help=f"每步回收的页数 (默认 {DEFAULT_STEP_PAGES})")
+    parser.add_argument("--time-budget", type=float, default=DEFAULT_TIME_BUDGET,
+                        help=f"本次回收的时间预算秒数 (默认 {DEFAULT_TIME_BUDGET:.0f})")
+    parser.add_argument("--pause", type=float, default=DEFAULT_STEP_PAUSE,
+                        help=f"每步之间暂停的秒数 (默认 {DEFAULT_STEP_PAUSE})")
+    parser.add_argument("--full", action="store_true",
+                        help="执行完整 VACUUM（需要两倍磁盘空间，期间锁定数据库）")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return
+
+    print(f"🔍 数据库路径: {DB_PATH}")
+    print_space_report()
+
+    if args.report:
+        return
+
+    if args.full:
+        full_vacuum()
+    else:
+        if args.enable_incremental and not enable_incremental_vacuum():
+            return
+        incremental_reclaim(args.step_pages, args.time_budget, args.pause)
+
+    print_space_report()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断，已提交的回收步骤不会丢失")
+        sys.exit(1)
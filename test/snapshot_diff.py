@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+数据库快照对比脚本
+以只读方式打开两个快照（备份文件路径、BASE_DIR/backups 下的文件名或增量备份仓库中的备份名），
+按 rowid 区间把每张表分成叶子块，每块的行在 SQLite 内拼接后计算一次哈希；
+哈希相同的区间直接跳过，只对不同的区间逐行比较，输出新增、删除和修改的行
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+
+# 导入配置
+from config import Config
+from backup_store import load_manifests, restore_backup, store_dir
+from db_connection import BUSY_TIMEOUT_MS, get_db_uri
+
+DIFF_TABLES = ('messages', 'message_threads', 'user_info', 'publish_records')
+LEAF_ROWID_SPAN = 1024          # 每个叶子块覆盖的 rowid 区间宽度
+DEFAULT_LIMIT = 20              # 每张表每类变化最多显示的行数
+VALUE_PREVIEW = 80              # 显示值时的最大长度
+
+
+def resolve_snapshot(name):
+    """解析快照参数，返回 (数据库文件路径, 是否为临时恢复的文件)"""
+    if os.path.isfile(name):
+        return name, False
+    in_backups = os.path.join(Config.get_backup_dir(), name)
+    if os.path.isfile(in_backups):
+        return in_backups, False
+    if name in {manifest['name'] for manifest in load_manifests()}:
+        # 增量备份仓库中的备份：先拼回临时文件，对比完成后删除
+        restored = restore_backup(name, os.path.join(store_dir(), f"diff_{name}.tmp.db"))
+        if restored:
+            return restored, True
+    raise FileNotFoundError(f"找不到快照: {name}")
+
+
+def open_snapshots(old_path, new_path):
+    """只读打开旧快照为 main，新快照 ATTACH 为 new"""
+    for path in (old_path, new_path):
+        if path.endswith(".gz"):
+            raise ValueError(f"不支持直接对比压缩备份，请先解压: {path}")
+    conn = sqlite3.connect(get_db_uri(old_path), uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute("ATTACH DATABASE ? AS new", (get_db_uri(new_path),))
+    return conn
+
+
+def _columns(conn, schema, table):
+    """返回 [(列名, 声明类型)]"""
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _row_expression(columns):
+    """把一行序列化成一个字符串，在 SQLite 内完成
+
+    json_array 一次生成整行（区分 NULL / 数字 / 文本），比逐列 quote 再拼接快得多；
+    json_array 不接受 BLOB，可能存放 BLOB 的列（声明为 BLOB 或未声明类型）改用 quote 转成文本。
+    """
+    values = ["rowid"]
+    for name, decl_type in columns:
+        if not decl_type or "BLOB" in decl_type.upper():
+            values.append(f'quote("{name}")')
+        else:
+            values.append(f'"{name}"')
+    return f"json_array({', '.join(values)})"
+
+
+def leaf_hashes(conn, schema, table, columns, span=LEAF_ROWID_SPAN):
+    """计算一侧所有非空叶子块的哈希 {叶子编号: (行数, 哈希)}
+
+    按 rowid 跳到下一个有数据的叶子（主键定位），稀疏的 rowid 不会产生空块查询。
+    """
+    row_expr = _row_expression(columns)
+    seek_sql = f"SELECT MIN(rowid) FROM {schema}.{table} WHERE rowid >= ?"
+    leaf_sql = f"""
+        SELECT COUNT(*), group_concat(r) FROM (
+            SELECT {row_expr} AS r FROM {schema}.{table}
+            WHERE rowid >= ? AND rowid < ?
+            ORDER BY rowid
+        )
+    """
+    hashes = {}
+    start = conn.execute(f"SELECT MIN(rowid) FROM {schema}.{table}").fetchone()[0]
+    while start is not None:
+        leaf = start // span
+        count, text = conn.execute(leaf_sql, (leaf * span, (leaf + 1) * span)).fetchone()
+        hashes[leaf] = (count, hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest())
+        start = conn.execute(seek_sql, ((leaf + 1) * span,)).fetchone()[0]
+    return hashes
+
+
+def _fetch_rows(conn, schema, table, columns, low, high):
+    column_list = ", ".join(f'"{name}"' for name, _ in columns)
+    return {
+        row[0]: row[1:]
+        for row in conn.execute(
+            f"SELECT rowid, {column_list} FROM {schema}.{table} WHERE rowid >= ? AND rowid < ?",
+            (low, high),
+        )
+    }
+
+
+def diff_table(conn, table, span=LEAF_ROWID_SPAN):
+    """对比一张表，返回结果字典（inserted / deleted 为 {rowid: 行}，modified 为 {rowid: [(列, 旧值, 新值)]}）"""
+    old_columns = _columns(conn, 'main', table)
+    new_columns = _columns(conn, 'new', table)
+    if not old_columns or not new_columns:
+        return None
+    new_names = {name for name, _ in new_columns}
+    old_names = {name for name, _ in old_columns}
+    columns = [column for column in old_columns if column[0] in new_names]
+
+    old_leaves = leaf_hashes(conn, 'main', table, columns, span)
+    new_leaves = leaf_hashes(conn, 'new', table, columns, span)
+    changed = sorted(leaf for leaf in set(old_leaves) | set(new_leaves)
+                     if old_leaves.get(leaf) != new_leaves.get(leaf))
+
+    result = {
+        'columns': [name for name, _ in columns],
+        'old_only_columns': [name for name, _ in old_columns if name not in new_names],
+        'new_only_columns': [name for name, _ in new_columns if name not in old_names],
+        'leaves': len(set(old_leaves) | set(new_leaves)),
+        'changed_leaves': len(changed),
+        'inserted': {},
+        'deleted': {},
+        'modified': {},
+    }
+    for leaf in changed:
+        low, high = leaf * span, (leaf + 1) * span
+        old_rows = _fetch_rows(conn, 'main', table, columns, low, high)
+        new_rows = _fetch_rows(conn, 'new', table, columns, low, high)
+        for rowid, row in new_rows.items():
+            if rowid not in old_rows:
+                result['inserted'][rowid] = row
+            elif old_rows[rowid] != row:
+                result['modified'][rowid] = [
+                    (column[0], old, new)
+                    for column, old, new in zip(columns, old_rows[rowid], row)
+                    if old != new
+                ]
+        for rowid, row in old_rows.items():
+            if rowid not in new_rows:
+                result['deleted'][rowid] = row
+    return result
+
+
+def _preview(value):
+    text = repr(value) if not isinstance(value, str) else value
+    text = text.replace("\n", "\\n")
+    return text if len(text) <= VALUE_PREVIEW else text[:VALUE_PREVIEW] + "…"
+
+
+def _row_preview(columns, row):
+    return ", ".join(f"{c}={_preview(v)}" for c, v in zip(columns, row) if v is not None)
+
+
+def print_table_diff(table, result, limit=DEFAULT_LIMIT, summary=False):
+    """打印一张表的对比结果"""
+    if result is None:
+        print(f"\n⚠️  {table}: 其中一个快照没有这张表，跳过")
+        return
+
+    inserted, deleted, modified = result['inserted'], result['deleted'], result['modified']
+    print(f"\n📋 {table}: 新增 {len(inserted)} 行, 删除 {len(deleted)} 行, 修改 {len(modified)} 行 "
+          f"(跳过 {result['leaves'] - result['changed_leaves']}/{result['leaves']} 个相同的区间)")
+    if result['old_only_columns']:
+        print(f"   仅旧快照有的列: {', '.join(result['old_only_columns'])}")
+    if result['new_only_columns']:
+        print(f"   仅新快照有的列: {', '.join(result['new_only_columns'])}")
+    if summary:
+        return
+
+    columns = result['columns']
+    for label, rows in (("➕ 新增", inserted), ("➖ 删除", deleted)):
+        for rowid in sorted(rows)[:limit]:
+            print(f"   {label} rowid={rowid}: {_row_preview(columns, rows[rowid])}")
+        if len(rows) > limit:
+            print(f"   ... 还有 {len(rows) - limit} 行未显示")
+    for rowid in sorted(modified)[:limit]:
+        changes = "; ".join(f"{c}: {_preview(old)} → {_preview(new)}" for c, old, new in modified[rowid])
+        print(f"   ✏️  修改 rowid={rowid}: {changes}")
+    if len(modified) > limit:
+        print(f"   ... 还有 {len(modified) - limit} 行未显示")
+
+
+def diff_snapshots(old, new, tables=DIFF_TABLES, span=LEAF_ROWID_SPAN, limit=DEFAULT_LIMIT, summary=False):
+    """对比两个快照并打印结果，返回 {表名: 结果}"""
+    temp_files = []
+    try:
+        old_path, old_temp = resolve_snapshot(old)
+        if old_temp:
+            temp_files.append(old_path)
+        new_path, new_temp = resolve_snapshot(new)
+        if new_temp:
+            temp_files.append(new_path)
+
+        print(f"🔍 旧快照: {old_path}")
+        print(f"🔍 新快照: {new_path}")
+        conn = open_snapshots(old_path, new_path)
+        results = {}
+        try:
+            # 🔥 整个对比在一个读事务内完成：快照可能是应用正在写入的数据库，
+            #    逐条自动提交读取会让区间哈希和逐行比较看到不同的状态；
+            #    读事务在首次访问每个库时才开始，这里先读两边的 schema，固定两个库的读取时刻
+            conn.execute("BEGIN")
+            conn.execute("SELECT COUNT(*) FROM main.sqlite_master").fetchone()
+            conn.execute("SELECT COUNT(*) FROM new.sqlite_master").fetchone()
+            for table in tables:
+                started_at = time.time()
+                results[table] = diff_table(conn, table, span)
+                print_table_diff(table, results[table], limit, summary)
+                print(f"   耗时 {time.time() - started_at:.2f} 秒")
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return results
+    finally:
+        for path in temp_files:
+            os.remove(path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="对比两个数据库快照（按 rowid 区间哈希，跳过未变化的区间）")
+    parser.add_argument("old", help="旧快照：文件路径、BASE_DIR/backups 下的文件名或增量备份名")
+    parser.add_argument("new", help="新快照：同上")
+    parser.add_argument("--tables", nargs="+", default=list(DIFF_TABLES),
+                        help=f"要对比的表 (默认 {' '.join(DIFF_TABLES)})")
+    parser.add_argument("--span", type=int, default=LEAF_ROWID_SPAN,
+                        help=f"每个区间的 rowid 宽度 (默认 {LEAF_ROWID_SPAN})")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT,
+                        help=f"每类变化最多显示的行数 (默认 {DEFAULT_LIMIT})")
+    parser.add_argument("--summary", action="store_true", help="只显示每张表的变化行数")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        diff_snapshots(args.old, args.new, args.tables, args.span, args.limit, args.summary)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    except sqlite3.Error as e:
+        print(f"❌ 数据库错误: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n⚠️  操作被用户中断")
+        sys.exit(1)